@@ -0,0 +1,14 @@
+"""
+Benchmarks for the printer control hot paths
+
+Runs in-process against a fake printer and a local MQTT stand-in, so no
+hardware or broker is needed. Results are written as JSON and can be
+compared against a baseline:
+
+    python -m benchmarks --output baseline.json
+    python -m benchmarks --baseline baseline.json --max-regression 0.2
+
+Modules:
+    - fakes: FakePrinter and FakeMQTTClient
+    - suite: Benchmarks, runner and baseline comparison
+"""
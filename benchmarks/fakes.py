@@ -0,0 +1,260 @@
+import io
+import json
+import math
+import base64
+import time
+import threading
+from types import SimpleNamespace
+from typing import Dict, Any, BinaryIO, Callable, List, Optional, Tuple
+
+from bambulabs_api import GcodeState
+
+
+class _Heater:
+    """First-order heater: approaches its target with time constant tau"""
+
+    def __init__(self, temperature: float, tau: float):
+        self.tau = tau
+        self._start = temperature
+        self._target = temperature
+        self._since = time.monotonic()
+
+    def read(self) -> float:
+        elapsed = time.monotonic() - self._since
+        return self._target + (self._start - self._target) * math.exp(-elapsed / self.tau)
+
+    def set(self, target: float):
+        self._start = self.read()
+        self._target = float(target)
+        self._since = time.monotonic()
+
+
+class FakePrinter:
+    """In-process stand-in for bambulabs_api.Printer
+
+    Uploads take size / bandwidth seconds. A started job is in PREPARE
+    for prepare_time, RUNNING for print_time with progress, then FINISH.
+    Heaters follow a first-order response. Every call costs latency
+    seconds to model the network round trip, and is counted in
+    round_trips. The camera returns a blank JPEG frame. Only methods of
+    the real client exist here, with the same return values.
+
+    Like the real client, connect() never fails: an unreachable fake
+    just never reports its MQTT connection, and a silent one connects
+    but pushes no reports, so its getters return stale values.
+    """
+
+    _frame: Optional[str] = None
+
+    def __init__(self, ip: str = '127.0.0.1', access_code: str = '', serial: str = 'FAKE',
+                 bandwidth: float = 2e6, latency: float = 0.002,
+                 prepare_time: float = 0.05, print_time: float = 0.2,
+                 heater_tau: float = 0.5, ambient: float = 25.0,
+                 reachable: bool = True, silent: bool = False):
+        """Initialize fake printer
+
+        Args:
+            ip, access_code, serial: Accepted like the real client's
+            bandwidth: Upload bytes per second
+            latency: Seconds per call
+            prepare_time: Seconds between start_print and RUNNING
+            print_time: Seconds a job is RUNNING
+            heater_tau: Heater time constant in seconds
+            ambient: Initial temperatures
+            reachable: Whether the MQTT connection comes up
+            silent: Connect, but never push a report
+        """
+        self.serial = serial
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.prepare_time = prepare_time
+        self.print_time = print_time
+        self.reachable = reachable
+        self.silent = silent
+        self.mqtt_client = SimpleNamespace(on_message_handler=None)
+        self._connected = False
+
+        self.files: Dict[str, int] = {}
+        self.round_trips = 0
+        self.started: List[Tuple[str, float]] = []  # (filename, perf_counter at start)
+        self.nozzle = _Heater(ambient, heater_tau)
+        self.bed = _Heater(ambient, heater_tau)
+        self._job_start: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def connect(self):
+        """Start connecting; like the real client, returns None and never raises"""
+        self._call()
+        self._connected = self.reachable
+        self._report()
+
+    def disconnect(self):
+        self._call()
+        self._connected = False
+
+    def mqtt_client_connected(self) -> bool:
+        return self._connected
+
+    def _report(self):
+        """Push a report to the client's message handler, as the printer does"""
+        handler = self.mqtt_client.on_message_handler
+        if not self._connected or self.silent or handler is None:
+            return
+        state, progress = self._phase()
+        payload = json.dumps({'print': {'gcode_state': state.value, 'mc_percent': progress}})
+        handler(self.mqtt_client, None, None, SimpleNamespace(topic='report', payload=payload.encode()))
+
+    def upload_file(self, file: BinaryIO, filename: str = 'ftp_upload.gcode') -> str:
+        self._call()
+        size = len(file.read())
+        time.sleep(size / self.bandwidth)
+        self.files[filename] = size
+        return "226 Transfer complete"
+
+    def delete_file(self, file_path: str) -> str:
+        self._call()
+        self.files.pop(file_path, None)
+        return "250 Delete operation successful"
+
+    def start_print(self, filename: str, plate_number: Any, *args, **kwargs) -> bool:
+        self._call()
+        if filename not in self.files:
+            raise FileNotFoundError(filename)
+        if self._phase()[0] not in (GcodeState.IDLE, GcodeState.FINISH, GcodeState.FAILED):
+            return False
+        self.started.append((filename, time.perf_counter()))
+        self._job_start = time.monotonic()
+        return True
+
+    def _phase(self) -> Tuple[GcodeState, Optional[int]]:
+        """Current state and progress, derived from the time since start_print"""
+        if self._job_start is None:
+            return GcodeState.IDLE, None
+        elapsed = time.monotonic() - self._job_start - self.prepare_time
+        if elapsed < 0:
+            return GcodeState.PREPARE, 0
+        if elapsed < self.print_time:
+            return GcodeState.RUNNING, int(100 * elapsed / self.print_time)
+        return GcodeState.FINISH, 100
+
+    def get_state(self) -> GcodeState:
+        self._call()
+        if not self._connected:
+            return GcodeState.UNKNOWN
+        self._report()
+        return self._phase()[0]
+
+    def get_percentage(self) -> Optional[int]:
+        """Whole percent, None before the first job like the real client"""
+        self._call()
+        return self._phase()[1]
+
+    def get_nozzle_temperature(self) -> float:
+        self._call()
+        return self.nozzle.read()
+
+    def get_bed_temperature(self) -> float:
+        self._call()
+        return self.bed.read()
+
+    def get_camera_frame(self) -> str:
+        """Base64 JPEG of a blank frame"""
+        self._call()
+        if FakePrinter._frame is None:
+            from PIL import Image
+            out = io.BytesIO()
+            Image.new('RGB', (640, 480), (40, 40, 40)).save(out, format='JPEG')
+            FakePrinter._frame = base64.b64encode(out.getvalue()).decode()
+        return FakePrinter._frame
+
+    def set_nozzle_temperature(self, temperature: float) -> bool:
+        self._call()
+        self.nozzle.set(temperature)
+        return True
+
+    def set_bed_temperature(self, temperature: float) -> bool:
+        self._call()
+        self.bed.set(temperature)
+        return True
+
+
+class FakeMessageInfo:
+    """Result of FakeMQTTClient.publish, acknowledged immediately"""
+
+    def __init__(self, mid: int):
+        self.mid = mid
+        self.rc = 0
+
+    def wait_for_publish(self, timeout: Optional[float] = None):
+        pass
+
+    def is_published(self) -> bool:
+        return True
+
+
+class FakeMQTTClient:
+    """In-process stand-in for paho.mqtt.client.Client
+
+    Connecting succeeds at once. Published messages are counted, and the
+    last keep of them retained for inspection. deliver() hands a message
+    to on_message as the network thread would.
+    """
+
+    def __init__(self, keep: int = 100):
+        self.on_connect: Optional[Callable] = None
+        self.on_message: Optional[Callable] = None
+        self.on_disconnect: Optional[Callable] = None
+        self.keep = keep
+        self.published: List[Tuple[str, Any]] = []
+        self.publish_count = 0
+        self.publish_bytes = 0
+        self.subscriptions: List[str] = []
+        self._mid = 0
+        self._lock = threading.Lock()
+
+    def username_pw_set(self, username: str, password: Optional[str] = None):
+        pass
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def reconnect_delay_set(self, min_delay: int = 1, max_delay: int = 120):
+        pass
+
+    def connect_async(self, host: str, port: int = 1883, keepalive: int = 60):
+        pass
+
+    def loop_start(self):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+
+    def subscribe(self, topic: str, qos: int = 0):
+        self.subscriptions.append(topic)
+        return 0, 1
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> FakeMessageInfo:
+        with self._lock:
+            self._mid += 1
+            self.publish_count += 1
+            self.publish_bytes += len(payload or '')
+            self.published.append((topic, payload))
+            if len(self.published) > self.keep:
+                del self.published[0]
+            return FakeMessageInfo(self._mid)
+
+    def deliver(self, topic: str, payload: bytes):
+        """Hand an incoming message to on_message"""
+        self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload, qos=1))
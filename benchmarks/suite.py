@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from functools import partial
+from typing import Dict, Any, Callable, List, Optional
+
+import yaml
+import numpy as np
+
+from core.gcode_generator import GCodeGenerator, DEFAULT_ORIGIN
+from core.printer_controller import PrinterController
+from core.mqtt_handler import MQTTHandler
+from core.job_queue import JobQueue
+from core.database import DatabaseManager
+from .fakes import FakePrinter, FakeMQTTClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(ROOT, 'config', 'printer_config.yaml')
+PARAMS = {'nozzle_temp': 215, 'bed_temp': 60}
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'max_ms': float(values.max())
+    }
+
+
+def _rate(func: Callable[[int], Any], iterations: int) -> float:
+    """Calls per second of func(i) over iterations calls"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return iterations / (time.perf_counter() - start)
+
+
+def bench_generation(config: Dict[str, Any], iterations: int) -> Dict[str, Any]:
+    """G-code rendering and 3MF packaging throughput"""
+    generator = GCodeGenerator(
+        template_path=os.path.join(ROOT, 'template', '10x10 0.1.gcode'),
+        origin=tuple(config['grid'].get('start_pos', DEFAULT_ORIGIN))
+    )
+    positions = [{'position': (32.4 + 15 * (i % 10), 145 - 15 * (i // 10 % 10))} for i in range(100)]
+    package_size = len(generator.create_square_package(positions[0], PARAMS).getvalue())
+    batch = [(positions[i], {**PARAMS, 'nozzle_temp': 210 + 5 * (i % 3)}) for i in range(4)]
+
+    packages_per_s = _rate(lambda i: generator.create_square_package(positions[i % 100], PARAMS), iterations)
+    return {
+        'gcode_per_s': _rate(lambda i: generator.generate_square_gcode(positions[i % 100], PARAMS), iterations),
+        'packages_per_s': packages_per_s,
+        'package_bytes': package_size,
+        'package_mb_per_s': packages_per_s * package_size / 1e6,
+        'batch4_packages_per_s': _rate(lambda i: generator.create_batch_package(batch), max(iterations // 4, 1))
+    }
+
+
+def _controller(config: Dict[str, Any], workdir: str, name: str, **printer_options) -> PrinterController:
+    config = {
+        **config,
+        'database': {**config['database'], 'path': os.path.join(workdir, f'{name}.db'),
+                     'backup_dir': os.path.join(workdir, f'{name}_backups')},
+        'upload': {},
+        'package': {}
+    }
+    controller = PrinterController(config, printer_factory=partial(FakePrinter, **printer_options))
+    if not controller.connect():
+        raise RuntimeError("Fake printer did not connect")
+    return controller
+
+
+def bench_command_latency(config: Dict[str, Any], workdir: str, iterations: int) -> Dict[str, Any]:
+    """Time from an MQTT command arriving to the printer's start_print
+
+    Measured directly on the network thread and through the job queue.
+    """
+    results = {}
+    for path in ('direct', 'queued'):
+        controller = _controller(
+            config, workdir, f'latency_{path}',
+            bandwidth=50e6, prepare_time=0, print_time=0
+        )
+        client = FakeMQTTClient()
+        handler = MQTTHandler(
+            {**config['mqtt'], 'spool_path': os.path.join(workdir, f'{path}_spool.jsonl')},
+            controller, client=client
+        )
+        job_queue = None
+        if path == 'queued':
+            job_queue = JobQueue(
+                {'path': os.path.join(workdir, 'latency_queue.db')},
+                handler.handle_command, handler.publish_ack
+            )
+            handler.command_dispatcher = job_queue.submit
+            job_queue.start()
+        handler.connect()
+
+        topic = f"bambu_a1_mini/command/{config['mqtt']['printer_serial']}"
+        fake = controller.printer
+        samples = []
+        for i in range(min(iterations, controller.position_manager.free_count())):
+            started = len(fake.started)
+            sent = time.perf_counter()
+            client.deliver(topic, json.dumps({'action': 'print', 'parameters': PARAMS}).encode())
+            deadline = time.monotonic() + 10
+            while len(fake.started) == started and time.monotonic() < deadline:
+                time.sleep(0.0005)
+            if len(fake.started) > started:
+                samples.append(fake.started[-1][1] - sent)
+
+        if job_queue:
+            job_queue.stop(timeout=10)
+        handler.close()
+        controller.db_manager.close()
+        results[path] = _summary(samples) if samples else {'count': 0}
+    return results
+
+
+def bench_db_writes(config: Dict[str, Any], workdir: str, iterations: int) -> Dict[str, Any]:
+    """Print job records per second, including the final flush to disk"""
+    db_manager = DatabaseManager({
+        **config['database'],
+        'path': os.path.join(workdir, 'writes.db'),
+        'backup_dir': os.path.join(workdir, 'writes_backups')
+    })
+    start = time.perf_counter()
+    for i in range(iterations):
+        db_manager.record_print_job(f'square_{i}', 32.4, 145.0, PARAMS)
+    queued = time.perf_counter() - start
+    db_manager.flush(sync=True)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        db_manager.update_job_status(f'square_{i}', 'completed')
+    db_manager.flush(sync=True)
+    updates = time.perf_counter() - start
+    db_manager.close()
+    return {
+        'records_per_s': iterations / elapsed,
+        'record_call_us': queued / iterations * 1e6,
+        'updates_per_s': iterations / updates
+    }
+
+
+def bench_status_publish(config: Dict[str, Any], workdir: str, iterations: int) -> Dict[str, Any]:
+    """Status messages per second while online and while buffering offline"""
+    client = FakeMQTTClient()
+    handler = MQTTHandler(
+        {**config['mqtt'], 'spool_path': os.path.join(workdir, 'publish_spool.jsonl')},
+        None, client=client
+    )
+    handler.connect()
+    status = {
+        'status': 'RUNNING', 'bed_temp': 60.0, 'nozzle_temp': 215.0,
+        'progress': 42.0, 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    online = _rate(lambda i: handler.publish_status({**status, 'progress': i % 100}), iterations)
+
+    handler.outbox.set_online(False)
+    offline = _rate(lambda i: handler.publish_status({**status, 'progress': i % 100}), iterations)
+    buffered = handler.outbox.get_stats()
+    handler.close()
+    return {
+        'online_per_s': online,
+        'offline_per_s': offline,
+        'offline_spooled': buffered['spooled'],
+        'published': client.publish_count
+    }
+
+
+BENCHMARKS = {
+    'generation': lambda config, workdir, scale: bench_generation(config, 200 * scale),
+    'command_latency': lambda config, workdir, scale: bench_command_latency(config, workdir, 20 * scale),
+    'db_writes': lambda config, workdir, scale: bench_db_writes(config, workdir, 2000 * scale),
+    'status_publish': lambda config, workdir, scale: bench_status_publish(config, workdir, 5000 * scale),
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names: List[str], scale: int = 1) -> Dict[str, Any]:
+    """Run benchmarks in a scratch directory
+
+    Args:
+        names: Benchmarks to run (keys of BENCHMARKS)
+        scale: Multiplier for iteration counts
+
+    Returns:
+        dict: Environment metadata and per-benchmark results
+    """
+    random.seed(0)
+    with open(CONFIG_PATH, 'r') as f:
+        config = yaml.safe_load(f)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bambu-bench-') as workdir:
+        for name in names:
+            start = time.perf_counter()
+            results[name] = BENCHMARKS[name](config, workdir, scale)
+            results[name]['duration_s'] = time.perf_counter() - start
+            print(f"{name}: done in {results[name]['duration_s']:.1f}s", file=sys.stderr)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale
+        },
+        'results': results
+    }
+
+
+def _flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = float(value)
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Compare results against a baseline
+
+    Metrics ending in _per_s are better when higher, those ending in _ms
+    or _us better when lower; other values are listed without a verdict.
+
+    Returns:
+        list: name, baseline, current, change (fraction) and whether it regressed
+    """
+    now = _flatten(current['results'])
+    before = _flatten(baseline['results'])
+    rows = []
+    for name in sorted(now.keys() & before.keys()):
+        if name.endswith('duration_s') or not before[name]:
+            continue
+        change = now[name] / before[name] - 1
+        if name.endswith('_per_s'):
+            worse = -change
+        elif name.endswith(('_ms', '_us')):
+            worse = change
+        else:
+            worse = None
+        rows.append({'name': name, 'baseline': before[name], 'current': now[name],
+                     'change': change, 'worse_by': worse})
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the printer control hot paths")
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON results file")
+    parser.add_argument('--baseline', help="results file to compare against")
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help="fail if a metric is worse than the baseline by more than this fraction")
+    parser.add_argument('--scale', type=int, default=1, help="iteration count multiplier")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args.names or list(BENCHMARKS), args.scale)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results['results'], indent=2))
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    failed = False
+    for row in compare(results, baseline):
+        verdict = ''
+        if row['worse_by'] is not None and args.max_regression is not None \
+                and row['worse_by'] > args.max_regression:
+            verdict = '  REGRESSION'
+            failed = True
+        print(f"{row['name']:45s} {row['baseline']:14.3f} -> {row['current']:14.3f} "
+              f"({row['change']:+.1%}){verdict}")
+    return 1 if failed else 0
@@ -8,16 +8,32 @@ Modules:
     - gcode_generator: G-code generation utilities
     - position_manager: Print position management
     - database: Print history database
+
+The classes below are imported on first access, so importing one
+submodule does not load SQLAlchemy or the printer client.
 """
 
-from .printer_controller import PrinterController
-from .gcode_generator import GCodeGenerator
-from .position_manager import PrintPositionManager
-from .database import DatabaseManager
+import importlib
+
+_EXPORTS = {
+    'PrinterController': 'printer_controller',
+    'GCodeGenerator': 'gcode_generator',
+    'PrintPositionManager': 'position_manager',
+    'DatabaseManager': 'database'
+}
 
 __all__ = [
     'PrinterController',
     'GCodeGenerator',
     'PrintPositionManager',
     'DatabaseManager'
-] 
+]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,408 @@
+import math
+import time
+import logging
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .pipeline import PipelinedExecutor
+
+DEFAULT_RATES = {
+    'bed_heat_rate': 0.6,       # degC/s while heating
+    'bed_cool_coeff': 0.004,    # 1/s, Newton cooling constant
+    'nozzle_heat_rate': 4.0,
+    'nozzle_cool_coeff': 0.02,
+}
+
+HEATERS = ('bed', 'nozzle')
+
+
+class ThermalModel:
+    """Heat-up and cool-down times of the bed and nozzle
+
+    Heating is modelled at a constant rate. Cooling follows Newton's law,
+    dT/dt = -k (T - ambient), so cooling slows down close to ambient.
+    Both heaters change at the same time, so a transition takes as long
+    as the slower of the two plus a fixed settle time.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """Initialize thermal model
+
+        Args:
+            config: Campaign configuration including:
+                - ambient_temp: Room temperature in degC
+                - settle_time: Seconds added to every temperature change
+                - bed_heat_rate / nozzle_heat_rate: Heating rates in degC/s
+                - bed_cool_coeff / nozzle_cool_coeff: Newton cooling constants in 1/s
+        """
+        config = config or {}
+        self.ambient = config.get('ambient_temp', 25.0)
+        self.settle_time = config.get('settle_time', 30.0)
+        self.rates = {key: config.get(key, default) for key, default in DEFAULT_RATES.items()}
+        self.measured: Dict[str, int] = {}
+
+    def fit(self, history: Dict[str, np.ndarray], max_gap: float = 60.0,
+            min_slope: float = 0.05, min_samples: int = 5):
+        """Estimate rates from status samples
+
+        Uses the slope between consecutive samples. Rising slopes give the
+        heating rate (median), falling slopes the cooling constant (median
+        of -slope / (T - ambient)). Heaters with too few samples keep their
+        configured rates.
+
+        Args:
+            history: Columns ts, bed_temp and nozzle_temp, e.g. from
+                TelemetryStore.query
+            max_gap: Ignore sample pairs further apart than this (s)
+            min_slope: Minimum |degC/s| counted as heating or cooling
+            min_samples: Slopes required to replace a configured rate
+        """
+        ts = np.asarray(history.get('ts', []), dtype=np.float64)
+        if len(ts) < 2:
+            return
+        dt = np.diff(ts)
+        for heater in HEATERS:
+            temps = np.asarray(history.get(f'{heater}_temp', []), dtype=np.float64)
+            if len(temps) != len(ts):
+                continue
+            slope = np.diff(temps) / np.where(dt > 0, dt, np.nan)
+            valid = (dt > 0) & (dt <= max_gap) & ~np.isnan(slope)
+            heating = slope[valid & (slope > min_slope)]
+            if len(heating) >= min_samples:
+                self.rates[f'{heater}_heat_rate'] = float(np.median(heating))
+                self.measured[f'{heater}_heat_rate'] = len(heating)
+
+            excess = (temps[:-1] + temps[1:]) / 2 - self.ambient
+            cooling = valid & (slope < -min_slope) & (excess > 5)
+            if cooling.sum() >= min_samples:
+                self.rates[f'{heater}_cool_coeff'] = float(np.median(-slope[cooling] / excess[cooling]))
+                self.measured[f'{heater}_cool_coeff'] = int(cooling.sum())
+
+    def heater_times(self, heater: str, start: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """Seconds for one heater to go from start to target (broadcasting)"""
+        start = np.asarray(start, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        heat = np.maximum(target - start, 0) / self.rates[f'{heater}_heat_rate']
+        # Cooling to (almost) ambient would take forever; stop 1 degC above it
+        floor = self.ambient + 1.0
+        ratio = np.maximum(start - self.ambient, 1.0) / np.maximum(target - self.ambient, floor - self.ambient)
+        cool = np.log(np.maximum(ratio, 1.0)) / self.rates[f'{heater}_cool_coeff']
+        return np.where(target >= start, heat, cool)
+
+    def transition_times(self, start: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """Seconds to go from (bed, nozzle) start to target temperatures
+
+        Args:
+            start: (..., 2) array of bed and nozzle temperatures
+            target: (..., 2) array, broadcast against start
+
+        Returns:
+            np.ndarray: Transition times including settle time where anything changes
+        """
+        start = np.asarray(start, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        bed = self.heater_times('bed', start[..., 0], target[..., 0])
+        nozzle = self.heater_times('nozzle', start[..., 1], target[..., 1])
+        moving = (np.abs(start - target) >= 1.0).any(axis=-1)
+        return np.maximum(bed, nozzle) + np.where(moving, self.settle_time, 0.0)
+
+
+def order_path(cost: np.ndarray, start_cost: np.ndarray, exact_limit: int = 9) -> List[int]:
+    """Order nodes to minimize the cost of an open path
+
+    Costs may be asymmetric (heating and cooling differ). Small instances
+    are solved exactly (Held-Karp); larger ones start from nearest
+    neighbour and are improved by or-opt moves, which relocate segments
+    of one to three nodes without reversing them.
+
+    Args:
+        cost: (n, n) cost of going from node i to node j
+        start_cost: (n,) cost of going from the start state to node i
+
+    Returns:
+        list: Node order
+    """
+    n = len(start_cost)
+    if n <= 1:
+        return list(range(n))
+    if n <= exact_limit:
+        return _held_karp(cost, start_cost)
+
+    path = [int(np.argmin(start_cost))]
+    remaining = np.ones(n, dtype=bool)
+    remaining[path[0]] = False
+    while remaining.any():
+        row = np.where(remaining, cost[path[-1]], np.inf)
+        path.append(int(np.argmin(row)))
+        remaining[path[-1]] = False
+    return _or_opt(path, cost, start_cost)
+
+
+def _held_karp(cost: np.ndarray, start_cost: np.ndarray) -> List[int]:
+    n = len(start_cost)
+    full = 1 << n
+    best = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int64)
+    for i in range(n):
+        best[1 << i, i] = start_cost[i]
+    for mask in range(1, full):
+        row = best[mask]
+        if not np.isfinite(row).any():
+            continue
+        for j in range(n):
+            if mask & (1 << j):
+                continue
+            candidates = row + cost[:, j]
+            i = int(np.argmin(candidates))
+            nxt = mask | (1 << j)
+            if candidates[i] < best[nxt, j]:
+                best[nxt, j] = candidates[i]
+                parent[nxt, j] = i
+    mask = full - 1
+    last = int(np.argmin(best[mask]))
+    path = []
+    while last >= 0:
+        path.append(last)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    return path[::-1]
+
+
+def _or_opt(path: List[int], cost: np.ndarray, start_cost: np.ndarray,
+            max_passes: int = 100) -> List[int]:
+    n = len(path)
+    # Closed tour through a depot node n: leaving the depot costs
+    # start_cost, returning to it is free, so the tour cost is the path cost
+    full = np.zeros((n + 1, n + 1))
+    full[:n, :n] = cost
+    full[n, :n] = start_cost
+    tour = [n] + list(path)
+
+    for _ in range(max_passes):
+        improved = False
+        for length in (1, 2, 3):
+            for i in range(1, n - length + 2):
+                k = i + length - 1
+                first, last = tour[i], tour[k]
+                before, after = tour[i - 1], tour[(k + 1) % (n + 1)]
+                gain = full[before, first] + full[last, after] - full[before, after]
+                rest = tour[:i] + tour[k + 1:]
+                heads = np.array(rest)
+                tails = np.roll(heads, -1)
+                delta = full[heads, first] + full[last, tails] - full[heads, tails] - gain
+                delta[i - 1] = np.inf  # current place
+                j = int(np.argmin(delta))
+                if delta[j] < -1e-9:
+                    tour = rest[:j + 1] + tour[i:k + 1] + rest[j + 1:]
+                    improved = True
+        if not improved:
+            break
+
+    depot = tour.index(n)
+    return tour[depot + 1:] + tour[:depot]
+
+
+class CampaignPlanner:
+    """Order a parameter sweep to minimize time spent changing temperature
+
+    Parameter sets with the same temperatures are grouped and kept in
+    submission order; the groups are ordered as an open-path travelling
+    salesman problem over (bed_temp, nozzle_temp), starting from the
+    printer's current temperatures, with transition times from a
+    ThermalModel fitted to recent status history.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 history: Optional[Callable[[float, float], Dict[str, np.ndarray]]] = None,
+                 estimate: Optional[Callable[[Dict[str, Any]], float]] = None):
+        """Initialize campaign planner
+
+        Args:
+            config: Campaign configuration including:
+                - square_time: Estimated seconds to print one square
+                - history_hours: Status history used to fit heating rates
+                - max_sets: Largest accepted campaign
+                - plus the ThermalModel keys
+            history: Returns status samples for (start, end), e.g. TelemetryStore.query
+            estimate: Returns the seconds to print one parameter set once the
+                printer is at its temperatures; square_time is used without it
+        """
+        self.config = config or {}
+        self.square_time = self.config.get('square_time', 240.0)
+        self.estimate = estimate
+        self.history_hours = self.config.get('history_hours', 24)
+        self.max_sets = self.config.get('max_sets', 500)
+        self.history = history
+        self.logger = logging.getLogger(__name__)
+
+    def thermal_model(self) -> ThermalModel:
+        """Thermal model fitted to the recent status history"""
+        model = ThermalModel(self.config)
+        if self.history is not None:
+            end = time.time()
+            try:
+                model.fit(self.history(end - self.history_hours * 3600, end))
+            except Exception as e:
+                self.logger.warning(f"Using configured heating rates: {e}")
+        return model
+
+    def plan(self, parameter_sets: List[Dict[str, Any]],
+             status: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Plan the execution order of a campaign
+
+        Args:
+            parameter_sets: Print parameters, each with bed_temp and nozzle_temp
+            status: Current printer status with bed_temp and nozzle_temp
+
+        Returns:
+            dict: order (indexes into parameter_sets), steps, estimated
+                makespan and transition time of the plan and of the
+                submitted order, and the heating rates used
+
+        Raises:
+            ValueError: If the campaign is empty, too large or lacks temperatures
+        """
+        if not parameter_sets:
+            raise ValueError("Campaign has no parameter sets")
+        if len(parameter_sets) > self.max_sets:
+            raise ValueError(f"Campaign has {len(parameter_sets)} sets, limit is {self.max_sets}")
+        try:
+            temps = np.array(
+                [(float(p['bed_temp']), float(p['nozzle_temp'])) for p in parameter_sets]
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Every parameter set needs bed_temp and nozzle_temp: {e}")
+
+        model = self.thermal_model()
+        status = status or {}
+        start = np.array([
+            _float(status.get('bed_temp'), model.ambient),
+            _float(status.get('nozzle_temp'), model.ambient)
+        ])
+
+        # Group identical temperature pairs; moving within a group is free
+        groups: Dict[Tuple[float, float], List[int]] = {}
+        for index, pair in enumerate(map(tuple, temps)):
+            groups.setdefault(pair, []).append(index)
+        nodes = np.array(list(groups))
+        cost = model.transition_times(nodes[:, None, :], nodes[None, :, :])
+        start_cost = model.transition_times(start[None, :], nodes)
+        group_order = order_path(cost, start_cost)
+        order = [index for g in group_order for index in groups[tuple(nodes[g])]]
+
+        square_times = self._square_times(parameter_sets)
+        planned = self._schedule(order, temps, start, model, square_times)
+        submitted = self._schedule(list(range(len(parameter_sets))), temps, start, model, square_times)
+        return {
+            'order': order,
+            'steps': planned['steps'],
+            'makespan': planned['makespan'],
+            'transition_time': planned['transition_time'],
+            'submitted_makespan': submitted['makespan'],
+            'submitted_transition_time': submitted['transition_time'],
+            'rates': dict(model.rates),
+            'measured_rates': dict(model.measured)
+        }
+
+    def _square_times(self, parameter_sets: List[Dict[str, Any]]) -> np.ndarray:
+        """Print time of each parameter set, excluding temperature transitions"""
+        times = np.full(len(parameter_sets), float(self.square_time))
+        if self.estimate is None:
+            return times
+        try:
+            for index, params in enumerate(parameter_sets):
+                times[index] = self.estimate(params)
+        except Exception as e:
+            self.logger.warning(f"Using configured square time: {e}")
+            times[:] = self.square_time
+        return times
+
+    def _schedule(self, order: List[int], temps: np.ndarray, start: np.ndarray,
+                  model: ThermalModel, square_times: np.ndarray) -> Dict[str, Any]:
+        """Estimated timeline of an order"""
+        path = temps[order]
+        previous = np.vstack([start[None, :], path[:-1]])
+        transitions = model.transition_times(previous, path)
+        durations = transitions + square_times[order]
+        starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]]) + transitions
+        return {
+            'steps': [
+                {
+                    'index': index,
+                    'bed_temp': float(path[i, 0]),
+                    'nozzle_temp': float(path[i, 1]),
+                    'transition_time': float(transitions[i]),
+                    'start_time': float(starts[i])
+                }
+                for i, index in enumerate(order)
+            ],
+            'makespan': float(durations.sum()),
+            'transition_time': float(transitions.sum())
+        }
+
+
+def _float(value: Any, default: float) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(value) else value
+
+
+def run_campaign(printer, parameter_sets: List[Dict[str, Any]], plan: Dict[str, Any],
+                 config: Optional[Dict[str, Any]] = None,
+                 on_step: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Print a planned campaign with a PipelinedExecutor
+
+    Args:
+        printer: PrinterController
+        parameter_sets: Parameter sets passed to CampaignPlanner.plan
+        plan: Result of CampaignPlanner.plan
+        config: PipelinedExecutor configuration
+        on_step: Called with a progress dict after each square is started;
+            its index refers to parameter_sets
+
+    Returns:
+        dict: Square IDs printed, indexes into parameter_sets that failed,
+            elapsed seconds and the gaps between squares
+    """
+    order = plan['order']
+
+    def step(progress: Dict[str, Any]):
+        if on_step:
+            on_step({**progress, 'index': order[progress['index']]})
+
+    result = PipelinedExecutor(printer, config).run(
+        [parameter_sets[index] for index in order], on_step=step
+    )
+    result['failed'] = [order[i] for i in result['failed']]
+    return result
+
+
+def campaign_commands(payload: Dict[str, Any], plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split a planned 'campaign' command into 'print' commands
+
+    The commands are in plan order. Their correlation ID and idempotency
+    key are the campaign's with the step appended, so every square is
+    acknowledged on its own and a resent campaign is not printed twice.
+
+    Args:
+        payload: The 'campaign' command message
+        plan: Result of CampaignPlanner.plan for its parameter_sets
+
+    Returns:
+        list: One 'print' command message per square
+    """
+    parameter_sets = payload.get('parameter_sets', [])
+    correlation_id = payload.get('correlation_id')
+    idempotency_key = payload.get('idempotency_key')
+    return [
+        {
+            'action': 'print',
+            'parameters': parameter_sets[index],
+            'priority': payload.get('priority', 0),
+            'correlation_id': None if correlation_id is None else f"{correlation_id}:{step}",
+            'idempotency_key': None if idempotency_key is None else f"{idempotency_key}:{step}"
+        }
+        for step, index in enumerate(plan['order'])
+    ]
@@ -0,0 +1,251 @@
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional
+
+# Link states
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LinkMonitor:
+    """Circuit breaker and health metrics for one connection
+
+    Health is judged passively from the outcome and latency of the calls
+    that are made anyway; nothing is sent just to probe the link. Failures
+    mark the link degraded, and failure_threshold failures in a row open
+    the circuit. While open, check() makes a single reconnect attempt once
+    the backoff delay has passed (half-open). Each failed attempt doubles
+    the delay up to max_delay, with random jitter so that several clients
+    do not retry in lockstep.
+    """
+
+    def __init__(self, name: str, connect: Optional[Callable[[], bool]] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        """Initialize link monitor
+
+        Args:
+            name: Link name used in logs and metrics
+            connect: Makes one connection attempt and returns success; None
+                if the link reconnects by itself and is only observed
+            config: Connection configuration including:
+                - failure_threshold: Consecutive failures that open the circuit
+                - recovery_successes: Consecutive successes to leave degraded
+                - latency_threshold: Average call latency (s) counted as degraded
+                - base_delay: First reconnect delay in seconds
+                - max_delay: Reconnect delay cap in seconds
+                - jitter: Random fraction added to or removed from each delay
+        """
+        config = config or {}
+        self.name = name
+        self.connect = connect
+        self.failure_threshold = config.get('failure_threshold', 3)
+        self.recovery_successes = config.get('recovery_successes', 3)
+        self.latency_threshold = config.get('latency_threshold', 2.0)
+        self.base_delay = config.get('base_delay', 1.0)
+        self.max_delay = config.get('max_delay', 300.0)
+        self.jitter = config.get('jitter', 0.2)
+        self.logger = logging.getLogger(__name__)
+
+        self.state = OPEN  # until the first successful call or connect
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._successes = 0
+        self._attempts = 0
+        self._next_attempt = 0.0
+        self._state_since = time.time()
+        self._latency_avg: Optional[float] = None
+        self.metrics = {
+            'uptime_total': 0.0,
+            'downtime_total': 0.0,
+            'reconnect_attempts': 0,
+            'reconnects': 0,
+            'calls': 0,
+            'failures': 0,
+            'latency_max': 0.0,
+            'state_changes': 0,
+            'last_error': None
+        }
+
+    @property
+    def available(self) -> bool:
+        """Whether calls should be made over the link"""
+        return self.state in (HEALTHY, DEGRADED)
+
+    def _set_state(self, state: str):
+        """Change state and account time spent in the old one (caller holds the lock)"""
+        if state == self.state:
+            return
+        now = time.time()
+        key = 'uptime_total' if self.state in (HEALTHY, DEGRADED) else 'downtime_total'
+        self.metrics[key] += now - self._state_since
+        self.logger.info(f"Link {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._state_since = now
+        self.metrics['state_changes'] += 1
+
+    def _schedule_retry(self):
+        """Set the next reconnect time with exponential backoff (caller holds the lock)"""
+        delay = min(self.max_delay, self.base_delay * (2 ** self._attempts))
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._next_attempt = time.monotonic() + delay
+        self._attempts += 1
+
+    def record_success(self, latency: Optional[float] = None):
+        """Record a call that succeeded
+
+        Args:
+            latency: Duration of the call in seconds
+        """
+        with self._lock:
+            self.metrics['calls'] += 1
+            self._failures = 0
+            self._successes += 1
+            if latency is not None:
+                self._latency_avg = latency if self._latency_avg is None \
+                    else 0.8 * self._latency_avg + 0.2 * latency
+                self.metrics['latency_max'] = max(self.metrics['latency_max'], latency)
+
+            if self.state in (OPEN, HALF_OPEN):
+                self._attempts = 0
+                self._successes = 0
+                self._set_state(HEALTHY)
+            elif self._latency_avg is not None and self._latency_avg > self.latency_threshold:
+                self._set_state(DEGRADED)
+            elif self.state == DEGRADED and self._successes >= self.recovery_successes:
+                self._set_state(HEALTHY)
+
+    def record_failure(self, error: Any = None):
+        """Record a call that failed
+
+        Args:
+            error: Exception or message describing the failure
+        """
+        with self._lock:
+            self.metrics['calls'] += 1
+            self.metrics['failures'] += 1
+            if error is not None:
+                self.metrics['last_error'] = str(error)
+            self._successes = 0
+            self._failures += 1
+
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._set_state(OPEN)
+                    self._schedule_retry()
+            elif self.state == HEALTHY:
+                self._set_state(DEGRADED)
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run a call over the link and record its outcome
+
+        Raises:
+            ConnectionError: If the circuit is open
+        """
+        if not self.available:
+            raise ConnectionError(f"{self.name} link is {self.state}")
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.perf_counter() - start)
+        return result
+
+    def check(self) -> bool:
+        """Reconnect once if the circuit is open and the backoff has passed
+
+        Never waits; returns immediately when no attempt is due.
+
+        Returns:
+            bool: True if the link is available
+        """
+        with self._lock:
+            if self.state != OPEN or self.connect is None:
+                return self.available
+            if time.monotonic() < self._next_attempt:
+                return False
+            self._set_state(HALF_OPEN)
+            self.metrics['reconnect_attempts'] += 1
+
+        start = time.perf_counter()
+        try:
+            connected = self.connect()
+        except Exception as e:
+            self.logger.error(f"Reconnect of {self.name} failed: {e}")
+            connected = False
+
+        if connected:
+            self.metrics['reconnects'] += 1
+            self.record_success(time.perf_counter() - start)
+        else:
+            self.record_failure(f"reconnect attempt {self._attempts + 1} failed")
+        return self.available
+
+    def mark_connected(self):
+        """Record a connection made outside check(), e.g. by a client's own loop"""
+        with self._lock:
+            if self.state in (OPEN, HALF_OPEN) and self.metrics['state_changes']:
+                self.metrics['reconnects'] += 1
+        self.record_success()
+
+    def mark_disconnected(self, error: Any = None):
+        """Open the circuit right away, e.g. on a disconnect callback"""
+        with self._lock:
+            if error is not None:
+                self.metrics['last_error'] = str(error)
+            if self.state != OPEN:
+                self._set_state(OPEN)
+                self._schedule_retry()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get health metrics
+
+        Returns:
+            dict: State, seconds in state, uptime/downtime totals, reconnect
+                counts, call/failure counts and latency
+        """
+        with self._lock:
+            now = time.time()
+            metrics = dict(self.metrics)
+            in_state = now - self._state_since
+            key = 'uptime_total' if self.available else 'downtime_total'
+            metrics[key] += in_state
+            metrics.update({
+                'state': self.state,
+                'state_seconds': in_state,
+                'uptime': in_state if self.available else 0.0,
+                'latency_avg': self._latency_avg,
+                'consecutive_failures': self._failures,
+                'next_attempt_in': max(self._next_attempt - time.monotonic(), 0.0)
+                if self.state == OPEN else 0.0
+            })
+            return metrics
+
+
+class ConnectionSupervisor:
+    """Shared supervision of the system's links"""
+
+    def __init__(self):
+        self.links: Dict[str, LinkMonitor] = {}
+
+    def add(self, link: LinkMonitor) -> LinkMonitor:
+        """Register a link"""
+        self.links[link.name] = link
+        return link
+
+    def check(self) -> Dict[str, bool]:
+        """Give every open link its due reconnect attempt
+
+        Returns:
+            dict: Link name -> available
+        """
+        return {name: link.check() for name, link in self.links.items()}
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get metrics of every link"""
+        return {name: link.get_metrics() for name, link in self.links.items()}
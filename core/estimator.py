@@ -0,0 +1,434 @@
+import math
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Seconds for commands whose duration the G-code does not describe
+DEFAULT_COMMAND_TIMES = {
+    'G28': 10.0,     # homing
+    'G29': 60.0,     # bed leveling
+    'G380': 1.0,     # probing move
+    'M970': 15.0,    # vibration compensation
+    'M970.3': 15.0,
+    'M983': 10.0,    # extrusion calibration
+    'M984': 10.0,
+}
+
+# Sections of a template
+START = 0
+OBJECT = 1
+END = 2
+
+_HEATERS = {'M104': ('nozzle', False), 'M109': ('nozzle', True),
+            'M140': ('bed', False), 'M190': ('bed', True)}
+
+
+def _words(code: str) -> Dict[str, float]:
+    """Parse parameter words like X1.5 into a dict"""
+    words = {}
+    for word in code.split()[1:]:
+        try:
+            words[word[0].upper()] = float(word[1:])
+        except (ValueError, IndexError):
+            pass
+    return words
+
+
+def parse_gcode(chunks: Iterable[str], sections: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+    """Parse G-code into arrays of moves
+
+    Positioning modes (G90/G91, M82/M83), G92, feedrates (F) and
+    accelerations (M204 S) are tracked. Arcs (G2/G3) become single moves
+    with their arc length.
+
+    Args:
+        chunks: G-code text, as one string or consecutive chunks
+        sections: Section id per chunk, recorded for every move and event
+
+    Returns:
+        dict: 'length', 'direction' (n, 3), 'extrude', 'feed' (mm/s),
+            'accel', 'section' arrays per move; 'events' as (move index,
+            section, kind, value) where kind is 'dwell', 'command' or a
+            (heater, wait) tuple
+    """
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    sections = list(sections) if sections is not None else None
+
+    pos = [0.0, 0.0, 0.0]
+    e_pos = 0.0
+    absolute = True
+    e_relative = False
+    feed = 50.0
+    accel = None
+
+    lengths: List[float] = []
+    directions: List[Tuple[float, float, float]] = []
+    extrudes: List[float] = []
+    feeds: List[float] = []
+    accels: List[float] = []
+    move_sections: List[int] = []
+    events: List[Tuple[int, int, Any, float]] = []
+
+    for chunk_index, chunk in enumerate(chunks):
+        section = sections[chunk_index] if sections is not None else START
+        for line in chunk.splitlines():
+            code = line.split(';', 1)[0].strip()
+            if not code:
+                continue
+            command = code.split(None, 1)[0].upper()
+
+            if command in ('G0', 'G1', 'G2', 'G3'):
+                words = _words(code)
+                if 'F' in words and words['F'] > 0:
+                    feed = words['F'] / 60.0
+                target = list(pos)
+                for axis, key in enumerate('XYZ'):
+                    if key in words:
+                        target[axis] = words[key] if absolute else pos[axis] + words[key]
+                extrude = 0.0
+                if 'E' in words:
+                    extrude = words['E'] if e_relative else words['E'] - e_pos
+                    e_pos = e_pos + words['E'] if e_relative else words['E']
+
+                delta = [target[axis] - pos[axis] for axis in range(3)]
+                if command in ('G2', 'G3') and ('I' in words or 'J' in words):
+                    length = _arc_length(pos, target, words, command == 'G2')
+                else:
+                    length = math.sqrt(sum(d * d for d in delta))
+                chord = math.sqrt(sum(d * d for d in delta))
+                if length == 0 and extrude == 0:
+                    pos = target
+                    continue
+
+                lengths.append(length if length > 0 else abs(extrude))
+                directions.append(tuple(d / chord for d in delta) if chord > 0 else (0.0, 0.0, 0.0))
+                extrudes.append(extrude)
+                feeds.append(feed)
+                accels.append(np.nan if accel is None else accel)
+                move_sections.append(section)
+                pos = target
+
+            elif command == 'G90':
+                absolute = True
+            elif command == 'G91':
+                absolute = False
+            elif command == 'M82':
+                e_relative = False
+            elif command == 'M83':
+                e_relative = True
+            elif command == 'G92':
+                words = _words(code)
+                if 'E' in words:
+                    e_pos = words['E']
+                for axis, key in enumerate('XYZ'):
+                    if key in words:
+                        pos[axis] = words[key]
+            elif command == 'M204':
+                words = _words(code)
+                if 'S' in words and words['S'] > 0:
+                    accel = words['S']
+            elif command in ('G4', 'M400'):
+                words = _words(code)
+                seconds = words.get('S', 0.0) + words.get('P', 0.0) / 1000.0
+                if seconds > 0:
+                    events.append((len(lengths), section, 'dwell', seconds))
+            elif command in _HEATERS:
+                words = _words(code)
+                if 'S' in words:
+                    events.append((len(lengths), section, _HEATERS[command], words['S']))
+            else:
+                events.append((len(lengths), section, 'command', command))
+
+    return {
+        'length': np.array(lengths, dtype=np.float64),
+        'direction': np.array(directions, dtype=np.float64).reshape(-1, 3),
+        'extrude': np.array(extrudes, dtype=np.float64),
+        'feed': np.array(feeds, dtype=np.float64),
+        'accel': np.array(accels, dtype=np.float64),
+        'section': np.array(move_sections, dtype=np.int8),
+        'events': events
+    }
+
+
+def _arc_length(start: List[float], end: List[float], words: Dict[str, float], clockwise: bool) -> float:
+    """Length of a G2/G3 arc, including full circles and helical Z"""
+    cx = start[0] + words.get('I', 0.0)
+    cy = start[1] + words.get('J', 0.0)
+    radius = math.hypot(start[0] - cx, start[1] - cy)
+    a0 = math.atan2(start[1] - cy, start[0] - cx)
+    a1 = math.atan2(end[1] - cy, end[0] - cx)
+    sweep = (a0 - a1) if clockwise else (a1 - a0)
+    sweep %= 2 * math.pi
+    if sweep < 1e-9:
+        sweep = 2 * math.pi * max(words.get('P', 1.0), 1.0)
+    return math.hypot(radius * sweep, end[2] - start[2])
+
+
+def move_times(moves: Dict[str, Any], max_velocity: float, default_accel: float,
+               max_accel: float, square_corner_velocity: float) -> np.ndarray:
+    """Seconds per move with trapezoidal velocity profiles
+
+    Junction speeds between moves follow the square corner velocity
+    model: full speed when going straight, down to zero on a reversal.
+    Backward and forward passes then limit every junction to what the
+    acceleration allows over the moves up to the next slower junction,
+    and each move takes the time of its trapezoid (or triangle, if
+    cruise speed is never reached).
+
+    Args:
+        moves: Result of parse_gcode
+        max_velocity: Speed cap in mm/s
+        default_accel: Acceleration before the first M204, mm/s^2
+        max_accel: Acceleration cap in mm/s^2
+        square_corner_velocity: Speed through a 90 degree corner in mm/s
+
+    Returns:
+        np.ndarray: Time of each move
+    """
+    length = moves['length']
+    if not len(length):
+        return np.zeros(0)
+    v = np.minimum(moves['feed'], max_velocity)
+    a = np.minimum(np.where(np.isnan(moves['accel']), default_accel, moves['accel']), max_accel)
+
+    # Junction speed between move i and i+1
+    d = moves['direction']
+    cos_turn = np.clip(-(d[:-1] * d[1:]).sum(axis=1), -1.0, 1.0)
+    sin_half = np.sqrt(0.5 * (1.0 - cos_turn))
+    a_junction = np.minimum(a[:-1], a[1:])
+    deviation = square_corner_velocity ** 2 * (math.sqrt(2) - 1) / a_junction
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = np.where(sin_half < 1 - 1e-9, deviation * sin_half / (1 - sin_half), np.inf)
+    v_junction = np.minimum(np.sqrt(a_junction * radius), np.minimum(v[:-1], v[1:]))
+    # Moves without XYZ motion (retractions) stop the toolhead
+    still = ~d.any(axis=1)
+    v_junction[still[:-1] | still[1:]] = 0.0
+
+    # Lookahead over the whole sequence: with S the cumulative 2*a*length,
+    # a node speed is limited by every later node (deceleration,
+    # v_k^2 <= v_j^2 + S_j - S_k) and every earlier one (acceleration,
+    # v_k^2 <= v_j^2 + S_k - S_j)
+    reach = 2 * a * length
+    s = np.concatenate([[0.0], np.cumsum(reach)])
+    v2 = np.concatenate([[0.0], v_junction, [0.0]]) ** 2
+    v2 = np.minimum.accumulate((v2 + s)[::-1])[::-1] - s
+    v2 = np.minimum.accumulate(v2 - s) + s
+    v_node = np.sqrt(np.maximum(v2, 0.0))
+    v0 = v_node[:-1]
+    v1 = v_node[1:]
+
+    peak = np.sqrt((reach + v0 ** 2 + v1 ** 2) / 2)
+    triangle = peak < v
+    accel_distance = (v ** 2 - v0 ** 2) / (2 * a) + (v ** 2 - v1 ** 2) / (2 * a)
+    trapezoid_time = (v - v0) / a + (v - v1) / a + (length - accel_distance) / v
+    triangle_time = (2 * peak - v0 - v1) / a
+    return np.where(triangle, triangle_time, trapezoid_time)
+
+
+class GCodeEstimator:
+    """Print time and filament estimates for generated G-code
+
+    A template is parsed once, split into start G-code, object and end
+    G-code, and the motion time of each section is cached. An estimate
+    for a square or a batch then only simulates the heaters: every
+    M109/M190 waits for its heater, which moves toward its last target
+    during motion, at the rates of a ThermalModel.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 thermal_model=None):
+        """Initialize estimator
+
+        Args:
+            config: Estimator configuration including:
+                - max_velocity: Speed cap in mm/s
+                - default_accel / max_accel: Accelerations in mm/s^2
+                - square_corner_velocity: Corner speed in mm/s
+                - filament_diameter: mm
+                - filament_density: g/cm^3
+                - command_times: Seconds per command the G-code does not time
+            thermal_model: Heating and cooling rates (default: configured rates)
+        """
+        config = config or {}
+        self.max_velocity = config.get('max_velocity', 500.0)
+        self.default_accel = config.get('default_accel', 10000.0)
+        self.max_accel = config.get('max_accel', 10000.0)
+        self.square_corner_velocity = config.get('square_corner_velocity', 5.0)
+        self.filament_area = math.pi * (config.get('filament_diameter', 1.75) / 2) ** 2
+        self.filament_density = config.get('filament_density', 1.24)
+        self.command_times = {**DEFAULT_COMMAND_TIMES, **config.get('command_times', {})}
+        if thermal_model is None:
+            # Imported here: campaign imports the printer controller, which uses this module
+            from .campaign import ThermalModel
+            thermal_model = ThermalModel()
+        self.thermal_model = thermal_model
+        self.logger = logging.getLogger(__name__)
+        self._cache: Dict[Tuple[str, Tuple[float, float]], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def estimate_gcode(self, gcode: str) -> Dict[str, float]:
+        """Estimate arbitrary G-code, heaters starting at ambient
+
+        Returns:
+            dict: time, motion_time, heating_time, filament_mm and filament_g
+        """
+        moves = parse_gcode(gcode)
+        times = self._times(moves)
+        timeline = [(moves['events'], times)]
+        return self._summary(times.sum(), moves['extrude'].sum(), *self._simulate(timeline, None))
+
+    def _times(self, moves: Dict[str, Any]) -> np.ndarray:
+        return move_times(moves, self.max_velocity, self.default_accel,
+                          self.max_accel, self.square_corner_velocity)
+
+    def template_sections(self, generator) -> Dict[str, Any]:
+        """Parsed and timed sections of a generator's template (cached)
+
+        The template is rendered at its own origin and temperatures; the
+        temperature events that follow the print parameters are marked so
+        estimates can substitute them.
+        """
+        compiled = generator.compiled
+        key = (generator.template_hash, compiled.origin)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        nozzle = compiled.nozzle_temp if compiled.nozzle_temp is not None else 0.0
+        bed = compiled.bed_temp if compiled.bed_temp is not None else 0.0
+        parts = compiled.render_sections(compiled.origin, nozzle, bed)
+        moves = parse_gcode(parts, [START, OBJECT, END])
+        times = self._times(moves)
+
+        sections = {}
+        for section in (START, OBJECT, END):
+            mask = moves['section'] == section
+            indexes = np.flatnonzero(mask)
+            offset = indexes[0] if len(indexes) else None
+            events = []
+            for index, event_section, kind, value in moves['events']:
+                if event_section != section:
+                    continue
+                if isinstance(kind, tuple):
+                    # Temperatures that follow the parameters, as in CompiledTemplate
+                    template_value = nozzle if kind[0] == 'nozzle' else bed
+                    value = (kind, value if value != template_value else None)
+                    kind = 'heater'
+                local = index - offset if offset is not None else 0
+                events.append((max(local, 0), kind, value))
+            sections[section] = {
+                'times': times[mask],
+                'extrude': float(moves['extrude'][mask].sum()),
+                'events': events
+            }
+        with self._lock:
+            self._cache[key] = sections
+        return sections
+
+    def estimate(self, generator, parameter_sets: List[Dict[str, Any]],
+                 start_temps: Optional[Tuple[float, float]] = None) -> Dict[str, float]:
+        """Estimate a job of one square, or a batch of several
+
+        Args:
+            generator: GCodeGenerator producing the job
+            parameter_sets: Print parameters per square (one job)
+            start_temps: Current (bed, nozzle) temperatures; ambient if unknown
+
+        Returns:
+            dict: time, motion_time, heating_time, filament_mm and filament_g
+        """
+        sections = self.template_sections(generator)
+        first = parameter_sets[0]
+        timeline = []
+        motion = 0.0
+        extrude = 0.0
+
+        def add(section: Dict[str, Any], params: Dict[str, Any], extra=()):
+            events = list(extra)
+            for index, kind, value in section['events']:
+                if kind == 'heater':
+                    (heater, wait), temp = value
+                    if temp is None:
+                        temp = float(params['nozzle_temp' if heater == 'nozzle' else 'bed_temp'])
+                    kind, value = (heater, wait), temp
+                events.append((index, None, kind, value))
+            timeline.append((events, section['times']))
+
+        add(sections[START], first)
+        previous_nozzle = float(first['nozzle_temp'])
+        for i, params in enumerate(parameter_sets):
+            extra = []
+            if i and float(params['nozzle_temp']) != previous_nozzle:
+                extra.append((0, None, ('nozzle', True), float(params['nozzle_temp'])))
+            previous_nozzle = float(params['nozzle_temp'])
+            add(sections[OBJECT], params, extra)
+            motion += sections[OBJECT]['times'].sum()
+            extrude += sections[OBJECT]['extrude']
+        add(sections[END], parameter_sets[-1])
+        for section in (START, END):
+            motion += sections[section]['times'].sum()
+            extrude += sections[section]['extrude']
+
+        return self._summary(motion, extrude, *self._simulate(timeline, start_temps))
+
+    def _simulate(self, timeline: List[Tuple[list, np.ndarray]],
+                  start_temps: Optional[Tuple[float, float]]) -> Tuple[float, float]:
+        """Walk the events in time order, returning (heating wait, other waits)"""
+        model = self.thermal_model
+        ambient = model.ambient
+        bed, nozzle = start_temps if start_temps is not None else (ambient, ambient)
+        # heater -> [temperature when target was set, target, clock when set]
+        heaters = {'bed': [float(bed), float(bed), 0.0], 'nozzle': [float(nozzle), float(nozzle), 0.0]}
+        clock = 0.0
+        heating = 0.0
+        waits = 0.0
+
+        for events, times in timeline:
+            elapsed = np.concatenate([[0.0], np.cumsum(times)])
+            base = clock
+            for index, _, kind, value in events:
+                clock = max(clock, base + elapsed[min(index, len(times))])
+                if kind == 'dwell':
+                    waits += value
+                    clock += value
+                elif kind == 'command':
+                    seconds = self.command_times.get(value, 0.0)
+                    waits += seconds
+                    clock += seconds
+                else:
+                    heater, wait = kind
+                    state = heaters[heater]
+                    current = self._temperature(heater, state, clock)
+                    if wait:
+                        seconds = float(model.heater_times(heater, current, value))
+                        heating += seconds
+                        clock += seconds
+                        current = value
+                    heaters[heater] = [current, value, clock]
+            clock = max(clock, base + elapsed[-1])
+        return heating, waits
+
+    def _temperature(self, heater: str, state: List[float], clock: float) -> float:
+        """Temperature of a heater moving toward its target since state was set"""
+        start, target, since = state
+        elapsed = max(clock - since, 0.0)
+        rates = self.thermal_model.rates
+        if target >= start:
+            return min(target, start + rates[f'{heater}_heat_rate'] * elapsed)
+        ambient = self.thermal_model.ambient
+        cooled = ambient + (start - ambient) * math.exp(-rates[f'{heater}_cool_coeff'] * elapsed)
+        return max(target, cooled)
+
+    def _summary(self, motion: float, extrude: float, heating: float, waits: float) -> Dict[str, float]:
+        filament_mm = max(float(extrude), 0.0)
+        return {
+            'time': float(motion + heating + waits),
+            'motion_time': float(motion),
+            'heating_time': float(heating),
+            'filament_mm': filament_mm,
+            'filament_g': filament_mm * self.filament_area * self.filament_density / 1000.0
+        }
@@ -0,0 +1,407 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+from .printer_controller import PrinterController, IDLE_STATES, state_name
+from .telemetry import TelemetryStore
+from .job_queue import JobQueue
+from .campaign import CampaignPlanner, campaign_commands
+
+
+def printer_config(config: Dict[str, Any], printer: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the controller configuration for one fleet printer
+
+    Each printer gets its own database, backup directory, telemetry
+    directory and job queue database, so a corrupt or locked database
+    only affects that printer.
+
+    Args:
+        config: Full system configuration
+        printer: Entry of the 'printers' list
+
+    Returns:
+        dict: Configuration for PrinterController
+    """
+    serial = printer['serial']
+    database = dict(config['database'])
+    root, ext = os.path.splitext(database['path'])
+    database['path'] = printer.get('database_path', f"{root}_{serial}{ext}")
+    database['backup_dir'] = os.path.join(database.get('backup_dir', 'backups'), serial)
+    telemetry = dict(config.get('telemetry', {}))
+    telemetry['dir'] = os.path.join(telemetry.get('dir', 'telemetry'), serial)
+    job_queue = dict(config.get('queue', {}))
+    root, ext = os.path.splitext(job_queue.get('path', 'job_queue.db'))
+    job_queue['path'] = f"{root}_{serial}{ext}"
+    return {
+        **config,
+        'printer': printer,
+        'grid': {**config['grid'], **printer.get('grid', {})},
+        'database': database,
+        'telemetry': telemetry,
+        'queue': job_queue,
+    }
+
+
+class FleetMember:
+    """One printer of the fleet with its own durable job queue
+
+    Jobs dispatched to the printer are stored in its own JobQueue, so
+    they survive a restart, and the queue's worker only takes the next
+    one once the printer has finished the previous one. A status thread
+    refreshes the printer's status, which is also sampled into the
+    printer's telemetry, and backs up the database when due. Everything
+    that can block or fail for this printer happens on its own threads.
+    """
+
+    def __init__(self, name: str, controller: PrinterController,
+                 publish: Callable[[Dict[str, Any], str], None],
+                 status_interval: float = 5,
+                 telemetry: Optional[TelemetryStore] = None,
+                 queue_config: Optional[Dict[str, Any]] = None,
+                 ack: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Initialize fleet member
+
+        Args:
+            name: Printer name
+            controller: Controller for this printer
+            publish: Called with (status, serial) to publish status
+            status_interval: Seconds between status refreshes
+            telemetry: Store for this printer's status samples
+            queue_config: JobQueue configuration for this printer's jobs
+            ack: Publishes job acknowledgements
+        """
+        self.name = name
+        self.controller = controller
+        self.serial = controller.config['printer']['serial']
+        self.publish = publish
+        self.status_interval = status_interval
+        self.telemetry = telemetry
+        self.logger = logging.getLogger(f"{__name__}.{name}")
+
+        self.jobs = JobQueue(
+            queue_config or {}, self._execute, ack or (lambda message: None),
+            ready=controller.ready_for_job
+        )
+        self.busy = False
+        self.printing = False
+        self.last_status: Dict[str, Any] = {'status': 'disconnected'}
+        self.completed = 0
+        self.failed = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        controller.subscribe_completions(self._on_completion)
+
+    @property
+    def load(self) -> int:
+        """Jobs queued, being started or printing on this printer"""
+        return self.jobs.get_stats()['pending'] + (1 if self.busy or self.printing else 0)
+
+    def is_idle(self) -> bool:
+        """Whether a job sent now would start right away"""
+        return (
+            self.controller.connected
+            and self.load == 0
+            and state_name(self.last_status.get('status')) in IDLE_STATES
+        )
+
+    def start(self):
+        """Start the job queue and the status thread"""
+        self._stopping.clear()
+        self.jobs.start()
+        self._thread = threading.Thread(target=self._run, name=f"fleet-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop after the current job; queued jobs stay stored for the next start"""
+        self._stopping.set()
+        self.jobs.stop(timeout)
+        if self._thread:
+            self._thread.join(timeout)
+        if self.telemetry:
+            self.telemetry.flush()
+
+    def submit(self, payload: Dict[str, Any]):
+        """Store a 'print' or 'batch' command for this printer and acknowledge it"""
+        self.jobs.submit(payload)
+
+    def _on_completion(self, square_ids: List[str], status: str):
+        if status == 'completed':
+            self.completed += len(square_ids)
+        else:
+            self.failed += len(square_ids)
+        self.printing = False
+        self.jobs.notify()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._refresh_status()
+            self._stopping.wait(self.status_interval)
+
+    def _execute(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Start a queued job (JobQueue handler)"""
+        self.busy = True
+        try:
+            if payload.get('action') == 'batch':
+                square_ids = self.controller.start_batch(payload.get('parameter_sets', []))
+                result = bool(square_ids)
+                response = {'square_ids': square_ids}
+            else:
+                result = self.controller.start_print(payload.get('parameters', {}))
+                response = {'square_id': self.controller.current_position.get('id')}
+            if result:
+                self.printing = True
+            else:
+                self.failed += 1
+            response = {
+                'status': 'printing' if result else 'error',
+                'printer': self.name,
+                **response,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self.publish(response, self.serial)
+            return response
+        except Exception as e:
+            self.failed += 1
+            self.logger.error(f"Error executing job on {self.name}: {e}")
+            return {'status': 'error', 'error': str(e), 'printer': self.name}
+        finally:
+            self.busy = False
+
+    def _refresh_status(self):
+        try:
+            if not self.controller.check_connection():
+                self.last_status = {'status': 'disconnected'}
+                return
+            self.last_status = self.controller.get_status()
+            if self.telemetry:
+                self.telemetry.append(self.last_status, job=self.controller.current_position.get('id'))
+            self.publish(self.last_status, self.serial)
+
+            db_manager = self.controller.db_manager
+            if db_manager.check_backup_needed():
+                db_manager.create_backup()
+                db_manager.cleanup_old_backups()
+        except Exception as e:
+            self.logger.error(f"Error refreshing status of {self.name}: {e}")
+
+
+class FleetManager:
+    """Run one controller per printer and dispatch jobs across them
+
+    Every job is stored in the queue of the printer it is dispatched to
+    (see FleetMember). A 'campaign' is planned once and its squares are
+    dispatched one by one, so they spread over the printers.
+    """
+
+    def __init__(self, config: Dict[str, Any],
+                 publish: Callable[[Dict[str, Any], str], None],
+                 ack: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 printer_factory: Optional[Callable[..., Any]] = None):
+        """Initialize fleet manager
+
+        Args:
+            config: Full system configuration with a 'printers' list
+            publish: Called with (status, serial) to publish status
+            ack: Publishes job acknowledgements
+            printer_factory: Creates printer clients, see PrinterController
+        """
+        self.config = config
+        self.publish = publish
+        self.logger = logging.getLogger(__name__)
+        fleet_config = config.get('fleet', {})
+        self.temp_weight = fleet_config.get('temp_weight', 1.0)
+        self.campaign_planner = CampaignPlanner(config.get('campaign', {}))
+
+        self.members: List[FleetMember] = []
+        for printer in config['printers']:
+            name = printer.get('name', printer['serial'])
+            try:
+                member_config = printer_config(config, printer)
+                controller = PrinterController(member_config, printer_factory=printer_factory)
+                self.members.append(FleetMember(
+                    name, controller, publish,
+                    status_interval=fleet_config.get('status_interval', 5),
+                    telemetry=TelemetryStore(member_config['telemetry']),
+                    queue_config=member_config['queue'],
+                    ack=ack
+                ))
+            except Exception as e:
+                self.logger.error(f"Failed to initialize printer {name}: {e}")
+        self._lock = threading.Lock()
+
+    def connect(self) -> int:
+        """Connect all printers in parallel
+
+        Returns:
+            int: Number of printers connected
+        """
+        if not self.members:
+            return 0
+        with ThreadPoolExecutor(max_workers=len(self.members)) as pool:
+            results = list(pool.map(lambda m: m.controller.connect(), self.members))
+        for member, connected in zip(self.members, results):
+            if not connected:
+                self.logger.warning(f"Printer {member.name} is not connected")
+        return sum(bool(r) for r in results)
+
+    def start(self):
+        """Start all member workers"""
+        for member in self.members:
+            member.start()
+
+    def stop(self):
+        """Stop all member workers and close their databases"""
+        for member in self.members:
+            member.stop(timeout=30)
+            member.controller.db_manager.close()
+
+    def score(self, member: FleetMember, params: Dict[str, Any]) -> tuple:
+        """Dispatch score of a printer for a job, lower is better
+
+        Orders by queued/running jobs first, then by how far the current
+        temperatures are from the job's targets, then prefers the printer
+        with more free squares.
+        """
+        status = member.last_status
+        temp_distance = 0.0
+        for key in ('bed_temp', 'nozzle_temp'):
+            try:
+                temp_distance += abs(float(status.get(key, 0)) - float(params.get(key, 0)))
+            except (TypeError, ValueError):
+                pass
+        return (
+            member.load,
+            0 if member.is_idle() else 1,
+            self.temp_weight * temp_distance,
+            -member.controller.position_manager.free_count()
+        )
+
+    def select(self, params: Dict[str, Any], squares: int = 1) -> Optional[FleetMember]:
+        """Pick the printer for a job
+
+        Args:
+            params: Print parameters of the job (the first square of a batch)
+            squares: Squares the job prints
+
+        Returns:
+            FleetMember: Best printer, or None if none is connected with free squares
+        """
+        candidates = [
+            member for member in self.members
+            if member.controller.connected
+            and member.controller.position_manager.free_count() >= member.load + squares
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda member: self.score(member, params))
+
+    def submit(self, payload: Dict[str, Any]):
+        """Handle a command message (MQTTHandler.command_dispatcher)
+
+        'print' and 'batch' commands are queued on one printer and a
+        'campaign' is split into 'print' commands; other actions are
+        answered with an error.
+
+        Args:
+            payload: Decoded command message
+        """
+        action = payload.get('action')
+        if action == 'campaign':
+            self.submit_campaign(payload)
+            return
+        if action == 'print':
+            params = payload.get('parameters', {})
+            squares = 1
+        elif action == 'batch':
+            parameter_sets = payload.get('parameter_sets') or [{}]
+            params = parameter_sets[0]
+            squares = len(parameter_sets)
+        else:
+            self.logger.error(f"Unsupported command in fleet mode: {action}")
+            self.publish({
+                'status': 'error',
+                'error': f"action {action!r} is not supported in fleet mode",
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }, None)
+            return
+
+        with self._lock:
+            member = self.select(params, squares)
+            if member:
+                member.submit(payload)
+
+        if member is None:
+            self.logger.error(f"No printer available for {action} job")
+            self.publish({
+                'status': 'error',
+                'error': 'no printer available',
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }, None)
+            return
+
+        self.logger.info(f"Dispatched {action} job to {member.name}")
+        self.publish({
+            'status': 'queued',
+            'printer': member.name,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }, member.serial)
+
+    def submit_campaign(self, payload: Dict[str, Any]):
+        """Plan a parameter sweep and dispatch its squares
+
+        The plan starts from the temperatures of the least loaded printer
+        and is published first; with dry_run set nothing is dispatched.
+        The squares are dispatched in plan order as 'print' commands (see
+        campaign_commands), each to the printer select() picks for it.
+
+        Args:
+            payload: Command message with parameter_sets and optional dry_run
+        """
+        status = min(self.members, key=lambda m: m.load).last_status if self.members else None
+        try:
+            plan = self.campaign_planner.plan(payload.get('parameter_sets', []), status)
+        except ValueError as e:
+            self.logger.error(f"Rejected campaign: {e}")
+            self.publish({
+                'status': 'error',
+                'error': str(e),
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }, None)
+            return
+
+        planned = {
+            'status': 'planned',
+            'order': plan['order'],
+            'makespan': plan['makespan'],
+            'transition_time': plan['transition_time'],
+            'submitted_makespan': plan['submitted_makespan'],
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if payload.get('dry_run'):
+            self.publish({**planned, 'steps': plan['steps'], 'rates': plan['rates']}, None)
+            return
+        self.publish(planned, None)
+        for command in campaign_commands(payload, plan):
+            self.submit(command)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get a summary of the fleet
+
+        Returns:
+            dict: Per-printer state, load and job counts
+        """
+        return {
+            member.name: {
+                'serial': member.serial,
+                'connected': member.controller.connected,
+                'status': member.last_status.get('status'),
+                'load': member.load,
+                'free_squares': member.controller.position_manager.free_count(),
+                'completed': member.completed,
+                'failed': member.failed
+            }
+            for member in self.members
+        }
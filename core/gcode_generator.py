@@ -1,25 +1,492 @@
+import re
+import hashlib
+from io import BytesIO
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .threemf import DeflateBlock, create_3mf_package, DEFAULT_COMPRESSION_LEVEL, GCODE_LOCATION
+from .metrics import span
+
+DEFAULT_TEMPLATE_PATH = "template/10x10 0.1.gcode"
+DEFAULT_ORIGIN = (32.4, 145)  # grid start position the template was sliced at
+
+# Slot kinds in a compiled template
+SLOT_X = 0
+SLOT_Y = 1
+SLOT_NOZZLE = 2
+SLOT_BED = 3
+
+_MOVE_RE = re.compile(r'^\s*G[0-3](?:\s|$)')
+_AXIS_RE = re.compile(r'(?<=\s)([XY])(-?\d*\.?\d+)')
+_TEMP_RE = re.compile(r'^\s*(M10[49]|M1[49]0)\s+S(\d*\.?\d+)')
+_PLACEHOLDER_RE = re.compile(r'\[(nozzle_temperature|bed_temperature)\]')
+_CONFIG_NOZZLE_RE = re.compile(r'^; nozzle_temperature = (\d*\.?\d+)', re.M)
+_LEVELING_RE = re.compile(
+    r'^(\s*G29 A1 )X(-?\d*\.?\d+) Y(-?\d*\.?\d+) I(\d*\.?\d+) J(\d*\.?\d+)', re.M
+)
+_LEAD_RETRACT_RE = re.compile(r'^G1 E-\d*\.?\d+(?: F\d+)?[ \t]*\n', re.M)
+
+
+class CompiledTemplate:
+    """G-code template parsed once into literal fragments and numeric slots
+
+    The template text is split so that every translatable X/Y word of the
+    printed object and every temperature that follows the print parameters
+    becomes a slot. Rendering fills all slots in one vectorized pass and
+    joins the result once.
+    """
+
+    def __init__(self, text: str, origin: Tuple[float, float] = DEFAULT_ORIGIN):
+        """Compile template text
+
+        Args:
+            text: Raw template G-code
+            origin: Grid position the template's object was sliced at
+        """
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.nozzle_temp, self.bed_temp = self._detect_temperatures(text)
+
+        fragments: List[str] = []
+        kinds: List[int] = []
+        values: List[float] = []
+        pending: List[str] = []
+
+        def add_slot(kind: int, value: float):
+            fragments.append(''.join(pending))
+            pending.clear()
+            kinds.append(kind)
+            values.append(value)
+
+        # (fragment index, offset) where the object region starts and ends
+        marks: List[Tuple[int, int]] = []
+
+        def mark():
+            marks.append((len(fragments), sum(len(text) for text in pending)))
+
+        in_executable = False
+        in_object = False
+        seen_object = False
+        conditional_depth = 0
+        absolute = True
+
+        for line in text.splitlines(keepends=True):
+            stripped = line.strip()
+
+            if stripped == '; EXECUTABLE_BLOCK_START':
+                in_executable = True
+            elif stripped == '; EXECUTABLE_BLOCK_END':
+                in_executable = False
+                if in_object:
+                    mark()
+                in_object = False
+            elif in_executable and stripped == '; CHANGE_LAYER' and not seen_object:
+                mark()
+                in_object = seen_object = True
+            elif in_object and stripped == '; FEATURE: Custom':
+                mark()
+                in_object = False
+
+            code = stripped.split(';', 1)[0].split()
+            command = code[0] if code else ''
+            if in_executable:
+                if command == 'G90':
+                    absolute = True
+                elif command == 'G91':
+                    absolute = False
+                elif command == 'M622' and len(code) > 1 and code[1].startswith('J'):
+                    conditional_depth += 1
+                elif command == 'M623' and conditional_depth:
+                    conditional_depth -= 1
+
+            line_slots = []  # (start, end, kind, value)
+            if in_object and absolute and not conditional_depth and _MOVE_RE.match(line):
+                code_end = line.find(';')
+                code_part = line if code_end < 0 else line[:code_end]
+                for match in _AXIS_RE.finditer(code_part):
+                    kind = SLOT_X if match.group(1) == 'X' else SLOT_Y
+                    line_slots.append(
+                        (match.start(2), match.end(2), kind, float(match.group(2)))
+                    )
+            elif in_executable:
+                match = _TEMP_RE.match(line)
+                if match:
+                    value = float(match.group(2))
+                    is_nozzle = match.group(1) in ('M104', 'M109')
+                    if is_nozzle and value == self.nozzle_temp:
+                        line_slots.append((match.start(2), match.end(2), SLOT_NOZZLE, value))
+                    elif not is_nozzle and value == self.bed_temp:
+                        line_slots.append((match.start(2), match.end(2), SLOT_BED, value))
+
+            for match in _PLACEHOLDER_RE.finditer(line):
+                kind = SLOT_NOZZLE if match.group(1) == 'nozzle_temperature' else SLOT_BED
+                line_slots.append((match.start(), match.end(), kind, np.nan))
+
+            if not line_slots:
+                pending.append(line)
+                continue
+
+            cursor = 0
+            for start, end, kind, value in sorted(line_slots):
+                pending.append(line[cursor:start])
+                add_slot(kind, value)
+                cursor = end
+            pending.append(line[cursor:])
+
+        fragments.append(''.join(pending))
+        if len(marks) == 1:
+            marks.append((len(fragments) - 1, len(fragments[-1])))
+
+        self.fragments = fragments
+        self.object_span = tuple(marks) if marks else None
+        self.kinds = np.array(kinds, dtype=np.int8)
+        self.values = np.array(values, dtype=np.float64)
+        self._masks = {kind: self.kinds == kind for kind in (SLOT_X, SLOT_Y, SLOT_NOZZLE, SLOT_BED)}
+
+    @staticmethod
+    def _detect_temperatures(text: str) -> Tuple[Optional[float], Optional[float]]:
+        """Find the nozzle and bed temperatures the template was sliced with
+
+        Returns:
+            tuple: (nozzle_temp, bed_temp), None where not found
+        """
+        nozzle = None
+        match = _CONFIG_NOZZLE_RE.search(text)
+        if match:
+            nozzle = float(match.group(1))
+
+        bed = None
+        start = text.find('; EXECUTABLE_BLOCK_START')
+        for match in re.finditer(r'^M140 S(\d*\.?\d+)', text[max(start, 0):], re.M):
+            if float(match.group(1)) > 0:
+                bed = float(match.group(1))
+                break
+        return nozzle, bed
+
+    def _slot_values(self, position: Tuple[float, float], nozzle_temp: float,
+                     bed_temp: float) -> List[str]:
+        """Fill and format all slots for one square"""
+        values = self.values.copy()
+        values[self._masks[SLOT_X]] += float(position[0]) - self.origin[0]
+        values[self._masks[SLOT_Y]] += float(position[1]) - self.origin[1]
+        values[self._masks[SLOT_NOZZLE]] = float(nozzle_temp)
+        values[self._masks[SLOT_BED]] = float(bed_temp)
+        return format_numbers(values)
+
+    def render(self, position: Tuple[float, float], nozzle_temp: float, bed_temp: float) -> str:
+        """Render G-code for one square
+
+        Args:
+            position: Absolute (x, y) of the square on the grid
+            nozzle_temp: Nozzle temperature
+            bed_temp: Bed temperature
+
+        Returns:
+            str: G-code text
+        """
+        parts = [None] * (2 * len(self.fragments) - 1)
+        parts[0::2] = self.fragments
+        parts[1::2] = self._slot_values(position, nozzle_temp, bed_temp)
+        return ''.join(parts)
+
+    def render_body(self, position: Tuple[float, float], nozzle_temp: float,
+                    bed_temp: float) -> List[str]:
+        """Render only the variable part of the G-code as chunks
+
+        The invariant text before the first slot (self.header) and after
+        the last slot (self.footer) is left out.
+
+        Args:
+            position: Absolute (x, y) of the square on the grid
+            nozzle_temp: Nozzle temperature
+            bed_temp: Bed temperature
+
+        Returns:
+            list: G-code chunks in order
+        """
+        if not len(self.kinds):
+            return []
+        parts = [None] * (2 * len(self.fragments) - 3)
+        parts[0::2] = self._slot_values(position, nozzle_temp, bed_temp)
+        parts[1::2] = self.fragments[1:-1]
+        return parts
+
+    def render_sections(self, position: Tuple[float, float], nozzle_temp: float,
+                        bed_temp: float) -> Tuple[str, str, str]:
+        """Render G-code for one square split around the printed object
+
+        Args:
+            position: Absolute (x, y) of the square on the grid
+            nozzle_temp: Nozzle temperature
+            bed_temp: Bed temperature
+
+        Returns:
+            tuple: (start G-code, object, end G-code)
+
+        Raises:
+            ValueError: If the template has no object region
+        """
+        if self.object_span is None:
+            raise ValueError("Template has no object region")
+        values = self._slot_values(position, nozzle_temp, bed_temp)
+        start, end = self.object_span
+        return (
+            self._section(values, (0, 0), start),
+            self._section(values, start, end),
+            self._section(values, end, (len(self.fragments) - 1, len(self.fragments[-1])))
+        )
+
+    def _section(self, values: List[str], start: Tuple[int, int], end: Tuple[int, int]) -> str:
+        """Join the rendered text between two (fragment index, offset) marks"""
+        (first, first_offset), (last, last_offset) = start, end
+        if first == last:
+            return self.fragments[first][first_offset:last_offset]
+        parts = [self.fragments[first][first_offset:]]
+        for index in range(first, last):
+            parts.append(values[index])
+            parts.append(self.fragments[index + 1] if index + 1 < last
+                         else self.fragments[last][:last_offset])
+        return ''.join(parts)
+
+    @property
+    def header(self) -> str:
+        """Invariant text before the first slot"""
+        return self.fragments[0] if len(self.kinds) else ''
+
+    @property
+    def footer(self) -> str:
+        """Invariant text after the last slot"""
+        return self.fragments[-1]
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+def format_numbers(values: np.ndarray) -> List[str]:
+    """Format numbers the way the slicer does (3 decimals, no trailing zeros)
+
+    Args:
+        values: Array of numbers
+
+    Returns:
+        list: Formatted strings
+    """
+    values = np.round(values, 3) + 0.0  # also folds -0.0 into 0.0
+    text = np.char.mod('%.3f', values)
+    text = np.char.rstrip(np.char.rstrip(text, '0'), '.')
+    return text.tolist()
+
+
 class GCodeGenerator:
-    def __init__(self):
-        self.template_path = "template/10x10 0.1.gcode"
-        with open(self.template_path, 'r') as f:
-            self.template = f.read()
-    
-    def generate_square_gcode(self, position, params):
+    def __init__(self, template_path: str = DEFAULT_TEMPLATE_PATH,
+                 origin: Tuple[float, float] = DEFAULT_ORIGIN,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                 cache_dir: Optional[str] = None):
+        """Load and compile the G-code template
+
+        Args:
+            template_path: Path to the template G-code file
+            origin: Grid position the template's object was sliced at
+            compression_level: zlib level used for 3MF packages
+            cache_dir: Keep the compiled template here, reused until the
+                template file changes
+        """
+        self.template_path = template_path
+        self.compression_level = compression_level
+        if cache_dir:
+            from .startup import load_cached
+            loaded = load_cached(
+                template_path, lambda path: self._compile(path, origin, compression_level),
+                key=f"{tuple(origin)!r}:{compression_level}", cache_dir=cache_dir
+            )
+        else:
+            loaded = self._compile(template_path, origin, compression_level)
+        self.template, self.template_hash, self.compiled, self.header_block, self.footer_block = loaded
+
+    @staticmethod
+    def _compile(template_path: str, origin: Tuple[float, float], compression_level: int) -> tuple:
+        """Read and compile a template
+
+        Returns:
+            tuple: Template text, its hash, the CompiledTemplate and the
+                compressed header and footer blocks
+        """
+        with open(template_path, 'r') as f:
+            template = f.read()
+        compiled = CompiledTemplate(template, origin)
+
+        # The invariant start and end of the template are compressed once
+        return (
+            template,
+            hashlib.sha256(template.encode()).hexdigest(),
+            compiled,
+            DeflateBlock(compiled.header.encode(), compression_level),
+            DeflateBlock(compiled.footer.encode(), compression_level, final=True)
+        )
+
+    def generate_square_gcode(self, position: Dict[str, Any], params: Dict[str, Any]) -> str:
         """Generate G-code for a single square
-        
+
+        Args:
+            position (dict): position information
+            params (dict): print parameters
+        """
+        return self.compiled.render(
+            position['position'],
+            params['nozzle_temp'],
+            params['bed_temp']
+        )
+
+    def generate_batch_gcode(self, squares: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                             z_lift: float = 1.0) -> List[str]:
+        """Generate G-code printing several squares as one job
+
+        The start and end G-code run once. Between squares the nozzle is
+        lifted and, if the next square uses another nozzle temperature,
+        heated with M109. Bed leveling covers all squares of the batch.
+
+        Args:
+            squares: (position, params) per square, all with the same bed_temp
+            z_lift: Height the nozzle is lifted to between squares
+
+        Returns:
+            list: G-code chunks in order
+
+        Raises:
+            ValueError: If squares is empty or bed temperatures differ
+        """
+        if not squares:
+            raise ValueError("No squares to batch")
+        bed_temps = {float(params['bed_temp']) for _, params in squares}
+        if len(bed_temps) > 1:
+            raise ValueError(f"Squares in a batch must share bed temperature, got {sorted(bed_temps)}")
+        bed_temp = bed_temps.pop()
+
+        chunks: List[str] = []
+        nozzle_temp = None
+        for index, (position, params) in enumerate(squares):
+            start, body, end = self.compiled.render_sections(
+                position['position'], params['nozzle_temp'], bed_temp
+            )
+            if index == 0:
+                chunks.append(self._widen_leveling(start, [p['position'] for p, _ in squares]))
+            else:
+                chunks.append(f"; BATCH_SQUARE {index + 1}/{len(squares)}\n")
+                chunks.append(f"G1 Z{z_lift:g} F1200\n")
+                if float(params['nozzle_temp']) != nozzle_temp:
+                    chunks.append(f"M109 S{float(params['nozzle_temp']):g}\n")
+                # The previous square ended retracted; do not retract twice
+                body = self._drop_lead_retract(body)
+            chunks.append(body)
+            nozzle_temp = float(params['nozzle_temp'])
+        chunks.append(end)
+        return chunks
+
+    def _widen_leveling(self, gcode: str, positions: List[Tuple[float, float]]) -> str:
+        """Make the bed leveling area cover every square of a batch"""
+        xs = [float(x) for x, _ in positions]
+        ys = [float(y) for _, y in positions]
+        origin_x, origin_y = self.compiled.origin
+
+        def widen(match):
+            x, y, width, depth = (float(v) for v in match.groups()[1:])
+            values = format_numbers(np.array([
+                min(xs) + x - origin_x,
+                min(ys) + y - origin_y,
+                max(xs) - min(xs) + width,
+                max(ys) - min(ys) + depth
+            ]))
+            return f"{match.group(1)}X{values[0]} Y{values[1]} I{values[2]} J{values[3]}"
+
+        return _LEVELING_RE.sub(widen, gcode, count=1)
+
+    @staticmethod
+    def _drop_lead_retract(body: str) -> str:
+        """Remove the retraction an object section starts with, if it precedes any move"""
+        match = _LEAD_RETRACT_RE.search(body)
+        if match is None or any(_MOVE_RE.match(line) for line in body[:match.start()].splitlines()):
+            return body
+        return body[:match.start()] + body[match.end():]
+
+    def create_batch_package(self, squares: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                             z_lift: float = 1.0,
+                             gcode_location: str = GCODE_LOCATION) -> BytesIO:
+        """Create a 3MF package printing several squares as one job
+
+        Args:
+            squares: (position, params) per square, all with the same bed_temp
+            z_lift: Height the nozzle is lifted to between squares
+            gcode_location: Location of the G-code inside the package
+
+        Returns:
+            io.BytesIO: 3MF package
+        """
+        with span('generate'):
+            chunks = self.generate_batch_gcode(squares, z_lift)
+        with span('zip'):
+            return create_3mf_package(chunks, gcode_location, self.compression_level)
+
+    def package_key(self, position: Dict[str, Any], params: Dict[str, Any],
+                    gcode_location: str = GCODE_LOCATION) -> str:
+        """Content hash identifying the package for a square
+
         Args:
             position (dict): position information
             params (dict): print parameters
+            gcode_location: Location of the G-code inside the package
+
+        Returns:
+            str: Hex digest
         """
-        gcode = self.template
-        
-        # replace position parameters
         x, y = position['position']
-        gcode = gcode.replace("X42.15", f"X{x}")
-        gcode = gcode.replace("Y154.75", f"Y{y}")
-        
-        # replace print parameters
-        gcode = gcode.replace("[nozzle_temperature]", str(params['nozzle_temp']))
-        gcode = gcode.replace("[bed_temperature]", str(params['bed_temp']))
-        
-        return gcode 
+        fields = (
+            self.template_hash,
+            repr(self.compiled.origin),
+            repr((float(x), float(y))),
+            repr(float(params['nozzle_temp'])),
+            repr(float(params['bed_temp'])),
+            str(self.compression_level),
+            gcode_location
+        )
+        return hashlib.sha256('\n'.join(fields).encode()).hexdigest()
+
+    def create_square_package(self, position: Dict[str, Any], params: Dict[str, Any],
+                              gcode_location: str = GCODE_LOCATION) -> BytesIO:
+        """Create a 3MF package for a single square
+
+        Only the part of the G-code that depends on position and
+        parameters is compressed; the template's invariant header and
+        footer are reused pre-compressed.
+
+        Args:
+            position (dict): position information
+            params (dict): print parameters
+            gcode_location: Location of the G-code inside the package
+
+        Returns:
+            io.BytesIO: 3MF package
+        """
+        with span('generate'):
+            body = self.compiled.render_body(
+                position['position'],
+                params['nozzle_temp'],
+                params['bed_temp']
+            )
+        with span('zip'):
+            return create_3mf_package(
+                body, gcode_location, self.compression_level,
+                header=self.header_block, footer=self.footer_block
+            )
+
+    def create_3mf_package(self, gcode: Union[str, Iterable[str]],
+                           gcode_location: str = GCODE_LOCATION) -> BytesIO:
+        """Create a 3MF package from arbitrary G-code
+
+        Args:
+            gcode: G-code text, as one string or an iterable of chunks
+            gcode_location: Location of the G-code inside the package
+
+        Returns:
+            io.BytesIO: 3MF package
+        """
+        return create_3mf_package(gcode, gcode_location, self.compression_level)
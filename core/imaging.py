@@ -0,0 +1,376 @@
+import os
+import time
+import uuid
+import base64
+import shutil
+import logging
+import threading
+from abc import ABC, abstractmethod
+from io import BytesIO
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, BinaryIO, Callable, List, Optional, Union
+
+DEFAULT_PART_SIZE = 5 * 1024 * 1024  # S3's minimum for all but the last part
+
+_CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+
+class ObjectStore(ABC):
+    """Object storage with multipart uploads
+
+    Backends implement the four multipart calls; upload() streams a file
+    through them, sending parts concurrently on an executor.
+    """
+
+    part_size = DEFAULT_PART_SIZE
+
+    @abstractmethod
+    def create_multipart(self, key: str, content_type: str) -> str:
+        """Start an upload and return its ID"""
+
+    @abstractmethod
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Store one part (numbered from 1) and return its ETag"""
+
+    @abstractmethod
+    def complete_multipart(self, key: str, upload_id: str, etags: List[str]) -> str:
+        """Assemble the parts in order and return the object's URL"""
+
+    @abstractmethod
+    def abort_multipart(self, key: str, upload_id: str):
+        """Discard the parts of an unfinished upload"""
+
+    def upload(self, key: str, stream: BinaryIO, content_type: str,
+               executor: Optional[ThreadPoolExecutor] = None, max_inflight: int = 4) -> str:
+        """Upload a stream part by part
+
+        At most max_inflight parts are read ahead of the ones being sent,
+        so memory stays bounded for large objects.
+
+        Args:
+            key: Object key
+            stream: Data to upload, read in part_size chunks
+            content_type: MIME type of the object
+            executor: Sends parts concurrently; parts go one by one without it
+            max_inflight: Parts read but not yet stored
+
+        Returns:
+            str: URL of the stored object
+        """
+        upload_id = self.create_multipart(key, content_type)
+        try:
+            pending: List[Future] = []
+            etags: List[str] = []
+            part_number = 1
+            while True:
+                data = stream.read(self.part_size)
+                if not data:
+                    break
+                if executor is None:
+                    etags.append(self.upload_part(key, upload_id, part_number, data))
+                else:
+                    pending.append(executor.submit(self.upload_part, key, upload_id, part_number, data))
+                    if len(pending) >= max_inflight:
+                        etags.append(pending.pop(0).result())
+                part_number += 1
+            etags.extend(future.result() for future in pending)
+            return self.complete_multipart(key, upload_id, etags)
+        except Exception:
+            self.abort_multipart(key, upload_id)
+            raise
+
+
+class LocalObjectStore(ObjectStore):
+    """Object store in a local directory, for testing and single-host setups
+
+    Parts are staged under <root>/.uploads/<upload_id>/ and concatenated
+    into <root>/<key> on completion.
+    """
+
+    def __init__(self, root: str, base_url: Optional[str] = None, part_size: int = DEFAULT_PART_SIZE):
+        """Initialize local store
+
+        Args:
+            root: Directory holding the objects
+            base_url: URL prefix under which root is served; file:// URLs without it
+            part_size: Bytes per uploaded part
+        """
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.part_size = part_size
+        os.makedirs(self.root, exist_ok=True)
+
+    def _staging(self, upload_id: str) -> str:
+        return os.path.join(self.root, '.uploads', upload_id)
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._staging(upload_id))
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        with open(os.path.join(self._staging(upload_id), f"{part_number:05d}"), 'wb') as f:
+            f.write(data)
+        return str(part_number)
+
+    def complete_multipart(self, key: str, upload_id: str, etags: List[str]) -> str:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = self._staging(upload_id)
+        tmp_path = f"{path}.{upload_id}.tmp"
+        with open(tmp_path, 'wb') as out:
+            for etag in etags:
+                with open(os.path.join(staging, f"{int(etag):05d}"), 'rb') as part:
+                    shutil.copyfileobj(part, out)
+        os.replace(tmp_path, path)
+        shutil.rmtree(staging, ignore_errors=True)
+        if self.base_url:
+            return f"{self.base_url}/{key}"
+        return f"file://{path}"
+
+    def abort_multipart(self, key: str, upload_id: str):
+        shutil.rmtree(self._staging(upload_id), ignore_errors=True)
+
+
+class S3ObjectStore(ObjectStore):
+    """Amazon S3 (or compatible) bucket; needs boto3"""
+
+    def __init__(self, bucket: str, prefix: str = '', region: Optional[str] = None,
+                 endpoint_url: Optional[str] = None, part_size: int = DEFAULT_PART_SIZE):
+        """Initialize S3 store
+
+        Args:
+            bucket: Bucket name
+            prefix: Prepended to every key
+            region: AWS region
+            endpoint_url: Endpoint of an S3-compatible service
+            part_size: Bytes per uploaded part, at least 5 MB
+        """
+        import boto3
+        self.client = boto3.client('s3', region_name=region, endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = max(part_size, DEFAULT_PART_SIZE)
+        self.endpoint_url = endpoint_url
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.prefix + key, ContentType=content_type
+        )
+        return response['UploadId']
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.prefix + key, UploadId=upload_id,
+            PartNumber=part_number, Body=data
+        )
+        return response['ETag']
+
+    def complete_multipart(self, key: str, upload_id: str, etags: List[str]) -> str:
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.prefix + key, UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'ETag': etag, 'PartNumber': number} for number, etag in enumerate(etags, 1)
+            ]}
+        )
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{self.prefix}{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{self.prefix}{key}"
+
+    def abort_multipart(self, key: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.prefix + key, UploadId=upload_id)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Failed to abort upload of {key}: {e}")
+
+
+def create_object_store(config: Dict[str, Any]) -> ObjectStore:
+    """Create the object store selected by config['store'] ('local' or 's3')"""
+    part_size = config.get('part_size', DEFAULT_PART_SIZE)
+    store = config.get('store', 'local')
+    if store == 's3':
+        return S3ObjectStore(
+            config['s3_bucket'],
+            prefix=config.get('s3_prefix', ''),
+            region=config.get('s3_region'),
+            endpoint_url=config.get('s3_endpoint_url'),
+            part_size=part_size
+        )
+    if store == 'local':
+        return LocalObjectStore(config.get('local_dir', 'images'), config.get('base_url'), part_size)
+    raise ValueError(f"Unknown image store: {store}")
+
+
+class ImagePipeline:
+    """Capture, encode and upload images of finished squares in the background
+
+    submit() only queues the work, so the print loop never waits for
+    the camera or the network. One thread captures and encodes (the
+    camera serves one client at a time); images are uploaded on a
+    separate pool and their parts sent in parallel on a third. Each
+    uploaded image is attached to the squares' print jobs and announced
+    through the publish callback.
+    """
+
+    def __init__(self, config: Dict[str, Any], camera: Callable[[], Union[str, bytes]],
+                 store: ObjectStore,
+                 attach: Callable[[str, str, datetime, datetime], Optional[bool]],
+                 publish: Callable[[str, str], None]):
+        """Initialize image pipeline
+
+        Args:
+            config: Imaging configuration including:
+                - frames: Images captured per finished job
+                - frame_interval: Seconds between those frames
+                - settle_delay: Seconds to wait after the job finished
+                - format: Encoding, 'jpeg' keeps the camera's frames as they are
+                - quality: Encoder quality when re-encoding
+                - max_size: Longest side in pixels, 0 to keep the camera's size
+                - upload_workers: Images uploaded at once, and threads sending parts
+                - max_pending: Queued jobs beyond which new ones are skipped
+                - key_prefix: Prepended to object keys
+            camera: Returns one frame, as JPEG bytes or base64 text
+            store: Destination for images
+            attach: Records (square_id, image_url, image_timestamp, finished_at)
+                on the print job
+            publish: Announces (image_url, square_id)
+        """
+        self.camera = camera
+        self.store = store
+        self.attach = attach
+        self.publish = publish
+        self.frames = config.get('frames', 1)
+        self.frame_interval = config.get('frame_interval', 0.5)
+        self.settle_delay = config.get('settle_delay', 0.0)
+        self.format = config.get('format', 'jpeg').lower()
+        self.quality = config.get('quality', 90)
+        self.max_size = config.get('max_size', 0)
+        self.max_pending = config.get('max_pending', 32)
+        self.key_prefix = config.get('key_prefix', '')
+        if self.format not in _CONTENT_TYPES:
+            raise ValueError(f"Unsupported image format: {self.format}")
+        self.logger = logging.getLogger(__name__)
+
+        self._capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-capture')
+        # Parts get their own pool; an upload waiting for its parts must not hold their workers
+        workers = config.get('upload_workers', 4)
+        self._upload_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+        self._part_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-part')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {
+            'captured': 0, 'uploaded': 0, 'bytes': 0, 'failed': 0,
+            'skipped': 0, 'outside_window': 0, 'last_seconds': 0.0
+        }
+
+    def submit(self, square_ids: List[str], status: str = 'completed') -> bool:
+        """Queue imaging of a finished job
+
+        Matches PrinterController.subscribe_completions, so the pipeline
+        can be subscribed directly.
+
+        Args:
+            square_ids: Squares printed by the job
+            status: Final status of the job
+
+        Returns:
+            bool: False if skipped because too much work is pending
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats['skipped'] += 1
+                self.logger.warning(f"Imaging backlog full, skipping square {', '.join(square_ids)}")
+                return False
+            self._pending += 1
+        self._capture_pool.submit(self._process, list(square_ids), time.monotonic(), datetime.now())
+        return True
+
+    def _process(self, square_ids: List[str], finished: float, finished_at: datetime):
+        """Capture, encode and upload the frames of one job"""
+        try:
+            delay = self.settle_delay - (time.monotonic() - finished)
+            if delay > 0:
+                time.sleep(delay)
+            for index in range(self.frames):
+                if index:
+                    time.sleep(self.frame_interval)
+                captured_at = datetime.now()
+                data = self._encode(self._capture())
+                with self._lock:
+                    self.stats['captured'] += 1
+                key = (f"{self.key_prefix}{square_ids[0]}/"
+                       f"{captured_at.strftime('%Y%m%dT%H%M%S')}_{index}.{_EXTENSIONS[self.format]}")
+                self._upload_pool.submit(self._upload, key, data, square_ids,
+                                         captured_at, finished, finished_at)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            self.logger.error(f"Failed to capture image of square {', '.join(square_ids)}: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _capture(self) -> bytes:
+        frame = self.camera()
+        if isinstance(frame, str):
+            frame = base64.b64decode(frame)
+        if not frame:
+            raise RuntimeError("Camera returned no frame")
+        return frame
+
+    def _encode(self, frame: bytes) -> bytes:
+        """Re-encode a JPEG frame if the configuration asks for it"""
+        if self.format == 'jpeg' and not self.max_size:
+            return frame
+        from PIL import Image
+        image = Image.open(BytesIO(frame))
+        if self.max_size:
+            image.thumbnail((self.max_size, self.max_size))
+        out = BytesIO()
+        image.save(out, format=self.format.upper(), quality=self.quality)
+        return out.getvalue()
+
+    def _upload(self, key: str, data: bytes, square_ids: List[str],
+                captured_at: datetime, finished: float, finished_at: datetime):
+        """Store one image, attach it to the squares' jobs and announce it"""
+        try:
+            url = self.store.upload(key, BytesIO(data), _CONTENT_TYPES[self.format], self._part_pool)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            self.logger.error(f"Failed to upload image {key}: {e}")
+            return
+        with self._lock:
+            self.stats['uploaded'] += 1
+            self.stats['bytes'] += len(data)
+            self.stats['last_seconds'] = time.monotonic() - finished
+
+        for square_id in square_ids:
+            try:
+                # Frames follow the finish, which may be long after the print started
+                matched = self.attach(square_id, url, captured_at, finished_at)
+                if matched is False:
+                    with self._lock:
+                        self.stats['outside_window'] += 1
+            except Exception as e:
+                self.logger.error(f"Failed to attach image to square {square_id}: {e}")
+            self.publish(url, square_id)
+        self.logger.info(f"Stored image of square {', '.join(square_ids)} at {url}")
+
+    def close(self):
+        """Finish queued captures and uploads"""
+        self._capture_pool.shutdown(wait=True)
+        self._upload_pool.shutdown(wait=True)
+        self._part_pool.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pipeline counters
+
+        Returns:
+            dict: Frames captured, images uploaded and their bytes, failures,
+                skipped jobs, pending jobs and seconds from finish to the last upload
+        """
+        with self._lock:
+            return {**self.stats, 'pending': self._pending}
@@ -0,0 +1,468 @@
+from sqlalchemy import (
+    create_engine, event, insert, update, select, delete, func,
+    Column, Integer, String, DateTime, Text, JSON, Index
+)
+from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime, timedelta
+import threading
+import logging
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from .log_pipeline import log_context
+
+Base = declarative_base()
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Acknowledgement states that are not job states
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+# Commands that start a print and so wait for the ready callback
+PRINT_ACTIONS = ('print', 'batch')
+
+
+class QueuedJob(Base):
+    __tablename__ = 'queued_jobs'
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String, unique=True)  # set by the sender, optional
+    correlation_id = Column(String)  # echoed in every acknowledgement
+    priority = Column(Integer, default=0)  # higher runs first
+    payload = Column(JSON)
+    status = Column(String)  # "pending", "running", "done", "failed"
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    result = Column(JSON)
+    error = Column(Text)
+
+    # claim order: highest priority, then oldest
+    __table_args__ = (
+        Index('ix_queued_jobs_status_priority_id', 'status', 'priority', 'id'),
+    )
+
+
+class JobQueue:
+    """Durable command queue executed by a pool of worker threads
+
+    Commands are stored in SQLite as soon as they arrive, so the MQTT
+    network thread only pays for one small insert. Workers claim pending
+    jobs highest priority first and run them through the handler. Every
+    state change is acknowledged with the sender's correlation ID.
+
+    A command carrying an idempotency key that was seen before is not run
+    again; its current state is acknowledged instead. When max_pending
+    jobs are waiting, new commands are rejected with a retry_after hint.
+    Jobs that were running when the process stopped are marked failed
+    rather than retried, since the printer may already have started them.
+
+    With batch_size above 1, a claimed 'print' job takes up to
+    batch_size - 1 further pending 'print' jobs with the same bed
+    temperature along, and they run as one 'batch' command.
+
+    Starting a print returns long before the print is done. When a
+    ready callback is given, no print job is claimed until it reports the
+    printer free and the previous print job has returned; notify() wakes
+    the workers early, e.g. from a completion callback. Other commands
+    are not held back, so with several workers they run while a print
+    job waits.
+    """
+
+    def __init__(self, config: Dict[str, Any],
+                 handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 ack: Callable[[Dict[str, Any]], None],
+                 ready: Optional[Callable[[], bool]] = None):
+        """Initialize job queue
+
+        Args:
+            config: Queue configuration including:
+                - path: SQLite database file
+                - workers: Number of worker threads
+                - max_pending: Pending jobs before new ones are rejected
+                - retry_after: Seconds suggested to rejected senders
+                - keep_days: Days to keep finished jobs
+                - batch_size: Print jobs merged into one batch at most
+                - poll_interval: Seconds between checks while the printer is busy
+            handler: Executes a command payload; returns a result dict whose
+                'status' is 'error' on failure
+            ack: Publishes an acknowledgement message
+            ready: Returns True when the printer can take the next job
+        """
+        self.path = config.get('path', 'job_queue.db')
+        self.workers = config.get('workers', 1)
+        self.max_pending = config.get('max_pending', 100)
+        self.retry_after = config.get('retry_after', 30)
+        self.keep_days = config.get('keep_days', 7)
+        self.batch_size = config.get('batch_size', 1)
+        self.poll_interval = config.get('poll_interval', 2.0)
+        self.handler = handler
+        self.ack = ack
+        self.ready = ready
+        self.logger = logging.getLogger(__name__)
+
+        self.engine = create_engine(f'sqlite:///{self.path}')
+        event.listen(self.engine, 'connect', self._configure_connection)
+        Base.metadata.create_all(self.engine)
+
+        # _cond guards the counters only; database work happens outside it
+        self._cond = threading.Condition()
+        self._claim_lock = threading.Lock()
+        self._printing = 0  # print jobs being executed
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self.stats = {'accepted': 0, 'duplicates': 0, 'rejected': 0, 'done': 0, 'failed': 0}
+
+        self._recover()
+        self._pending = self._count(PENDING)
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    def _count(self, status: str) -> int:
+        table = QueuedJob.__table__
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(table).where(table.c.status == status)
+            ).scalar()
+
+    def _recover(self):
+        """Fail jobs interrupted by a restart and drop old finished jobs"""
+        table = QueuedJob.__table__
+        cutoff = datetime.now() - timedelta(days=self.keep_days)
+        with self.engine.begin() as conn:
+            interrupted = conn.execute(
+                update(table)
+                .where(table.c.status == RUNNING)
+                .values(status=FAILED, finished_at=datetime.now(), error='interrupted by restart')
+            ).rowcount
+            conn.execute(
+                delete(table)
+                .where(table.c.status.in_((DONE, FAILED)))
+                .where(table.c.finished_at < cutoff)
+            )
+        if interrupted:
+            self.logger.warning(f"Marked {interrupted} interrupted jobs as failed")
+
+    def start(self):
+        """Start the worker threads"""
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.logger.info(f"Job queue started with {self.workers} workers, {self._pending} pending")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers after their current jobs; pending jobs stay queued"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.engine.dispose()
+
+    def notify(self):
+        """Wake idle workers to check for work again, e.g. after a print finished"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def submit(self, payload: Dict[str, Any]):
+        """Store a command message and acknowledge it (MQTTHandler.command_dispatcher)
+
+        The message may carry correlation_id, idempotency_key and priority
+        next to its action and parameters.
+
+        Args:
+            payload: Decoded command message
+        """
+        status, job_id, extra = self.enqueue(
+            payload,
+            priority=payload.get('priority', 0),
+            idempotency_key=payload.get('idempotency_key'),
+            correlation_id=payload.get('correlation_id')
+        )
+        self._ack(payload.get('correlation_id'), job_id, status, **extra)
+
+    def enqueue(self, payload: Dict[str, Any], priority: int = 0,
+                idempotency_key: Optional[str] = None,
+                correlation_id: Optional[str] = None) -> Tuple[str, Optional[int], Dict[str, Any]]:
+        """Store a command
+
+        Args:
+            payload: Command message
+            priority: Higher values run first
+            idempotency_key: Key identifying retries of the same command
+            correlation_id: ID echoed in acknowledgements
+
+        Returns:
+            tuple: (accepted/duplicate/rejected, job ID, extra ack fields)
+        """
+        table = QueuedJob.__table__
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            priority = 0
+
+        if idempotency_key is not None:
+            with self.engine.connect() as conn:
+                existing = conn.execute(
+                    select(table.c.id, table.c.status, table.c.result, table.c.error)
+                    .where(table.c.idempotency_key == str(idempotency_key))
+                ).first()
+            if existing:
+                with self._cond:
+                    self.stats['duplicates'] += 1
+                extra = {'job_status': existing.status}
+                if existing.result is not None:
+                    extra['result'] = existing.result
+                if existing.error:
+                    extra['error'] = existing.error
+                return DUPLICATE, existing.id, extra
+
+        # Reserve a slot first so the insert can run without the lock
+        with self._cond:
+            if self._pending >= self.max_pending:
+                self.stats['rejected'] += 1
+                self.logger.warning(f"Job queue full ({self._pending} pending), rejecting command")
+                return REJECTED, None, {'error': 'queue full', 'retry_after': self.retry_after}
+            self._pending += 1
+            position = self._pending
+
+        try:
+            with self.engine.begin() as conn:
+                job_id = conn.execute(insert(table).values(
+                    idempotency_key=None if idempotency_key is None else str(idempotency_key),
+                    correlation_id=correlation_id,
+                    priority=priority,
+                    payload=payload,
+                    status=PENDING,
+                    attempts=0,
+                    created_at=datetime.now()
+                )).inserted_primary_key[0]
+        except Exception:
+            with self._cond:
+                self._pending -= 1
+            raise
+
+        with self._cond:
+            self.stats['accepted'] += 1
+            self._cond.notify()
+
+        return ACCEPTED, job_id, {'position': position}
+
+    def _claim(self, printer_free: bool = True) -> List[Any]:
+        """Mark the next pending job, and any jobs batched with it, running
+
+        Args:
+            printer_free: Whether print jobs may be claimed
+        """
+        table = QueuedJob.__table__
+        columns = (table.c.id, table.c.correlation_id, table.c.payload)
+        order = (table.c.priority.desc(), table.c.id)
+        query = select(*columns).where(table.c.status == PENDING)
+        if not printer_free:
+            action = func.coalesce(func.json_extract(table.c.payload, '$.action'), '')
+            query = query.where(action.not_in(PRINT_ACTIONS))
+        with self.engine.begin() as conn:
+            row = conn.execute(query.order_by(*order).limit(1)).first()
+            if row is None:
+                return []
+            rows = [row]
+            bed_temp = _print_bed_temp(row.payload)
+            if self.batch_size > 1 and bed_temp is not None:
+                candidates = conn.execute(
+                    select(*columns)
+                    .where(table.c.status == PENDING)
+                    .where(table.c.id != row.id)
+                    .order_by(*order)
+                ).all()
+                rows += [
+                    candidate for candidate in candidates
+                    if _print_bed_temp(candidate.payload) == bed_temp
+                ][:self.batch_size - 1]
+            conn.execute(
+                update(table)
+                .where(table.c.id.in_([r.id for r in rows]))
+                .values(status=RUNNING, started_at=datetime.now(), attempts=table.c.attempts + 1)
+            )
+        with self._cond:
+            self._pending -= len(rows)
+        return rows
+
+    def _finish(self, job_id: int, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        table = QueuedJob.__table__
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    update(table)
+                    .where(table.c.id == job_id)
+                    .values(status=status, finished_at=datetime.now(), result=result, error=error)
+                )
+        except Exception as e:
+            self.logger.error(f"Failed to record result of job {job_id}: {e}")
+
+    def _next_jobs(self) -> List[Any]:
+        """Claim work once there is some and the printer can take it; [] when stopping"""
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait(5)
+                if not self._running:
+                    return []
+            with self._claim_lock:
+                jobs = []
+                # Behind a ready check, print jobs run one at a time
+                printer_free = self.ready is None or (not self._printing and self._is_ready())
+                try:
+                    jobs = self._claim(printer_free)
+                except Exception as e:
+                    self.logger.error(f"Failed to claim job: {e}")
+                if jobs:
+                    if self._gated(jobs):
+                        self._printing += 1
+                    return jobs
+            with self._cond:
+                if self._running:
+                    self._cond.wait(self.poll_interval)
+
+    def _gated(self, jobs: List[Any]) -> bool:
+        """Whether claimed jobs are print jobs held back by the ready check"""
+        return self.ready is not None and _is_print(jobs[0].payload)
+
+    def _is_ready(self) -> bool:
+        try:
+            return bool(self.ready())
+        except Exception as e:
+            self.logger.error(f"Failed to check whether the printer is ready: {e}")
+            return False
+
+    def _run(self):
+        while True:
+            jobs = self._next_jobs()
+            if not jobs:
+                return
+
+            try:
+                if len(jobs) == 1:
+                    with log_context(job_id=jobs[0].id):
+                        self._execute(jobs[0])
+                else:
+                    with log_context(job_id=[job.id for job in jobs]):
+                        self._execute_batch(jobs)
+            finally:
+                if self._gated(jobs):
+                    with self._claim_lock:
+                        self._printing -= 1
+                self.notify()
+
+    def _execute(self, job):
+        self._ack(job.correlation_id, job.id, RUNNING)
+        try:
+            result = self.handler(job.payload) or {}
+            if result.get('status') == 'error':
+                self._complete(job, FAILED, result=result, error=result.get('error'))
+            else:
+                self._complete(job, DONE, result=result)
+        except Exception as e:
+            self.logger.error(f"Job {job.id} failed: {e}")
+            self._complete(job, FAILED, error=str(e))
+
+    def _execute_batch(self, jobs: List[Any]):
+        """Run several print jobs as one 'batch' command"""
+        for job in jobs:
+            self._ack(job.correlation_id, job.id, RUNNING, batch=[j.id for j in jobs])
+        self.logger.info(f"Running jobs {[job.id for job in jobs]} as one batch")
+        try:
+            result = self.handler({
+                'action': 'batch',
+                'parameter_sets': [job.payload.get('parameters', {}) for job in jobs]
+            }) or {}
+        except Exception as e:
+            self.logger.error(f"Batch of jobs {[job.id for job in jobs]} failed: {e}")
+            for job in jobs:
+                self._complete(job, FAILED, error=str(e))
+            return
+
+        square_ids = result.get('square_ids') or []
+        for index, job in enumerate(jobs):
+            job_result = {
+                **{key: value for key, value in result.items() if key != 'square_ids'},
+                'square_id': square_ids[index] if index < len(square_ids) else None
+            }
+            if result.get('status') == 'error':
+                self._complete(job, FAILED, result=job_result, error=result.get('error'))
+            else:
+                self._complete(job, DONE, result=job_result)
+
+    def _complete(self, job, status: str, result: Optional[Dict[str, Any]] = None,
+                  error: Optional[str] = None):
+        self._finish(job.id, status, result, error)
+        with self._cond:
+            self.stats['done' if status == DONE else 'failed'] += 1
+        extra: Dict[str, Any] = {}
+        if result is not None:
+            extra['result'] = result
+        if error:
+            extra['error'] = error
+        self._ack(job.correlation_id, job.id, status, **extra)
+
+    def _ack(self, correlation_id: Optional[str], job_id: Optional[int], status: str, **extra):
+        message = {
+            'correlation_id': correlation_id,
+            'job_id': job_id,
+            'status': status,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **extra
+        }
+        try:
+            self.ack(message)
+        except Exception as e:
+            self.logger.error(f"Failed to publish acknowledgement: {e}")
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get a stored job
+
+        Returns:
+            dict: Job columns, or None if unknown
+        """
+        table = QueuedJob.__table__
+        with self.engine.connect() as conn:
+            row = conn.execute(select(table).where(table.c.id == job_id)).first()
+        return dict(row._mapping) if row else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue counters
+
+        Returns:
+            dict: Pending count, capacity and accepted/duplicate/rejected/done/failed counts
+        """
+        with self._cond:
+            return {'pending': self._pending, 'max_pending': self.max_pending, **self.stats}
+
+
+def _is_print(payload: Any) -> bool:
+    """Whether a payload is a command that starts a print"""
+    return isinstance(payload, dict) and payload.get('action') in PRINT_ACTIONS
+
+
+def _print_bed_temp(payload: Any) -> Optional[float]:
+    """Bed temperature of a 'print' command, None for anything else"""
+    if not isinstance(payload, dict) or payload.get('action') != 'print':
+        return None
+    try:
+        return float(payload.get('parameters', {})['bed_temp'])
+    except (KeyError, TypeError, ValueError):
+        return None
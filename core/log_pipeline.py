@@ -0,0 +1,198 @@
+import os
+import copy
+import gzip
+import json
+import time
+import queue
+import shutil
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any, Optional
+
+_context: contextvars.ContextVar = contextvars.ContextVar('log_context', default={})
+
+# Attributes of a plain LogRecord; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'context'}
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields such as job_id or square_id to records logged in the block
+
+    Contexts nest; the fields hold for the current thread (or task) only.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line
+
+    Each line has ts, level, logger, thread and message, plus job_id and
+    square_id when known, any extra={...} fields and the formatted
+    exception if there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'context', None) or {})
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotate by size or age and gzip the rotated segments
+
+    Segments are named <file>.1.gz (newest) to <file>.<backup_count>.gz.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024,
+                 interval: float = 24 * 3600, backup_count: int = 10,
+                 encoding: Optional[str] = 'utf-8'):
+        """Initialize handler
+
+        Args:
+            filename: Active log file
+            max_bytes: Rotate once the file would exceed this size (0: never)
+            interval: Rotate once the file is this many seconds old (0: never)
+            backup_count: Compressed segments to keep
+            encoding: File encoding
+        """
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding=encoding, delay=True)
+        self.interval = interval
+        self.rotations = 0
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+        try:
+            self._opened_at = os.stat(self.baseFilename).st_mtime
+        except OSError:
+            self._opened_at = time.time()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and time.time() - self._opened_at >= self.interval \
+                and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._opened_at = time.time()
+        self.rotations += 1
+
+    @staticmethod
+    def _compress(source: str, dest: str):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class AsyncLogHandler(QueueHandler):
+    """Hand records to a background thread that writes them to a rotating file
+
+    Logging calls only enqueue the record, so they never wait for the
+    disk. While the backlog exceeds debug_backlog records, DEBUG records
+    are dropped (and counted); records of other levels are always kept.
+    The formatter set on this handler is used by the writer.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024,
+                 interval: float = 24 * 3600, backup_count: int = 10,
+                 debug_backlog: int = 10000):
+        """Initialize handler and start the writer thread
+
+        Args:
+            filename: Active log file
+            max_bytes: Rotate once the file would exceed this size
+            interval: Rotate once the file is this many seconds old
+            backup_count: Compressed segments to keep
+            debug_backlog: Queued records beyond which DEBUG is dropped
+        """
+        super().__init__(queue.SimpleQueue())
+        self.debug_backlog = debug_backlog
+        self.writer = CompressingRotatingFileHandler(filename, max_bytes, interval, backup_count)
+        self.writer.setFormatter(JsonFormatter())
+        self.stats = {'queued': 0, 'dropped_debug': 0}
+        self._lock = threading.Lock()
+        self.listener = QueueListener(self.queue, self.writer, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]):
+        # Formatting happens on the writer thread
+        self.writer.setFormatter(fmt)
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno <= logging.DEBUG and self.queue.qsize() > self.debug_backlog:
+            with self._lock:
+                self.stats['dropped_debug'] += 1
+            return
+        self.queue.put_nowait(record)
+        with self._lock:
+            self.stats['queued'] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve everything that depends on the calling thread, but do not format
+
+        The message is rendered now since its arguments may change later,
+        and the log context of the calling thread is captured.
+        """
+        record = copy.copy(record)  # other handlers still see the original
+        record.msg = record.getMessage()
+        record.args = None
+        record.context = _context.get()
+        if record.exc_info:
+            # Tracebacks keep frames alive; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        """Write out queued records and close the file"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.writer.close()
+        super().close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pipeline counters
+
+        Returns:
+            dict: Records queued and dropped, current backlog and rotations
+        """
+        with self._lock:
+            return {**self.stats, 'backlog': self.queue.qsize(), 'rotations': self.writer.rotations}
+
+
+def find_async_handlers():
+    """Async log handlers attached to the root or any configured logger"""
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    found = []
+    for logger in loggers:
+        for handler in logger.handlers:
+            if isinstance(handler, AsyncLogHandler) and handler not in found:
+                found.append(handler)
+    return found
@@ -0,0 +1,431 @@
+import io
+import bisect
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import traceback
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+# Seconds; covers fast in-memory stages up to slow uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# (metric name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterMetric:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            samples = [(dict(key), value) for key, value in self._values.items()]
+        yield self.name, 'counter', self.help, samples
+
+
+class HistogramMetric:
+    """Histogram with fixed buckets and optional labels
+
+    Observing is a bisect and three additions under a lock, cheap enough
+    for every call on a hot path.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            entries = [(dict(key), list(entry)) for key, entry in self._values.items()]
+        samples = []
+        for labels, entry in entries:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                samples.append(({**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append(({**labels, 'le': '+Inf'}, entry[-1]))
+            samples.append(({**labels, '__suffix__': '_sum'}, entry[-2]))
+            samples.append(({**labels, '__suffix__': '_count'}, entry[-1]))
+        yield self.name, 'histogram', self.help, samples
+
+
+def stats_collector(prefix: str, get_stats: Callable[[], Dict[str, Any]],
+                    label: Optional[str] = None) -> Callable[[], Iterable[Family]]:
+    """Export a component's get_stats() dict as gauges
+
+    Numeric values become {prefix}_{key}. String values become
+    {prefix}_{key}{key="value"} 1. With label set, get_stats returns one
+    dict per item and the item's key is exported as that label.
+
+    Args:
+        prefix: Metric name prefix
+        get_stats: Returns the stats dict
+        label: Label name for per-item stats, e.g. 'link'
+
+    Returns:
+        callable: Collector for MetricsRegistry.add_collector
+    """
+    def collect() -> Iterable[Family]:
+        stats = get_stats()
+        items = stats.items() if label else [(None, stats)]
+        families: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+        for item, values in items:
+            base = {label: str(item)} if label else {}
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    families.setdefault(f"{prefix}_{key}", []).append((base, value))
+                elif isinstance(value, str):
+                    families.setdefault(f"{prefix}_{key}", []).append(({**base, key: value}, 1))
+        for name, samples in families.items():
+            yield name, 'gauge', '', samples
+    return collect
+
+
+class MetricsRegistry:
+    """Metrics of this process in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Family]]] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def counter(self, name: str, help_text: str = '') -> CounterMetric:
+        """Get or create a counter"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = CounterMetric(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str = '',
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> HistogramMetric:
+        """Get or create a histogram"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = HistogramMetric(name, help_text, buckets)
+            return self._metrics[name]
+
+    def add_collector(self, name: str, collect: Callable[[], Iterable[Family]]):
+        """Register a function producing metrics at scrape time
+
+        Args:
+            name: Collector name; registering it again replaces it
+            collect: Returns (name, type, help, samples) families
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def remove_collector(self, name: str):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        with self._lock:
+            sources = [metric.collect for metric in self._metrics.values()]
+            collectors = list(self._collectors.items())
+
+        families: List[Family] = []
+        for collect in sources:
+            families.extend(collect())
+        for name, collect in collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:
+                # One failing component must not break the scrape
+                self.logger.error(f"Metrics collector {name} failed: {e}")
+
+        lines = []
+        for name, kind, help_text, samples in families:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                labels = dict(labels)
+                suffix = labels.pop('__suffix__', '_bucket' if kind == 'histogram' else '')
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """Profiling that can be switched on and off while the system runs
+
+    Two modes:
+        - 'cprofile': deterministic profile of instrumented spans. Only one
+          thread is profiled at a time, since the interpreter allows a
+          single active profiler.
+        - 'sampling': a background thread records the stacks of all
+          threads every interval seconds; cheap enough for production.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.mode: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._profile_lock = threading.Lock()
+        self._samples: FrameCounter = FrameCounter()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = 'sampling') -> bool:
+        """Start profiling
+
+        Returns:
+            bool: False if already running or the mode is unknown
+        """
+        with self._lock:
+            if self.mode is not None or mode not in ('cprofile', 'sampling'):
+                return False
+            self.started_at = time.time()
+            if mode == 'cprofile':
+                self._profile = cProfile.Profile()
+            else:
+                self._samples = FrameCounter()
+                self._stop.clear()
+                self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+                self._sampler.start()
+            self.mode = mode
+            return True
+
+    def stop(self, limit: int = 40) -> str:
+        """Stop profiling
+
+        Args:
+            limit: Functions or stacks to include in the report
+
+        Returns:
+            str: Report; pstats output for cprofile, collapsed stacks
+                ("frame;frame;frame count") for sampling
+        """
+        with self._lock:
+            mode, self.mode = self.mode, None
+            if mode is None:
+                return ''
+            duration = time.time() - self.started_at
+            if mode == 'cprofile':
+                with self._profile_lock:  # wait for a span still profiling
+                    profile, self._profile = self._profile, None
+                out = io.StringIO()
+                out.write(f"cProfile of instrumented spans over {duration:.1f}s\n")
+                try:
+                    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(limit)
+                except TypeError:
+                    out.write("no spans ran while profiling\n")
+                return out.getvalue()
+
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+            total = sum(self._samples.values())
+            lines = [f"# {total} samples over {duration:.1f}s every {self.interval}s"]
+            lines.extend(f"{stack} {count}" for stack, count in self._samples.most_common(limit))
+            return '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def span(self):
+        """Profile a with-block in cprofile mode; no-op otherwise"""
+        profile = self._profile
+        if profile is None or not self._profile_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+        finally:
+            self._profile_lock.release()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = traceback.extract_stack(frame)
+                self._samples[';'.join(f"{entry.name} ({entry.filename}:{entry.lineno})"
+                                       for entry in stack)] += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'running_for': time.time() - self.started_at if self.mode else 0.0
+        }
+
+
+REGISTRY = MetricsRegistry()
+PROFILER = Profiler()
+STAGE_SECONDS = REGISTRY.histogram(
+    'bambu_stage_seconds', 'Duration of hot-path stages (generate, zip, upload, db, ...)'
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a hot-path stage into bambu_stage_seconds{stage=...}
+
+    Nested spans each record their own duration. In cprofile mode the
+    outermost span of a thread is also profiled.
+    """
+    start = time.perf_counter()
+    try:
+        with PROFILER.span():
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+class MetricsServer:
+    """Local HTTP endpoint for metrics and runtime profiling
+
+    GET /metrics                  Prometheus text format
+    GET /profile                  profiler state
+    GET /profile/start?mode=...   start 'sampling' (default) or 'cprofile'
+    GET /profile/stop             stop and return the report
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 registry: MetricsRegistry = REGISTRY, profiler: Profiler = PROFILER):
+        """Initialize metrics server
+
+        Args:
+            config: Metrics configuration including:
+                - host: Address to bind; keep it local
+                - port: Port to listen on
+                - profile_interval: Seconds between stack samples
+            registry: Metrics to serve
+            profiler: Profiler toggled through /profile
+        """
+        config = config or {}
+        self.host = config.get('host', '127.0.0.1')
+        self.port = config.get('port', 9108)
+        self.registry = registry
+        self.profiler = profiler
+        self.profiler.interval = config.get('profile_interval', profiler.interval)
+        self.logger = logging.getLogger(__name__)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start serving on a background thread"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                server.logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Metrics endpoint on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        """Stop serving"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        url = urlparse(request.path)
+        query = parse_qs(url.query)
+        status = 200
+        content_type = 'text/plain; charset=utf-8'
+        if url.path == '/metrics':
+            body = self.registry.render()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif url.path == '/profile':
+            body = f"{self.profiler.get_status()}\n"
+        elif url.path == '/profile/start':
+            mode = query.get('mode', ['sampling'])[0]
+            if self.profiler.start(mode):
+                body = f"profiling started ({mode})\n"
+            else:
+                status, body = 409, "profiler already running or unknown mode\n"
+        elif url.path == '/profile/stop':
+            body = self.profiler.stop(int(query.get('limit', ['40'])[0]))
+            if not body:
+                status, body = 409, "profiler not running\n"
+        else:
+            status, body = 404, "not found\n"
+
+        data = body.encode()
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
@@ -2,28 +2,40 @@ import paho.mqtt.client as mqtt
 import json
 import logging
 import time
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Callable, List, Optional
 from .printer_controller import PrinterController
-from .position_manager import PrintPositionManager
+from .outbox import OutboundBuffer
+from .connection import LinkMonitor
+from .campaign import CampaignPlanner, campaign_commands, run_campaign
 
 class MQTTHandler:
     """Handle MQTT communication with HF Space"""
     
-    def __init__(self, config: Dict[str, Any], printer: PrinterController):
+    def __init__(self, config: Dict[str, Any], printer: Optional[PrinterController],
+                 client: Optional[mqtt.Client] = None):
         """Initialize MQTT handler
         
         Args:
             config: MQTT configuration
-            printer: Printer controller instance
+            printer: Printer controller instance, or None when commands
+                go to command_dispatcher (fleet mode)
+            client: MQTT client to use instead of a new paho client
         """
         self.config = config
         self.printer = printer
-        self.client = mqtt.Client()
+        self.client = client or mqtt.Client()
         
         # Configure MQTT client
         self.client.username_pw_set(config['username'], config['password'])
         self.client.tls_set(tls_version=mqtt.ssl.PROTOCOL_TLS)
         
+        # The network loop reconnects on its own with exponential backoff
+        self.client.reconnect_delay_set(
+            min_delay=config.get('reconnect_min_delay', 1),
+            max_delay=config.get('reconnect_max_delay', 120)
+        )
+        
         # Set callbacks
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
@@ -32,13 +44,28 @@ class MQTTHandler:
         # Setup logging
         self.logger = logging.getLogger(__name__)
         
-        # Connection state
+        # Connection state; paho reconnects by itself, the link only observes
         self.connected = False
+        self.link = LinkMonitor('mqtt')
+        
+        # Messages published while offline are buffered and replayed
+        self.outbox = OutboundBuffer(self.client, config)
+        
+        # Optional hand-off for incoming commands, called with the payload
+        self.command_dispatcher: Optional[Callable[[Dict[str, Any]], None]] = None
+        
+        # Orders 'campaign' commands; replaced by one fitted to status history
+        self.campaign_planner = CampaignPlanner()
+        self._campaign_thread: Optional[threading.Thread] = None
         
     def connect(self):
-        """Connect to MQTT broker"""
+        """Connect to MQTT broker
+        
+        The connection is made by the network loop thread, which keeps
+        retrying, so an unreachable broker does not block startup.
+        """
         try:
-            self.client.connect(
+            self.client.connect_async(
                 self.config['host'],
                 self.config['port'],
                 keepalive=60
@@ -48,34 +75,67 @@ class MQTTHandler:
             self.logger.error(f"Failed to connect to MQTT broker: {e}")
             raise
             
+    def close(self):
+        """Disconnect and keep unsent messages in the spool"""
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.connected = False
+        self.outbox.close()
+            
     def on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
         if rc == 0:
             self.connected = True
+            self.link.mark_connected()
             self.logger.info("Connected to MQTT broker")
             
             # Subscribe to command topic
             command_topic = f"bambu_a1_mini/command/{self.config['printer_serial']}"
-            self.client.subscribe(command_topic)
+            self.client.subscribe(command_topic, qos=1)
             self.logger.info(f"Subscribed to {command_topic}")
+            
+            # Send what was buffered while offline
+            self.outbox.set_online(True)
         else:
             self.logger.error(f"Failed to connect to MQTT broker with code: {rc}")
             
     def on_disconnect(self, client, userdata, rc):
         """Callback when disconnected from MQTT broker"""
         self.connected = False
-        self.logger.warning("Disconnected from MQTT broker")
+        self.link.mark_disconnected(f"disconnected (rc={rc})")
+        self.outbox.set_online(False)
         
-        # Attempt to reconnect
+        # The network loop reconnects with backoff; never block this thread
         if rc != 0:
-            self.logger.info("Attempting to reconnect...")
-            time.sleep(5)
-            self.connect()
+            self.logger.warning(f"Disconnected from MQTT broker (rc={rc}), reconnecting")
+        else:
+            self.logger.info("Disconnected from MQTT broker")
             
     def on_message(self, client, userdata, message):
         """Handle incoming MQTT messages"""
         try:
             payload = json.loads(message.payload)
+        except ValueError as e:
+            self.logger.error(f"Error processing message: {e}")
+            return
+            
+        if self.command_dispatcher:
+            # Hand off so slow commands never run on the network thread
+            self.command_dispatcher(payload)
+        else:
+            self.handle_command(payload)
+            
+    def handle_command(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a command message
+        
+        Args:
+            payload: Decoded command message
+            
+        Returns:
+            dict: Response that was published, empty for unknown actions
+        """
+        response: Dict[str, Any] = {}
+        try:
             command = payload.get('action')
             
             if command == 'print':
@@ -86,32 +146,137 @@ class MQTTHandler:
                 result = self.printer.start_print(params)
                 
                 # Send response
-                self.publish_status({
+                response = {
                     'status': 'printing' if result else 'error',
                     'square_id': self.printer.current_position.get('id'),
                     'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-                })
+                }
+                self._add_estimate(response, result)
+                self.publish_status(response)
+                
+            elif command == 'batch':
+                # Squares sharing a bed temperature, printed as one job
+                square_ids = self.printer.start_batch(payload.get('parameter_sets', []))
+                response = {
+                    'status': 'printing' if square_ids else 'error',
+                    'square_ids': square_ids,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                }
+                self._add_estimate(response, square_ids)
+                self.publish_status(response)
+                
+            elif command == 'campaign':
+                response = self.handle_campaign(payload)
                 
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
-            self.publish_status({
+            response = {
                 'status': 'error',
                 'error': str(e),
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self.publish_status(response)
+            
+        return response
+            
+    def _add_estimate(self, response: Dict[str, Any], started: Any):
+        """Add the started job's estimated time and filament to a response"""
+        estimate = self.printer.current_estimate
+        if started and estimate is not None:
+            response['estimated_time'] = round(estimate['time'])
+            response['filament_g'] = round(estimate['filament_g'], 2)
+            
+    def handle_campaign(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Plan a parameter sweep and hand its squares on for printing
+        
+        The plan, including its estimated makespan, is published first.
+        With dry_run set only the plan is made. With a command_dispatcher
+        every square is dispatched as a 'print' command in plan order
+        (see campaign_commands). Without one the campaign runs on a background
+        thread, so this returns once the plan is published.
+        
+        Args:
+            payload: Command message with parameter_sets and optional dry_run
+            
+        Returns:
+            dict: Plan, with its steps and heating rates for dry runs
+        """
+        parameter_sets = payload.get('parameter_sets', [])
+        plan = self.campaign_planner.plan(parameter_sets, self.printer.get_status())
+        planned = {
+            'status': 'planned',
+            'order': plan['order'],
+            'makespan': plan['makespan'],
+            'transition_time': plan['transition_time'],
+            'submitted_makespan': plan['submitted_makespan'],
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.publish_status(planned)
+        if payload.get('dry_run'):
+            return {**planned, 'steps': plan['steps'], 'rates': plan['rates']}
+            
+        if self.command_dispatcher:
+            for command in campaign_commands(payload, plan):
+                self.command_dispatcher(command)
+            return {**planned, 'status': 'queued', 'jobs': len(plan['order'])}
+            
+        if self._campaign_thread is not None and self._campaign_thread.is_alive():
+            raise RuntimeError("A campaign is already running")
+        self._campaign_thread = threading.Thread(
+            target=self._run_campaign, args=(parameter_sets, plan),
+            name='campaign', daemon=True
+        )
+        self._campaign_thread.start()
+        return {**planned, 'status': 'started'}
+        
+    def _run_campaign(self, parameter_sets: List[Dict[str, Any]], plan: Dict[str, Any]):
+        """Print a planned campaign and publish its progress and result"""
+        def on_step(progress: Dict[str, Any]):
+            self.publish_status({
+                'status': 'campaign_progress',
+                **progress,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
             })
             
-    def publish_status(self, status: Dict[str, Any]):
+        try:
+            result = run_campaign(
+                self.printer, parameter_sets, plan,
+                config=self.campaign_planner.config,
+                on_step=on_step
+            )
+        except Exception as e:
+            self.logger.error(f"Campaign failed: {e}")
+            self.publish_status({
+                'status': 'error',
+                'error': str(e),
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            })
+            return
+        self.publish_status({
+            'status': 'completed' if result['printed'] else 'error',
+            **result,
+            'estimated_makespan': plan['makespan'],
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+        
+    def publish_status(self, status: Dict[str, Any], serial: Optional[str] = None):
         """Publish printer status
         
         Args:
             status: Status information to publish
+            serial: Printer serial for the topic (default: configured printer)
         """
-        if not self.connected:
-            self.logger.warning("Cannot publish status: Not connected")
-            return
-            
-        topic = f"bambu_a1_mini/status/{self.config['printer_serial']}"
-        self.client.publish(topic, json.dumps(status))
+        topic = f"bambu_a1_mini/status/{serial or self.config['printer_serial']}"
+        self.outbox.publish(topic, json.dumps(status, default=str))
+        
+    def publish_ack(self, message: Dict[str, Any]):
+        """Publish a command acknowledgement
+        
+        Args:
+            message: Acknowledgement with correlation_id, job_id and status
+        """
+        topic = f"bambu_a1_mini/ack/{self.config['printer_serial']}"
+        self.outbox.publish(topic, json.dumps(message, default=str))
         
     def publish_image(self, image_url: str, square_id: str):
         """Publish image URL
@@ -120,14 +285,10 @@ class MQTTHandler:
             image_url: S3 URL of the captured image
             square_id: ID of the printed square
         """
-        if not self.connected:
-            self.logger.warning("Cannot publish image: Not connected")
-            return
-            
         topic = f"bambu_a1_mini/image/{self.config['printer_serial']}"
         message = {
             'image_url': image_url,
             'square_id': square_id,
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
         }
-        self.client.publish(topic, json.dumps(message)) 
+        self.outbox.publish(topic, json.dumps(message))
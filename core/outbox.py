@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from .metrics import span
+
+
+class OutboundBuffer:
+    """Buffer outgoing MQTT messages while the broker is unreachable
+
+    While online and nothing is backlogged, messages are published straight
+    away with QoS 1. Otherwise they are kept in a bounded in-memory queue,
+    and once that is full they are appended to an on-disk spool of JSON
+    lines. On reconnect a replay thread publishes the backlog in order, in
+    batches that each wait for the broker's PUBACKs, before direct
+    publishing resumes. The spool read offset is saved after every
+    acknowledged batch, so a restart resumes replay where it stopped.
+    """
+
+    def __init__(self, client, config: Dict[str, Any]):
+        """Initialize outbound buffer
+
+        Args:
+            client: paho MQTT client
+            config: MQTT configuration including:
+                - qos: QoS of published messages
+                - buffer_size: Messages held in memory before spilling to disk
+                - spool_path: Append-only spool file
+                - spool_max_bytes: Spool size limit; newer messages are dropped beyond it
+                - replay_batch: Messages published per acknowledged batch
+                - replay_timeout: Seconds to wait for a batch to be acknowledged
+                - replay_retry: Seconds before retrying a failed batch while connected
+        """
+        self.client = client
+        self.qos = config.get('qos', 1)
+        self.buffer_size = config.get('buffer_size', 1000)
+        self.spool_path = config.get('spool_path', 'spool/mqtt_outbox.jsonl')
+        self.spool_max_bytes = config.get('spool_max_bytes', 64 * 1024 * 1024)
+        self.replay_batch = config.get('replay_batch', 50)
+        self.replay_timeout = config.get('replay_timeout', 10)
+        self.replay_retry = config.get('replay_retry', 5)
+        self.logger = logging.getLogger(__name__)
+
+        self._memory: 'deque[Tuple[str, str]]' = deque()
+        self._lock = threading.Lock()
+        self._online = False
+        self._replay_thread: Optional[threading.Thread] = None
+        self.stats = {'published': 0, 'queued': 0, 'spooled': 0, 'replayed': 0, 'dropped': 0}
+
+        os.makedirs(os.path.dirname(self.spool_path) or '.', exist_ok=True)
+        self._offset_path = self.spool_path + '.offset'
+        self._spool_offset = self._read_offset()
+        self._spool_size = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+        if self._spool_offset >= self._spool_size:
+            self._reset_spool()
+        elif self._spool_size:
+            self.logger.info(
+                f"Found {self._spool_size - self._spool_offset} bytes of spooled messages to replay"
+            )
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self._offset_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, offset: int):
+        tmp_path = self._offset_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self._offset_path)
+
+    def _reset_spool(self):
+        """Empty the spool (caller holds the lock or is initializing)"""
+        for path in (self.spool_path, self._offset_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._spool_offset = 0
+        self._spool_size = 0
+
+    @property
+    def backlog(self) -> bool:
+        """Whether messages are waiting to be replayed"""
+        return bool(self._memory) or self._spool_size > self._spool_offset
+
+    def publish(self, topic: str, payload: str):
+        """Publish a message now, or buffer it if offline or backlogged
+
+        Args:
+            topic: MQTT topic
+            payload: Encoded message
+        """
+        with span('mqtt_publish'), self._lock:
+            if self._online and not self.backlog:
+                info = self.client.publish(topic, payload, qos=self.qos)
+                if info.rc == 0:
+                    self.stats['published'] += 1
+                    return
+            self._enqueue(topic, payload)
+            if self._online:
+                # A publish failed while connected; nothing else would replay it
+                self._start_replay()
+
+    def _enqueue(self, topic: str, payload: str):
+        """Buffer a message behind the backlog (caller holds the lock)"""
+        self.stats['queued'] += 1
+        # Once spilling has started everything goes to the spool, so the
+        # memory queue always holds the oldest messages
+        if self._spool_size == self._spool_offset and len(self._memory) < self.buffer_size:
+            self._memory.append((topic, payload))
+            return
+        self._spool([(topic, payload)])
+
+    def _spool(self, messages: List[Tuple[str, str]]):
+        """Append messages to the spool (caller holds the lock)"""
+        lines = ''.join(
+            json.dumps({'topic': topic, 'payload': payload}) + '\n'
+            for topic, payload in messages
+        ).encode('utf-8')
+        if self._spool_size + len(lines) > self.spool_max_bytes:
+            self.stats['dropped'] += len(messages)
+            self.logger.error(f"Outbound spool full, dropped {len(messages)} messages")
+            return
+        try:
+            with open(self.spool_path, 'ab') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._spool_size += len(lines)
+            self.stats['spooled'] += len(messages)
+        except OSError as e:
+            self.stats['dropped'] += len(messages)
+            self.logger.error(f"Failed to spool {len(messages)} messages: {e}")
+
+    def set_online(self, online: bool):
+        """Track the broker connection; going online starts the replay
+
+        Args:
+            online: True once connected, False when disconnected
+        """
+        with self._lock:
+            self._online = online
+            if online:
+                self._start_replay()
+
+    def _start_replay(self):
+        """Start the replay thread if there is a backlog (caller holds the lock)"""
+        if not self.backlog:
+            return
+        if self._replay_thread and self._replay_thread.is_alive():
+            return
+        self._replay_thread = threading.Thread(
+            target=self._replay, name='mqtt-replay', daemon=True
+        )
+        self._replay_thread.start()
+
+    def _next_batch(self) -> Tuple[List[Tuple[str, str]], str, int]:
+        """Oldest backlogged messages (caller holds the lock)
+
+        Returns:
+            tuple: (messages, source 'memory' or 'spool', spool bytes covered)
+        """
+        if self._memory:
+            return list(self._memory)[:self.replay_batch], 'memory', 0
+
+        messages = []
+        consumed = 0
+        with open(self.spool_path, 'rb') as f:
+            f.seek(self._spool_offset)
+            while len(messages) < self.replay_batch:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # end of file
+                consumed += len(line)
+                try:
+                    record = json.loads(line)
+                    messages.append((record['topic'], record['payload']))
+                except (ValueError, KeyError):
+                    self.stats['dropped'] += 1
+                    self.logger.error("Skipping corrupt spool record")
+        return messages, 'spool', consumed
+
+    def _replay(self):
+        self.logger.info("Replaying buffered messages")
+        replayed = 0
+        while True:
+            with self._lock:
+                if not self._online:
+                    break
+                if not self.backlog:
+                    self._reset_spool()
+                    break
+                try:
+                    messages, source, consumed = self._next_batch()
+                except OSError as e:
+                    self.logger.error(f"Failed to read outbound spool: {e}")
+                    break
+
+            # Publish outside the lock so new messages can still be buffered
+            if messages and not self._send_batch(messages):
+                with self._lock:
+                    online = self._online
+                if not online:
+                    self.logger.warning("Replay interrupted, will resume on reconnect")
+                    break
+                # Still connected, so no reconnect will restart the replay
+                self.logger.warning(f"Replay batch not acknowledged, retrying in {self.replay_retry}s")
+                time.sleep(self.replay_retry)
+                continue
+
+            with self._lock:
+                if source == 'memory':
+                    for _ in messages:
+                        self._memory.popleft()
+                else:
+                    self._spool_offset += consumed
+                    try:
+                        self._write_offset(self._spool_offset)
+                    except OSError as e:
+                        self.logger.error(f"Failed to save spool offset: {e}")
+                self.stats['replayed'] += len(messages)
+                replayed += len(messages)
+
+        self.logger.info(f"Replayed {replayed} buffered messages")
+
+    def _send_batch(self, messages: List[Tuple[str, str]]) -> bool:
+        """Publish messages and wait until the broker has acknowledged all of them"""
+        try:
+            infos = [self.client.publish(topic, payload, qos=self.qos) for topic, payload in messages]
+            for info in infos:
+                if info.rc != 0:
+                    return False
+                info.wait_for_publish(self.replay_timeout)
+                if not info.is_published():
+                    return False
+            return True
+        except (RuntimeError, ValueError) as e:
+            self.logger.error(f"Failed to replay batch: {e}")
+            return False
+
+    def close(self):
+        """Move messages still held in memory to the spool"""
+        with self._lock:
+            self._online = False
+            if self._memory:
+                # Memory messages are older than anything spooled; rewrite
+                # the unreplayed spool behind them
+                messages = list(self._memory)
+                self._memory.clear()
+                tail = b''
+                if self._spool_size > self._spool_offset:
+                    with open(self.spool_path, 'rb') as f:
+                        f.seek(self._spool_offset)
+                        tail = f.read()
+                self._reset_spool()
+                self._spool(messages)
+                if tail:
+                    with open(self.spool_path, 'ab') as f:
+                        f.write(tail)
+                    self._spool_size += len(tail)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get buffer counters
+
+        Returns:
+            dict: published/queued/spooled/replayed/dropped counts and current backlog
+        """
+        with self._lock:
+            return {
+                **self.stats,
+                'memory': len(self._memory),
+                'spool_bytes': self._spool_size - self._spool_offset,
+                'online': self._online
+            }
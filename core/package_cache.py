@@ -0,0 +1,185 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from .gcode_generator import GCodeGenerator
+
+
+class PackageCache:
+    """Content-addressed on-disk cache of ready-to-upload 3MF packages
+
+    Packages are stored as <key>.3mf in the cache directory, where the key
+    is a hash of everything that determines the package content (see
+    GCodeGenerator.package_key). Least recently used packages are evicted
+    once the total size exceeds the byte budget.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        """Initialize package cache
+
+        Args:
+            cache_dir: Directory holding cached packages
+            max_bytes: Total size budget in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # key -> size, oldest first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.3mf")
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files on disk"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.3mf'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total += size
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used packages until within budget"""
+        while self._total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError as e:
+                self.logger.warning(f"Failed to remove cached package {key}: {e}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a cached package
+
+        Args:
+            key: Package key
+
+        Returns:
+            bytes: Package content, or None if not cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))  # keeps LRU order across restarts
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, 0)
+                self._total -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store a package
+
+        Args:
+            key: Package key
+            data: Package content
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics
+
+        Returns:
+            dict: Entry count, total bytes, hits and misses
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+_worker_generator: Optional[GCodeGenerator] = None
+
+
+def _init_worker(template_path: str, origin: Tuple[float, float], compression_level: int):
+    global _worker_generator
+    _worker_generator = GCodeGenerator(template_path, origin, compression_level)
+
+
+def _build_package(position: Dict[str, Any], params: Dict[str, Any]) -> Tuple[str, bytes]:
+    key = _worker_generator.package_key(position, params)
+    return key, _worker_generator.create_square_package(position, params).getvalue()
+
+
+def warm_up(generator: GCodeGenerator, cache: PackageCache,
+            positions: Iterable[Dict[str, Any]], params: Dict[str, Any],
+            workers: Optional[int] = None) -> int:
+    """Pre-build packages for a parameter set in a process pool
+
+    Positions at the same coordinates, e.g. the same square on different
+    plates, share one package, which is built once.
+
+    Args:
+        generator: Generator whose template and settings are used
+        cache: Cache to fill
+        positions: Grid positions to build
+        params: Print parameters
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        int: Number of packages built
+    """
+    by_key = {}
+    for position in positions:
+        key = generator.package_key(position, params)
+        if key not in cache:
+            by_key.setdefault(key, position)
+    missing = list(by_key.values())
+    if not missing:
+        return 0
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(generator.template_path, generator.compiled.origin, generator.compression_level)
+    ) as pool:
+        futures = [pool.submit(_build_package, position, params) for position in missing]
+        for future in futures:
+            key, data = future.result()
+            cache.put(key, data)
+
+    return len(missing)
@@ -0,0 +1,186 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Callable, List, Optional
+
+from .printer_controller import IDLE_STATES, state_name
+
+# Statuses get_status() reports when it could not reach the printer;
+# UNKNOWN is what the client reports before any state has arrived
+UNAVAILABLE_STATES = ('DISCONNECTED', 'ERROR', 'UNKNOWN')
+
+
+class PipelinedExecutor:
+    """Print a sequence of squares with the next one prepared in advance
+
+    While square N prints, the package for N+1 is generated and uploaded
+    on a background thread, and N+1 is started as soon as the printer is
+    idle.
+
+    With preheat enabled the bed is set to N+1's target once N is idle,
+    i.e. after N's end G-code has switched the heaters off. Only the bed
+    is preheated: the start G-code sets its own nozzle temperatures for
+    wiping and flushing, so a nozzle target set beforehand is overridden.
+    The head start is the time between the idle state being seen and the
+    start G-code reaching its bed wait; it has not been measured.
+    """
+
+    def __init__(self, printer, config: Optional[Dict[str, Any]] = None):
+        """Initialize pipelined executor
+
+        Args:
+            printer: PrinterController
+            config: Pipeline configuration including:
+                - poll_interval: Seconds between status checks
+                - start_timeout: Seconds to wait for the printer to pick up a job
+                - square_timeout: Maximum seconds for one square
+                - max_unavailable: Consecutive status checks without the printer
+                  after which waiting is given up
+                - preheat: Preheat the bed for the next square once the printer is idle
+        """
+        config = config or {}
+        self.printer = printer
+        self.poll_interval = config.get('poll_interval', 2.0)
+        self.start_timeout = config.get('start_timeout', 120.0)
+        self.square_timeout = config.get('square_timeout', 3600.0)
+        self.max_unavailable = config.get('max_unavailable', 30)
+        self.preheat = config.get('preheat', True)
+        self.logger = logging.getLogger(__name__)
+        self.stats = {'gaps': [], 'preheats': 0}
+
+    def run(self, parameter_sets: List[Dict[str, Any]],
+            on_step: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Print parameter sets in the given order
+
+        Args:
+            parameter_sets: Print parameters, one per square
+            on_step: Called with a progress dict after each square is started
+
+        Returns:
+            dict: printed square IDs, failed indexes, elapsed seconds and
+                the idle gaps between consecutive squares
+        """
+        started = time.time()
+        printed: List[str] = []
+        failed: List[int] = []
+        gaps: List[float] = []
+        if not parameter_sets:
+            return {'printed': printed, 'failed': failed, 'elapsed': 0.0, 'gaps': gaps}
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='prepare') as pool:
+            upcoming: Future = pool.submit(self.printer.prepare_print, parameter_sets[0])
+            finished_at: Optional[float] = None
+
+            for index, params in enumerate(parameter_sets):
+                job = upcoming.result()
+                upcoming = None
+
+                square_id = None
+                if job is None:
+                    failed.append(index)
+                elif not self._wait_idle(None, None):
+                    self.printer.cancel_prepared(job)
+                    failed.extend(range(index, len(parameter_sets)))
+                    break
+                elif self.printer.start_prepared(job):
+                    square_id = job['position']['id']
+                    printed.append(square_id)
+                    if finished_at is not None:
+                        gaps.append(time.monotonic() - finished_at)
+                else:
+                    failed.append(index)
+
+                # Prepare the next square while this one prints
+                next_params = parameter_sets[index + 1] if index + 1 < len(parameter_sets) else None
+                if next_params is not None:
+                    upcoming = pool.submit(self.printer.prepare_print, next_params)
+
+                if on_step:
+                    on_step({
+                        'step': index + 1,
+                        'total': len(parameter_sets),
+                        'index': index,
+                        'square_id': square_id
+                    })
+
+                if square_id is not None:
+                    self._wait_started()
+                    if not self._wait_idle(next_params, upcoming):
+                        self.logger.error(f"Square {square_id} was not seen to finish")
+                    finished_at = time.monotonic()
+
+            if upcoming is not None:
+                job = upcoming.result()
+                if job is not None:
+                    self.printer.cancel_prepared(job)
+
+        self.stats['gaps'].extend(gaps)
+        return {
+            'printed': printed,
+            'failed': failed,
+            'elapsed': time.time() - started,
+            'gaps': gaps
+        }
+
+    def _wait_started(self):
+        """Wait until the printer has picked up the job it was sent"""
+        deadline = time.monotonic() + self.start_timeout
+        unavailable = 0
+        while time.monotonic() < deadline:
+            state = state_name(self.printer.get_status().get('status'))
+            if self._unavailable(state):
+                unavailable += 1
+                if unavailable >= self.max_unavailable:
+                    return
+            elif state not in IDLE_STATES:
+                return
+            else:
+                unavailable = 0
+            time.sleep(self.poll_interval)
+
+    def _wait_idle(self, next_params: Optional[Dict[str, Any]],
+                   upcoming: Optional[Future]) -> bool:
+        """Wait for the current square to finish, preheating for the next one
+
+        Returns:
+            bool: True if the printer is idle, False on timeout or if the
+                printer stayed unreachable for max_unavailable checks
+        """
+        deadline = None if self.square_timeout is None else time.monotonic() + self.square_timeout
+        preheated = not (self.preheat and next_params)
+        unavailable = 0
+        while True:
+            state = state_name(self.printer.get_status().get('status'))
+            if self._unavailable(state):
+                unavailable += 1
+                if unavailable >= self.max_unavailable:
+                    self.logger.error(f"Printer unavailable for {unavailable} status checks")
+                    return False
+            else:
+                unavailable = 0
+            if state in IDLE_STATES:
+                if not preheated:
+                    self._preheat(next_params, upcoming)
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    def _unavailable(self, state: str) -> bool:
+        """Whether a status reading means the printer could not be reached"""
+        return state in UNAVAILABLE_STATES or not self.printer.link.available
+
+    def _preheat(self, params: Dict[str, Any], upcoming: Optional[Future]):
+        """Set the bed to the next square's target
+
+        Skipped if preparing the next square failed, since it will not print.
+        """
+        if upcoming is not None and upcoming.done() and upcoming.result() is None:
+            return
+        try:
+            bed = float(params['bed_temp'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if self.printer.set_bed_temperature(bed):
+            self.stats['preheats'] += 1
+            self.logger.info(f"Preheating bed to {bed} for next square")
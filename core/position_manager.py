@@ -1,31 +1,168 @@
+import re
 import time
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+DEFAULT_GRID = {
+    'size': [10, 10],       # 10x10 grid
+    'square_size': 10,      # 10mm square
+    'gap': 5,               # 5mm gap
+    'start_pos': [32.4, 145],  # start position (from gcode file)
+    'plates': 1
+}
+
+# Slot states
+FREE = 0
+RESERVED = 1
+PRINTED = 2
+
+_SQUARE_ID_RE = re.compile(r'^(?:p(\d+)_)?square_(\d+)_(\d+)$')
+
 
 class PrintPositionManager:
-    def __init__(self):
-        self.grid_size = (10, 10)  # 10x10 grid
-        self.square_size = 10      # 10mm square
-        self.gap = 5              # 5mm gap
-        self.start_pos = (32.4, 145)  # start position (from gcode file)
-        self.print_history = {}    # record printed positions
-        
+    """Allocate grid squares across one or more build plates
+
+    Slot state lives in a flat bytearray indexed by
+    plate * rows * cols + row * cols + col. A cursor marks the first slot
+    that may still be free and released slots behind the cursor go on a
+    stack, so allocation is amortized O(1) however large the grid is.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 occupied: Iterable[str] = ()):
+        """Initialize position manager
+
+        Args:
+            config: Grid configuration (size, square_size, gap, start_pos, plates)
+            occupied: Square IDs already printed or printing, e.g. from
+                DatabaseManager.get_occupied_squares
+        """
+        config = {**DEFAULT_GRID, **(config or {})}
+        self.grid_size = tuple(config['size'])
+        self.square_size = config['square_size']
+        self.gap = config['gap']
+        self.start_pos = tuple(config['start_pos'])
+        self.plates = config.get('plates', 1)
+        self.pitch = self.square_size + self.gap
+
+        self.slots_per_plate = self.grid_size[0] * self.grid_size[1]
+        self.total_slots = self.plates * self.slots_per_plate
+        self._state = bytearray(self.total_slots)
+        self._cursor = 0
+        self._released: List[int] = []
+        self._lock = threading.Lock()
+        self.print_history = {}    # parameters of squares printed this session
+
+        for square_id in occupied:
+            index = self.parse_square_id(square_id)
+            if index is not None:
+                self._state[index] = PRINTED
+
+    def parse_square_id(self, square_id: str) -> Optional[int]:
+        """Convert a square ID to a slot index
+
+        Returns:
+            int: Slot index, or None if the ID is not on this grid
+        """
+        match = _SQUARE_ID_RE.match(square_id or '')
+        if not match:
+            return None
+        plate = int(match.group(1) or 0)
+        row, col = int(match.group(2)), int(match.group(3))
+        if plate >= self.plates or row >= self.grid_size[0] or col >= self.grid_size[1]:
+            return None
+        return plate * self.slots_per_plate + row * self.grid_size[1] + col
+
+    def get_position(self, row, col, plate=0):
+        """Get position information for a grid cell"""
+        x = self.start_pos[0] + col * self.pitch
+        y = self.start_pos[1] - row * self.pitch
+        prefix = f"p{plate}_" if plate else ""
+        return {
+            'id': f"{prefix}square_{row}_{col}",
+            'position': (x, y),
+            'plate': plate,
+            'index': row * self.grid_size[1] + col
+        }
+
+    def _position_for_index(self, index: int) -> Dict[str, Any]:
+        plate, cell = divmod(index, self.slots_per_plate)
+        row, col = divmod(cell, self.grid_size[1])
+        return self.get_position(row, col, plate)
+
+    def all_positions(self, plate=0):
+        """Get every position on a plate in print order"""
+        return [
+            self.get_position(row, col, plate)
+            for row in range(self.grid_size[0])
+            for col in range(self.grid_size[1])
+        ]
+
     def get_next_position(self):
-        """Get next available print position"""
-        for row in range(self.grid_size[0]):
-            for col in range(self.grid_size[1]):
-                pos_id = f"square_{row}_{col}"
-                if pos_id not in self.print_history:
-                    x = self.start_pos[0] + col * (self.square_size + self.gap)
-                    y = self.start_pos[1] - row * (self.square_size + self.gap)
-                    return {
-                        'id': pos_id,
-                        'position': (x, y),
-                        'index': row * self.grid_size[1] + col
-                    }
+        """Reserve the next available print position
+
+        The square stays reserved until mark_position_printed or
+        release_position is called for it.
+
+        Returns:
+            dict: Position information, or None if all plates are full
+        """
+        with self._lock:
+            while self._released:
+                index = self._released.pop()
+                if self._state[index] == FREE:
+                    self._state[index] = RESERVED
+                    return self._position_for_index(index)
+
+            while self._cursor < self.total_slots:
+                index = self._cursor
+                self._cursor += 1
+                if self._state[index] == FREE:
+                    self._state[index] = RESERVED
+                    return self._position_for_index(index)
+
         return None
-    
+
+    def reserve_position(self, pos_id):
+        """Reserve a specific square
+
+        Returns:
+            dict: Position information, or None if the square is not free
+        """
+        index = self.parse_square_id(pos_id)
+        if index is None:
+            return None
+        with self._lock:
+            if self._state[index] != FREE:
+                return None
+            self._state[index] = RESERVED
+        return self._position_for_index(index)
+
+    def release_position(self, pos_id):
+        """Return a reserved square to the free pool, e.g. after a failed upload"""
+        index = self.parse_square_id(pos_id)
+        if index is None:
+            return
+        with self._lock:
+            if self._state[index] != RESERVED:
+                return
+            self._state[index] = FREE
+            if index < self._cursor:
+                self._released.append(index)
+
     def mark_position_printed(self, pos_id, params):
         """Mark position as printed, record parameters"""
+        index = self.parse_square_id(pos_id)
+        if index is None:
+            return
+        with self._lock:
+            self._state[index] = PRINTED
         self.print_history[pos_id] = {
             'timestamp': time.strftime("%Y%m%d_%H%M%S"),
             'parameters': params
-        } 
+        }
+
+    def free_count(self) -> int:
+        """Number of squares that are neither printed nor reserved"""
+        with self._lock:
+            return self._state.count(FREE)
@@ -1,15 +1,35 @@
+import os
 import time
+import json
 import logging
-from typing import Dict, Any, Optional
-from bambulabs_api import Printer
-from .gcode_generator import GCodeGenerator
+import threading
+from io import BytesIO
+from typing import Dict, Any, BinaryIO, Callable, List, Optional
+from .gcode_generator import GCodeGenerator, DEFAULT_ORIGIN, DEFAULT_COMPRESSION_LEVEL
 from .position_manager import PrintPositionManager
-from .database import DatabaseManager
+from .package_cache import PackageCache
+from .connection import LinkMonitor
+from .upload_manager import UploadManager
+from .metrics import span
+from .estimator import GCodeEstimator
+from .snapshot_cache import SnapshotCache, PrinterSnapshot
+from .startup import lazy, DEFAULT_CACHE_DIR
+from .log_pipeline import log_context
+
+# Printer states in which a new job can start right away
+IDLE_STATES = ('IDLE', 'FINISH', 'FAILED')
+
+
+def state_name(status: Any) -> str:
+    """Normalize a printer state (enum or string) to an upper-case name"""
+    return str(status).rsplit('.', 1)[-1].upper()
+
 
 class PrinterController:
     """Controller for Bambu A1 Mini printer"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], printer_factory: Optional[Callable[..., Any]] = None,
+                 lazy: bool = False):
         """Initialize printer controller
         
         Args:
@@ -17,39 +37,256 @@ class PrinterController:
                 - ip: Printer IP address
                 - access_code: Printer access code
                 - serial: Printer serial number
+                - start_timeout: Seconds for the printer to pick up a started job
+                - connect_timeout: Seconds to wait for the client's MQTT connection
+                - report_timeout: Seconds without a report after which the
+                  printer counts as unreachable
+            printer_factory: Creates the printer client from (ip, access_code,
+                serial); defaults to bambulabs_api.Printer
+            lazy: Create the database, template and caches on first use
+                instead of now (see open_database and load_template)
         """
         self.config = config
+        self.printer_factory = printer_factory
         self.printer = None
         self.connected = False
+        self.current_position = {}
+        self._report_callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._completion_callbacks: List[Callable[[List[str], str], None]] = []
+        
+        # Squares of the job last started, until the printer reports it done
+        self._active_job: Optional[Dict[str, Any]] = None
+        self._job_lock = threading.Lock()
+        printer_options = config.get('printer', {})
+        self.start_timeout = printer_options.get('start_timeout', 120)
+        
+        # The client never raises for an unreachable printer; its getters
+        # return cached defaults, so liveness is judged from its reports
+        self.connect_timeout = printer_options.get('connect_timeout', 10)
+        self.report_timeout = printer_options.get('report_timeout', 120)
+        self._last_report = 0.0
         
-        # Initialize components
-        self.position_manager = PrintPositionManager(config['grid'])
-        self.gcode_generator = GCodeGenerator()
-        self.db_manager = DatabaseManager(config['database'])
+        # A lazily started controller keeps its compiled template in the startup cache
+        startup_config = config.get('startup', {})
+        self.template_cache_dir = startup_config.get('cache_dir', DEFAULT_CACHE_DIR) \
+            if startup_config.get('cache_template', lazy) else None
+        self.current_estimate: Optional[Dict[str, Any]] = None
+        self._printing_file: Optional[str] = None
+        self.batch_z_lift = config.get('batch', {}).get('z_lift', 1.0)
+        
+        # Link health is judged from the calls below, never by probing
+        self.link = LinkMonitor('printer', self._open, config.get('connection', {}))
+        
+        # Every status reader shares one reading per TTL
+        self.snapshots = SnapshotCache(
+            self._read_snapshot, config.get('status', {}).get('cache_ttl', 1.0)
+        )
         
         # Setup logging
         self.logger = logging.getLogger(__name__)
         
+        if not lazy:
+            self.open_database()
+            self.load_template()
+            
+    @lazy
+    def db_manager(self):
+        """Print history database"""
+        from .database import DatabaseManager
+        return DatabaseManager(self.config['database'])
+        
+    @lazy
+    def position_manager(self) -> PrintPositionManager:
+        """Grid positions, with the squares already printed marked occupied"""
+        return PrintPositionManager(
+            self.config['grid'],
+            self.db_manager.get_occupied_squares()
+        )
+        
+    @lazy
+    def gcode_generator(self) -> GCodeGenerator:
+        """Generator for the configured G-code template"""
+        return GCodeGenerator(
+            origin=tuple(self.config['grid'].get('start_pos', DEFAULT_ORIGIN)),
+            compression_level=self.config.get('package', {}).get(
+                'compression_level', DEFAULT_COMPRESSION_LEVEL
+            ),
+            cache_dir=self.template_cache_dir
+        )
+        
+    @lazy
+    def package_cache(self) -> Optional[PackageCache]:
+        """On-disk package cache, None unless configured"""
+        return self._create_package_cache(self.config.get('package', {}))
+        
+    @lazy
+    def uploads(self) -> Optional[UploadManager]:
+        """Upload manager, None unless configured"""
+        return self._create_upload_manager(self.config.get('upload', {}))
+        
+    @lazy
+    def estimator(self) -> GCodeEstimator:
+        """Print time estimator"""
+        return GCodeEstimator(self.config.get('estimator', {}))
+        
+    def open_database(self):
+        """Create the database and load the occupied squares, if not done yet"""
+        self.position_manager
+        
+    def load_template(self):
+        """Read and compile the G-code template, if not done yet"""
+        self.gcode_generator
+        
     def connect(self) -> bool:
         """Connect to printer
         
         Returns:
             bool: True if connection successful
         """
+        connected = self._open()
+        if connected:
+            self.link.mark_connected()
+        else:
+            self.link.mark_disconnected("connect failed")
+        return connected
+
+    def disconnect(self):
+        """Stop the printer client's MQTT and camera threads"""
+        printer, self.printer = self.printer, None
+        self.connected = False
+        if printer is None:
+            return
+        try:
+            printer.disconnect()
+        except Exception as e:
+            self.logger.warning(f"Error disconnecting from printer: {e}")
+        
+    def _open(self) -> bool:
+        """Make one connection attempt
+        
+        A client left over from an earlier attempt is disconnected first,
+        so retries do not leak MQTT and camera threads. The client connects
+        in the background; the attempt fails unless its MQTT connection is
+        up within connect_timeout.
+        """
+        self.disconnect()
         try:
-            self.printer = Printer(
-                self.config['ip'],
-                self.config['access_code'],
-                self.config['serial']
+            printer_config = self.config['printer']
+            if self.printer_factory is None:
+                from bambulabs_api import Printer
+                self.printer_factory = Printer
+            self.printer = self.printer_factory(
+                printer_config['ip'],
+                printer_config['access_code'],
+                printer_config['serial']
             )
-            self.connected = self.printer.connect()
-            if self.connected:
-                self.logger.info("Successfully connected to printer")
-            return self.connected
+            self.printer.mqtt_client.on_message_handler = self._on_report
+            self.printer.connect()
+            deadline = time.monotonic() + self.connect_timeout
+            while not self.printer.mqtt_client_connected():
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"no MQTT connection within {self.connect_timeout}s")
+                time.sleep(0.1)
+            # Reports are expected from now on
+            self._last_report = time.monotonic()
+            self.connected = True
+            self.logger.info("Successfully connected to printer")
+            return True
         except Exception as e:
             self.logger.error(f"Failed to connect to printer: {e}")
+            self.disconnect()
             return False
             
+    def subscribe_reports(self, callback: Callable[[Dict[str, Any]], None]):
+        """Receive every report message the printer pushes
+        
+        The callback runs on the printer client's network thread and
+        stays registered across reconnects.
+        
+        Args:
+            callback: Called with the decoded report payload
+        """
+        self._report_callbacks.append(callback)
+            
+    def _on_report(self, mqtt_client, client, userdata, message):
+        """Note that the printer is alive and dispatch its report to subscribers"""
+        self._last_report = time.monotonic()
+        try:
+            report = json.loads(message.payload)
+        except ValueError:
+            return
+        state = report.get('print', {}).get('gcode_state') if isinstance(report, dict) else None
+        if state:
+            self._track_job(state)
+        for callback in self._report_callbacks:
+            try:
+                callback(report)
+            except Exception as e:
+                self.logger.error(f"Error in report callback: {e}")
+                
+    def subscribe_completions(self, callback: Callable[[List[str], str], None]):
+        """Be told when a started job finishes
+        
+        The callback runs on whichever thread noticed the finish (a
+        status reader or the report thread), so it must return quickly.
+        
+        Args:
+            callback: Called with the job's square IDs and its final
+                status, 'completed' or 'failed'
+        """
+        self._completion_callbacks.append(callback)
+        
+    def _track_job(self, state: Any):
+        """Finish the active job once the printer went busy and is idle again"""
+        state = state_name(state)
+        with self._job_lock:
+            job = self._active_job
+            if job is None:
+                return
+            if state not in IDLE_STATES:
+                job['busy'] = True
+                return
+            if not job['busy']:
+                # Not picked up yet; the idle state is the previous job's
+                if time.monotonic() - job['started'] < self.start_timeout:
+                    return
+                self.logger.warning(f"Printer did not pick up square {', '.join(job['square_ids'])}")
+                state = 'FAILED'
+            self._active_job = None
+        self._finish_job(job['square_ids'], 'failed' if state == 'FAILED' else 'completed')
+        
+    def ready_for_job(self) -> bool:
+        """Whether a new job can be started
+        
+        True once the job started last has finished (see
+        subscribe_completions) and the printer reports an idle state.
+        Reads the printer state, which is also what notices a finish.
+        
+        Returns:
+            bool: True if the printer is idle and no started job is pending
+        """
+        try:
+            snapshot = self.snapshot(max_age=0)
+        except Exception as e:
+            self.logger.debug(f"Printer state unavailable: {e}")
+            return False
+        if snapshot is None or state_name(snapshot.status) not in IDLE_STATES:
+            return False
+        with self._job_lock:
+            return self._active_job is None
+        
+    def _finish_job(self, square_ids: List[str], status: str):
+        """Record a job's final status and notify subscribers"""
+        self.logger.info(f"Square {', '.join(square_ids)} {status}")
+        self.current_estimate = None
+        for square_id in square_ids:
+            self.db_manager.update_job_status(square_id, status)
+        for callback in self._completion_callbacks:
+            try:
+                callback(square_ids, status)
+            except Exception as e:
+                self.logger.error(f"Error in completion callback: {e}")
+                
     def start_print(self, params: Dict[str, Any]) -> bool:
         """Start printing with given parameters
         
@@ -63,68 +300,347 @@ class PrinterController:
         Returns:
             bool: True if print started successfully
         """
+        with span('start_print'):
+            job = self.prepare_print(params)
+            if job is None:
+                return False
+            return self.start_prepared(job)
+        
+    def prepare_print(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Reserve a square and upload its package without starting it
+        
+        The upload can run while another square prints. The square stays
+        reserved until start_prepared or cancel_prepared is called.
+        
+        Args:
+            params: Print parameters
+            
+        Returns:
+            dict: Prepared job (position, params, filename), or None on failure
+        """
         if not self.connected:
-            self.logger.error("Cannot start print: Not connected")
-            return False
+            self.logger.error("Cannot prepare print: Not connected")
+            return None
+            
+        # Reserve next position
+        position = self.position_manager.get_next_position()
+        if not position:
+            self.logger.error("No available print positions")
+            return None
             
         try:
-            # Get next position
+            # Generate G-code straight into a 3MF file
+            filename = f"square_{position['id']}.3mf"
+            io_file = self.get_package(position, params)
+            
+            # Upload, unless the same package is already on the printer
+            filename = self._upload(io_file, filename)
+            if filename is not None:
+                return {'position': position, 'params': params, 'filename': filename}
+            else:
+                self.logger.error("Failed to upload file")
+                self.position_manager.release_position(position['id'])
+                return None
+                
+        except Exception as e:
+            self.logger.error(f"Error preparing print: {e}")
+            self.position_manager.release_position(position['id'])
+            return None
+            
+    def start_batch(self, parameter_sets: List[Dict[str, Any]]) -> List[str]:
+        """Print several squares sharing a bed temperature as one job
+        
+        Args:
+            parameter_sets: Print parameters, one per square
+            
+        Returns:
+            list: IDs of the squares started, empty on failure
+        """
+        job = self.prepare_batch(parameter_sets)
+        if job is None or not self.start_prepared(job):
+            return []
+        return [position['id'] for position, _ in job['squares']]
+        
+    def prepare_batch(self, parameter_sets: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Reserve squares and upload one package printing all of them
+        
+        The start and end G-code run once for the whole batch; see
+        GCodeGenerator.generate_batch_gcode. All parameter sets must have
+        the same bed_temp.
+        
+        Args:
+            parameter_sets: Print parameters, one per square
+            
+        Returns:
+            dict: Prepared job like prepare_print's, with a 'squares' list
+                of (position, params), or None on failure
+        """
+        if not self.connected:
+            self.logger.error("Cannot prepare batch: Not connected")
+            return None
+        if len(parameter_sets) == 1:
+            return self.prepare_print(parameter_sets[0])
+            
+        squares = []
+        for params in parameter_sets:
             position = self.position_manager.get_next_position()
             if not position:
-                self.logger.error("No available print positions")
-                return False
+                self.logger.error("Not enough free print positions for batch")
+                break
+            squares.append((position, params))
+            
+        job = None
+        if len(squares) == len(parameter_sets):
+            try:
+                filename = f"batch_{squares[0][0]['id']}_{len(squares)}.3mf"
+                io_file = self.gcode_generator.create_batch_package(squares, self.batch_z_lift)
+                filename = self._upload(io_file, filename)
+                if filename is not None:
+                    position, params = squares[0]
+                    job = {'position': position, 'params': params,
+                           'filename': filename, 'squares': squares}
+                else:
+                    self.logger.error("Failed to upload file")
+            except Exception as e:
+                self.logger.error(f"Error preparing batch: {e}")
                 
-            # Generate G-code
-            gcode = self.gcode_generator.generate_square_gcode(position, params)
+        if job is None:
+            for position, _ in squares:
+                self.position_manager.release_position(position['id'])
+        return job
+        
+    def _upload(self, io_file: BytesIO, filename: str) -> Optional[str]:
+        """Upload a package, unless the same one is already on the printer
+        
+        Returns:
+            str: Name of the file on the printer, or None on failure
+        """
+        with span('upload'):
+            if self.uploads is None:
+                return filename if self._send_file(io_file, filename) else None
+            filename = self.uploads.upload(
+                io_file.getvalue(), filename, self._send_file,
+                lambda name: self.link.call(self.printer.delete_file, name)
+            )
+        if filename is not None:
+            self.uploads.pin(filename)
+        return filename
             
-            # Create 3MF file
-            filename = f"square_{position['id']}.3mf"
-            gcode_location = "Metadata/plate_1.gcode"
-            io_file = self.gcode_generator.create_3mf_package(gcode, gcode_location)
-            
-            # Upload and start print
-            result = self.printer.upload_file(io_file, filename)
-            if "226" in result:  # Upload successful
-                # Record print job
-                self.db_manager.record_print_job(
-                    square_id=position['id'],
-                    position_x=position['x'],
-                    position_y=position['y'],
-                    params=params
-                )
+    def start_prepared(self, job: Dict[str, Any]) -> bool:
+        """Start printing a job returned by prepare_print or prepare_batch
+        
+        Every square of a batch is recorded as its own print job.
+        
+        Args:
+            job: Prepared job
+            
+        Returns:
+            bool: True if print started successfully
+        """
+        squares = job.get('squares') or [(job['position'], job['params'])]
+        square_ids = [position['id'] for position, _ in squares]
+        with log_context(square_id=square_ids[0] if len(square_ids) == 1 else square_ids):
+            try:
+                # Record print jobs
+                with span('db'):
+                    for position, params in squares:
+                        position_x, position_y = position['position']
+                        self.db_manager.record_print_job(
+                            square_id=position['id'],
+                            position_x=position_x,
+                            position_y=position_y,
+                            params=params
+                        )
                 
                 # Start printing
-                self.printer.start_print(filename, 1)
-                self.logger.info(f"Started printing square {position['id']}")
+                with span('start'):
+                    started = self.link.call(self.printer.start_print, job['filename'], 1)
+                if not started:
+                    raise RuntimeError(f"Printer did not accept {job['filename']}")
+                # The squares stay reserved until the printer has taken the job
+                for position, params in squares:
+                    self.position_manager.mark_position_printed(position['id'], params)
+                self.current_position = job['position']
+                self.snapshots.invalidate()
+                with self._job_lock:
+                    previous, self._active_job = self._active_job, {
+                        'square_ids': square_ids, 'busy': False, 'started': time.monotonic()
+                    }
+                if previous is not None:
+                    # Its outcome was never observed; the row stays as it is
+                    self.logger.warning(
+                        f"Square {', '.join(previous['square_ids'])} was not seen to finish"
+                    )
+                self.current_estimate = self._estimate_started([params for _, params in squares])
+                self.logger.info(
+                    f"Started printing square {', '.join(p['id'] for p, _ in squares)}"
+                )
+                
+                # The previous file may be garbage collected from now on
+                if self.uploads is not None and self._printing_file not in (None, job['filename']):
+                    self.uploads.unpin(self._printing_file)
+                self._printing_file = job['filename']
                 return True
-            else:
-                self.logger.error("Failed to upload file")
-                return False
                 
+            except Exception as e:
+                self.logger.error(f"Error starting print: {e}")
+                for position, _ in squares:
+                    self.db_manager.update_job_status(position['id'], 'aborted')
+                    # Only frees squares not yet marked printed, i.e. if the start failed
+                    self.position_manager.release_position(position['id'])
+                if self.uploads is not None:
+                    # The file may be gone from the printer; upload it again next time
+                    self.uploads.unpin(job['filename'])
+                    self.uploads.forget(job['filename'])
+                return False
+            
+    def estimate_job(self, parameter_sets: List[Dict[str, Any]],
+                     start_temps: Optional[tuple] = None) -> Dict[str, float]:
+        """Estimate print time and filament of a job
+        
+        Args:
+            parameter_sets: Print parameters, one per square of the job
+            start_temps: (bed, nozzle) temperatures when the job starts;
+                ambient if unknown
+            
+        Returns:
+            dict: time, motion_time, heating_time (seconds), filament_mm and filament_g
+        """
+        return self.estimator.estimate(self.gcode_generator, parameter_sets, start_temps)
+        
+    def _estimate_started(self, parameter_sets: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Estimate for a job being started, from the last known temperatures"""
+        try:
+            snapshot = self.snapshots.peek()
+            start_temps = (snapshot.bed_temp, snapshot.nozzle_temp) if snapshot else None
+            estimate = self.estimate_job(parameter_sets, start_temps)
         except Exception as e:
-            self.logger.error(f"Error starting print: {e}")
-            return False
+            self.logger.warning(f"Could not estimate print time: {e}")
+            return None
+        return {**estimate, 'started_at': time.time()}
+        
+    def cancel_prepared(self, job: Dict[str, Any]):
+        """Give up a prepared job and free its squares"""
+        for position, _ in job.get('squares') or [(job['position'], job['params'])]:
+            self.position_manager.release_position(position['id'])
+        if self.uploads is not None and job['filename'] != self._printing_file:
+            self.uploads.unpin(job['filename'])
+            
+    def _send_file(self, io_file: BinaryIO, filename: str) -> bool:
+        """Upload a file to the printer
+        
+        Returns:
+            bool: True if the printer confirmed the transfer
+        """
+        result = self.link.call(self.printer.upload_file, io_file, filename)
+        return "226" in (result or "")  # Upload successful
+        
+    def _create_package_cache(self, config: Dict[str, Any]) -> Optional[PackageCache]:
+        """Create the package cache if configured"""
+        if not config.get('cache_dir'):
+            return None
+        return PackageCache(
+            config['cache_dir'],
+            config.get('cache_max_bytes', 256 * 1024 * 1024)
+        )
+
+    def _create_upload_manager(self, config: Dict[str, Any]) -> Optional[UploadManager]:
+        """Create the upload manager if configured"""
+        if not config.get('manifest_dir'):
+            return None
+        return UploadManager(
+            os.path.join(config['manifest_dir'], f"{self.config['printer']['serial']}.json"),
+            config.get('max_bytes', 1024 * 1024 * 1024)
+        )
+        
+    def get_package(self, position: Dict[str, Any], params: Dict[str, Any]) -> BytesIO:
+        """Get the 3MF package for a square, from cache when possible
+        
+        Args:
+            position: Position information
+            params: Print parameters
             
-    def get_status(self) -> Dict[str, Any]:
+        Returns:
+            io.BytesIO: 3MF package
+        """
+        if self.package_cache is None:
+            return self.gcode_generator.create_square_package(position, params)
+            
+        key = self.gcode_generator.package_key(position, params)
+        data = self.package_cache.get(key)
+        if data is None:
+            data = self.gcode_generator.create_square_package(position, params).getvalue()
+            self.package_cache.put(key, data)
+        return BytesIO(data)
+            
+    def _read_snapshot(self) -> PrinterSnapshot:
+        """Read state, temperatures and progress from the printer"""
+        start = time.perf_counter()
+        try:
+            if not self.printer.mqtt_client_connected():
+                raise ConnectionError("printer MQTT client is not connected")
+            silence = time.monotonic() - self._last_report
+            if silence > self.report_timeout:
+                raise ConnectionError(f"no report from printer for {silence:.0f}s")
+            with span('get_status'):
+                status = self.printer.get_state()
+                bed_temp = self.printer.get_bed_temperature()
+                nozzle_temp = self.printer.get_nozzle_temperature()
+                progress = self.printer.get_percentage()
+        except Exception as e:
+            self.link.record_failure(e)
+            raise
+        self.link.record_success(time.perf_counter() - start)
+        self._track_job(status)
+        # Values the printer has not reported yet come back as None (or "Unknown" for progress)
+        return PrinterSnapshot(
+            status=status,
+            bed_temp=bed_temp or 0,
+            nozzle_temp=nozzle_temp or 0,
+            progress=progress if isinstance(progress, (int, float)) else 0,
+            fetched_at=time.monotonic()
+        )
+        
+    def snapshot(self, max_age: Optional[float] = None) -> Optional[PrinterSnapshot]:
+        """Get the shared printer state snapshot
+        
+        Args:
+            max_age: Oldest acceptable snapshot in seconds; defaults to the cache TTL
+            
+        Returns:
+            PrinterSnapshot: Shared reading, or None if disconnected
+        """
+        if not self.connected or not self.link.available:
+            return None
+        return self.snapshots.get(max_age)
+        
+    def get_status(self, max_age: Optional[float] = None) -> Dict[str, Any]:
         """Get current printer status
         
+        Args:
+            max_age: Oldest acceptable reading in seconds; defaults to the cache TTL
+            
         Returns:
             dict: Printer status information
         """
-        if not self.connected:
-            return {'status': 'disconnected'}
-            
         try:
-            status = self.printer.get_state()
-            temps = self.printer.get_temperatures()
-            
-            return {
-                'status': status,
-                'bed_temp': temps.get('bed', 0),
-                'nozzle_temp': temps.get('nozzle', 0),
-                'progress': self.printer.get_progress(),
+            snapshot = self.snapshot(max_age)
+            if snapshot is None:
+                return {'status': 'disconnected'}
+            
+            result = {
+                'status': snapshot.status,
+                'bed_temp': snapshot.bed_temp,
+                'nozzle_temp': snapshot.nozzle_temp,
+                'progress': snapshot.progress,
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
             }
+            if self.current_estimate is not None:
+                elapsed = time.time() - self.current_estimate['started_at']
+                result['estimated_time'] = round(self.current_estimate['time'])
+                result['remaining_time'] = round(max(self.current_estimate['time'] - elapsed, 0))
+                result['filament_g'] = round(self.current_estimate['filament_g'], 2)
+            return result
         except Exception as e:
             self.logger.error(f"Error getting status: {e}")
             return {'status': 'error', 'error': str(e)}
@@ -143,57 +659,46 @@ class PrinterController:
             return False
         
         try:
-            self.printer.set_nozzle_temperature(nozzle_temp)
-            self.printer.set_bed_temperature(bed_temp)
+            self.link.call(self.printer.set_nozzle_temperature, nozzle_temp)
+            self.link.call(self.printer.set_bed_temperature, bed_temp)
+            self.snapshots.invalidate()
             return True
         except Exception as e:
             self.logger.error(f"Failed to set temperatures: {e}")
             return False
 
-    def reconnect(self, max_attempts: int = 5, delay: int = 10) -> bool:
-        """Attempt to reconnect to printer
+    def set_bed_temperature(self, bed_temp: float) -> bool:
+        """Set the bed temperature, leaving the nozzle as it is
         
         Args:
-            max_attempts: Maximum number of reconnection attempts
-            delay: Delay between attempts in seconds
-            
+            bed_temp: Target bed temperature
+        
         Returns:
-            bool: True if reconnection successful
+            bool: True if the temperature was set successfully
         """
-        self.logger.info("Starting reconnection attempt")
-        
-        for attempt in range(max_attempts):
-            try:
-                if self.connect():
-                    self.logger.info("Reconnection successful")
-                    return True
-                
-                self.logger.warning(
-                    f"Reconnection attempt {attempt + 1}/{max_attempts} failed"
-                )
-                time.sleep(delay)
-                
-            except Exception as e:
-                self.logger.error(f"Reconnection error: {e}")
-                time.sleep(delay)
+        if not self.connected:
+            return False
         
-        self.logger.error("All reconnection attempts failed")
-        return False
+        try:
+            self.link.call(self.printer.set_bed_temperature, bed_temp)
+            self.snapshots.invalidate()
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to set bed temperature: {e}")
+            return False
 
     def check_connection(self) -> bool:
-        """Check printer connection status and attempt reconnection if needed
+        """Check printer connection status and attempt reconnection if due
+        
+        Uses the link's circuit breaker: no request is sent to the printer
+        while it is healthy, and while it is down at most one reconnect
+        attempt is made per backoff interval. Never sleeps.
         
         Returns:
             bool: True if connected
         """
-        if self.connected:
-            try:
-                # Try to get status to verify connection
-                _ = self.printer.get_state()
-                return True
-            except Exception:
-                self.logger.warning("Lost connection to printer")
-                self.connected = False
-        
-        # Attempt reconnection if disconnected
-        return self.reconnect() 
+        available = self.link.check()
+        if not available and self.connected:
+            self.logger.warning("Lost connection to printer")
+            self.connected = False
+        return available and self.connected 
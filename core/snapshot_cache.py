@@ -0,0 +1,115 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Generic, NamedTuple, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class PrinterSnapshot(NamedTuple):
+    """One reading of the printer's state, shared by every reader"""
+    status: Any
+    bed_temp: float
+    nozzle_temp: float
+    progress: float
+    fetched_at: float  # time.monotonic() when the reading completed
+
+
+class SnapshotCache(Generic[T]):
+    """Time-to-live cache of one value with single-flight fetching
+
+    A value younger than ttl is returned as is. Otherwise the first
+    caller fetches a new one while concurrent callers wait for that
+    fetch instead of starting their own; all of them receive its result,
+    or its exception. Failed fetches are not cached. Values are shared
+    between readers and must not be mutated.
+    """
+
+    def __init__(self, fetch: Callable[[], T], ttl: float = 1.0):
+        """Initialize snapshot cache
+
+        Args:
+            fetch: Reads a fresh value, e.g. from the printer
+            ttl: Seconds a value is served before it is fetched again
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self._cond = threading.Condition()
+        self._value: Optional[T] = None
+        self._fetched_at = float('-inf')
+        self._generation = 0  # bumped by invalidate()
+        self._flight: Optional[Dict[str, Any]] = None
+        self.stats = {'hits': 0, 'fetches': 0, 'coalesced': 0, 'errors': 0}
+
+    def get(self, max_age: Optional[float] = None) -> T:
+        """Get the cached value, fetching it if older than max_age
+
+        Args:
+            max_age: Oldest acceptable value in seconds; defaults to ttl
+
+        Returns:
+            The shared value
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._cond:
+            while True:
+                if self._value is not None and time.monotonic() - self._fetched_at <= max_age:
+                    self.stats['hits'] += 1
+                    return self._value
+                flight = self._flight
+                if flight is None:
+                    break
+                if flight['generation'] == self._generation:
+                    # Someone is already fetching; wait for their result
+                    self.stats['coalesced'] += 1
+                    while not flight['done']:
+                        self._cond.wait()
+                    if flight['error'] is not None:
+                        raise flight['error']
+                    return flight['value']
+                # That fetch started before an invalidation; wait it out and fetch again
+                while not flight['done']:
+                    self._cond.wait()
+            generation = self._generation
+            flight = self._flight = {'generation': generation, 'done': False, 'value': None, 'error': None}
+            self.stats['fetches'] += 1
+
+        try:
+            value = self.fetch()
+        except Exception as e:
+            with self._cond:
+                self.stats['errors'] += 1
+                flight.update(done=True, error=e)
+                self._flight = None
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            # A value fetched across an invalidation may predate the change
+            if generation == self._generation:
+                self._value = value
+                self._fetched_at = time.monotonic()
+            flight.update(done=True, value=value)
+            self._flight = None
+            self._cond.notify_all()
+        return value
+
+    def peek(self) -> Optional[T]:
+        """Last fetched value regardless of age, without fetching"""
+        with self._cond:
+            return self._value
+
+    def invalidate(self):
+        """Make the next get() fetch, e.g. after a command changed the state"""
+        with self._cond:
+            self._fetched_at = float('-inf')
+            self._generation += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache counters
+
+        Returns:
+            dict: hits, fetches, coalesced waits, errors and age of the value in seconds
+        """
+        with self._cond:
+            age = time.monotonic() - self._fetched_at if self._value is not None else -1
+            return {**self.stats, 'age': age}
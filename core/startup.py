@@ -0,0 +1,160 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, TypeVar
+
+T = TypeVar('T')
+
+DEFAULT_CACHE_DIR = "cache/startup"
+CACHE_FORMAT = 1  # bump when a cached object's layout changes
+
+logger = logging.getLogger(__name__)
+
+
+class lazy:
+    """Attribute computed by its method on first access, then stored
+
+    Like functools.cached_property, but construction is locked per
+    instance and attribute, so concurrent first reads build the value
+    once while different attributes can be built in parallel. Assigning
+    the attribute replaces the value as usual.
+    """
+
+    _locks_guard = threading.Lock()
+
+    def __init__(self, factory: Callable[[Any], Any]):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        values = instance.__dict__
+        if self.name in values:
+            return values[self.name]
+        with self._locks_guard:
+            lock = values.setdefault('_lazy_locks', {}).setdefault(self.name, threading.Lock())
+        with lock:
+            if self.name not in values:
+                values[self.name] = self.factory(instance)
+        return values[self.name]
+
+
+def load_cached(path: str, load: Callable[[str], T], key: str = '',
+                cache_dir: str = DEFAULT_CACHE_DIR) -> T:
+    """Load a file through a pickle cache invalidated by its mtime
+
+    The parsed result of load(path) is pickled in cache_dir together with
+    the file's mtime and size. Later calls unpickle it as long as the file
+    is unchanged; any problem with the cache falls back to load(path).
+
+    Args:
+        path: Source file, e.g. YAML config or G-code template
+        load: Parses the source file
+        key: Extra cache key for options that change the parsed result
+        cache_dir: Directory holding cache files
+
+    Returns:
+        The parsed content
+    """
+    stat = os.stat(path)
+    stamp = (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size, key)
+    name = hashlib.sha256(f"{os.path.abspath(path)}\0{key}".encode()).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{name}.pickle")
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_stamp, value = pickle.load(f)
+        if cached_stamp == stamp:
+            return value
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable startup cache {cache_path}: {e}")
+
+    value = load(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((stamp, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"Failed to write startup cache {cache_path}: {e}")
+    return value
+
+
+class StartupTimer:
+    """Wall-clock durations of startup phases
+
+    Phases may run concurrently; each is timed on its own, and marks
+    record the time since the timer was created.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = time.perf_counter() - start
+
+    def timed(self, name: str, func: Callable[..., T]) -> Callable[..., T]:
+        """Wrap func so each call is timed as a phase, e.g. for an executor"""
+        def run(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return run
+
+    def mark(self, name: str) -> float:
+        """Record the seconds since startup began
+
+        Args:
+            name: Milestone, e.g. 'ready'
+
+        Returns:
+            float: Seconds since startup began
+        """
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self.marks[name] = elapsed
+        return elapsed
+
+    def report(self) -> Dict[str, Any]:
+        """Get phase durations and milestones
+
+        Returns:
+            dict: {'phases': {name: seconds}, 'marks': {name: seconds since start}}
+        """
+        with self._lock:
+            return {'phases': dict(self.phases), 'marks': dict(self.marks)}
+
+    def get_stats(self) -> Dict[str, float]:
+        """Flat seconds per phase and mark, for the metrics endpoint"""
+        with self._lock:
+            stats = {f"phase_{name}": value for name, value in self.phases.items()}
+            stats.update({name: value for name, value in self.marks.items()})
+            return stats
+
+    def summary(self) -> str:
+        """One-line report for the log"""
+        report = self.report()
+        phases = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in report['phases'].items())
+        marks = ', '.join(f"{name} at {seconds * 1000:.0f}ms" for name, seconds in report['marks'].items())
+        return f"Startup: {marks} ({phases})"
@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional
+
+# Fields of the printer's "print" report and the status keys they map to
+REPORT_FIELDS = {
+    'gcode_state': 'status',
+    'bed_temper': 'bed_temp',
+    'nozzle_temper': 'nozzle_temp',
+    'mc_percent': 'progress',
+    'mc_remaining_time': 'remaining_time',
+    'layer_num': 'layer',
+}
+
+
+def parse_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract status fields from a printer report message
+
+    Args:
+        report: Decoded report payload from device/<serial>/report
+
+    Returns:
+        dict: Status fields present in the report
+    """
+    print_data = report.get('print', {})
+    return {
+        key: print_data[field]
+        for field, key in REPORT_FIELDS.items()
+        if field in print_data
+    }
+
+
+class StatusPublisher:
+    """Publish printer status as deltas driven by the printer's reports
+
+    Every update is merged into the current state. Fields that changed
+    since the last publish (numeric fields only when they moved more than
+    the deadband) are sent together, at most once per min_interval, and
+    the full state is sent as a keyframe every keyframe_interval seconds.
+    """
+
+    def __init__(self, publish: Callable[[Dict[str, Any]], None],
+                 min_interval: float = 1.0, keyframe_interval: float = 60.0,
+                 deadband: float = 0.5):
+        """Initialize status publisher
+
+        Args:
+            publish: Called with each message, e.g. MQTTHandler.publish_status
+            min_interval: Minimum seconds between published messages
+            keyframe_interval: Seconds between full-state messages
+            deadband: Minimum change of a numeric field to count as changed
+        """
+        self.publish = publish
+        self.min_interval = min_interval
+        self.keyframe_interval = keyframe_interval
+        self.deadband = deadband
+        self.logger = logging.getLogger(__name__)
+
+        self._state: Dict[str, Any] = {}
+        self._published: Dict[str, Any] = {}
+        self._dirty = set()
+        self._last_publish = 0.0
+        self._last_keyframe = 0.0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.stats = {'deltas': 0, 'keyframes': 0, 'updates': 0}
+
+    def start(self):
+        """Start the publishing thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='status-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the publishing thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _changed(self, key: str, value: Any) -> bool:
+        if key not in self._published:
+            return True
+        old = self._published[key]
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) \
+                and not isinstance(value, bool):
+            return abs(value - old) >= self.deadband
+        return value != old
+
+    def update(self, fields: Dict[str, Any]):
+        """Merge new status fields
+
+        Args:
+            fields: Status fields, e.g. from parse_report
+        """
+        with self._cond:
+            self.stats['updates'] += 1
+            for key, value in fields.items():
+                self._state[key] = value
+                if self._changed(key, value):
+                    self._dirty.add(key)
+                else:
+                    self._dirty.discard(key)
+            if self._dirty:
+                self._cond.notify()
+
+    def on_report(self, report: Dict[str, Any]):
+        """Handle a raw printer report message"""
+        fields = parse_report(report)
+        if fields:
+            self.update(fields)
+
+    def request_keyframe(self):
+        """Send the full state with the next message, e.g. after reconnecting"""
+        with self._cond:
+            self._last_keyframe = 0.0
+            self._cond.notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a copy of the current state"""
+        with self._cond:
+            return dict(self._state)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                next_allowed = self._last_publish + self.min_interval
+                keyframe_due = self._last_keyframe + self.keyframe_interval
+
+                if now < next_allowed:
+                    self._cond.wait(next_allowed - now)
+                    continue
+                if now >= keyframe_due and self._state:
+                    message = dict(self._state)
+                    message['keyframe'] = True
+                    self._last_keyframe = now
+                    self.stats['keyframes'] += 1
+                elif self._dirty:
+                    message = {key: self._state[key] for key in self._dirty}
+                    message['keyframe'] = False
+                    self.stats['deltas'] += 1
+                else:
+                    self._cond.wait(max(keyframe_due - now, 0.05) if self._state else None)
+                    continue
+
+                self._published.update(
+                    {key: value for key, value in message.items() if key in self._state}
+                )
+                self._dirty.clear()
+                self._last_publish = now
+                self._seq += 1
+                message['seq'] = self._seq
+                message['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+            try:
+                self.publish(message)
+            except Exception as e:
+                self.logger.error(f"Failed to publish status: {e}")
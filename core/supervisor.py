@@ -0,0 +1,164 @@
+import time
+import signal
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+
+class AsyncSupervisor:
+    """Run the printer system as independent asyncio tasks
+
+    Status publishing, connection supervision, backups and command
+    execution each run in their own task. Blocking printer, database and
+    MQTT calls are sent to a bounded thread pool, so a slow reconnect or
+    upload only holds up the task that issued it.
+    """
+
+    def __init__(self, system, config: Dict[str, Any]):
+        """Initialize supervisor
+
+        Args:
+            system: PrinterSystem with initialized components
+            config: Runtime configuration including:
+                - executor_workers: Threads for blocking calls
+                - status_interval: Seconds between status updates
+                - connection_interval: Seconds between connection checks
+                - backup_check_interval: Seconds between backup checks
+                - command_queue_size: Pending commands before new ones are rejected
+                - shutdown_timeout: Seconds to wait for tasks on shutdown
+        """
+        self.system = system
+        self.executor_workers = config.get('executor_workers', 4)
+        self.status_interval = config.get('status_interval', 5)
+        self.connection_interval = config.get('connection_interval', 5)
+        self.backup_check_interval = config.get('backup_check_interval', 60)
+        self.command_queue_size = config.get('command_queue_size', 100)
+        self.shutdown_timeout = config.get('shutdown_timeout', 30)
+        self.logger = logging.getLogger(__name__)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.commands: Optional[asyncio.Queue] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def blocking(self, func: Callable, *args, **kwargs):
+        """Run a blocking call in the executor"""
+        return await self.loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def stop(self):
+        """Request a graceful shutdown (safe to call from any thread)"""
+        if self.loop and self._stop:
+            self.loop.call_soon_threadsafe(self._stop.set)
+
+    def _dispatch_command(self, payload: Dict[str, Any]):
+        """Queue a command from the MQTT network thread"""
+        def put():
+            try:
+                self.commands.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.logger.warning("Command queue full, rejecting command")
+                self.system.mqtt_handler.publish_status({
+                    'status': 'error',
+                    'error': 'command queue full',
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                })
+        self.loop.call_soon_threadsafe(put)
+
+    async def run(self):
+        """Run until stopped by a signal or stop()"""
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.executor_workers, thread_name_prefix='supervisor'
+        )
+        self.commands = asyncio.Queue(maxsize=self.command_queue_size)
+        self._stop = asyncio.Event()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self._stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # not on the main thread or not supported on this platform
+
+        self._tasks = [
+            asyncio.create_task(self._status_task(), name='status'),
+            asyncio.create_task(self._connection_task(), name='connection'),
+            asyncio.create_task(self._backup_task(), name='backup'),
+        ]
+        if not getattr(self.system, 'job_queue', None):
+            # Without the durable job queue, commands run as a task here
+            self.system.mqtt_handler.command_dispatcher = self._dispatch_command
+            self._tasks.append(asyncio.create_task(self._command_task(), name='commands'))
+        self.logger.info("System initialized, supervisor running")
+
+        try:
+            await self._stop.wait()
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        """Cancel tasks, then stop components"""
+        self.logger.info("Stopping supervisor tasks")
+        if self.system.mqtt_handler.command_dispatcher == self._dispatch_command:
+            self.system.mqtt_handler.command_dispatcher = None
+        for task in self._tasks:
+            task.cancel()
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        for task, result in zip(self._tasks, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Task {task.get_name()} failed: {result}")
+
+        try:
+            await asyncio.wait_for(self.blocking(self.system.shutdown), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            self.logger.error("Timed out waiting for components to shut down")
+        # Calls already running in the executor are allowed to finish
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _every(self, interval: float, step: Callable, name: str):
+        """Run step every interval seconds, logging failures"""
+        while True:
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error in {name} task: {e}")
+            await asyncio.sleep(interval)
+
+    async def _status_task(self):
+        async def step():
+            if self.system.printer.connected:
+                await self.blocking(self.system.update_status)
+        await self._every(self.status_interval, step, 'status')
+
+    async def _connection_task(self):
+        async def step():
+            # State changes are logged by the link's circuit breaker
+            await self.blocking(self.system.printer.check_connection)
+        await self._every(self.connection_interval, step, 'connection')
+
+    async def _backup_task(self):
+        db_manager = self.system.printer.db_manager
+
+        async def step():
+            if db_manager.check_backup_needed():
+                await self.blocking(db_manager.create_backup)
+                await self.blocking(db_manager.cleanup_old_backups)
+        await self._every(self.backup_check_interval, step, 'backup')
+
+    async def _command_task(self):
+        while True:
+            payload = await self.commands.get()
+            try:
+                await self.blocking(self.system.mqtt_handler.handle_command, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error executing command: {e}")
+            finally:
+                self.commands.task_done()
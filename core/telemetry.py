@@ -0,0 +1,370 @@
+import os
+import glob
+import time
+import logging
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype([
+    ('ts', 'f8'),
+    ('state', 'i2'),
+    ('bed_temp', 'f4'),
+    ('nozzle_temp', 'f4'),
+    ('progress', 'f4'),
+    ('job', 'i4'),
+])
+
+VALUE_FIELDS = ('bed_temp', 'nozzle_temp', 'progress')
+NO_JOB = -1
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TelemetryStore:
+    """Compact time-series store for printer status samples
+
+    Samples are kept in a fixed-size structured numpy ring buffer and
+    flushed to columnar .npz segments under <dir>/raw. Each flush also
+    writes min/max/mean downsampled segments under <dir>/tier_<seconds>
+    for every configured tier. States and job IDs are stored as small
+    integer codes with a per-segment lookup table.
+
+    The time range of every segment is kept in an in-memory index, read
+    from the directory once, so queries only open overlapping segments.
+    Raw segments older than raw_retention are deleted on flush; the
+    downsampled tiers are kept.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize telemetry store
+
+        Args:
+            config: Telemetry configuration including:
+                - dir: Directory for segments
+                - buffer_size: Samples held in memory
+                - flush_interval: Seconds between flushes
+                - tiers: Downsampling bucket widths in seconds
+                - raw_retention: Seconds to keep raw segments (None keeps them)
+        """
+        self.dir = config.get('dir', 'telemetry')
+        self.buffer_size = config.get('buffer_size', 4096)
+        self.flush_interval = config.get('flush_interval', 600)
+        self.tiers = sorted(config.get('tiers', [60, 900]))
+        self.raw_retention = config.get('raw_retention', 7 * 86400)
+        self.logger = logging.getLogger(__name__)
+
+        self._buffer = np.zeros(self.buffer_size, dtype=SAMPLE_DTYPE)
+        self._head = 0     # index of oldest sample
+        self._count = 0
+        self._states: Dict[str, int] = {}
+        self._jobs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self.dropped = 0
+        self.pruned = 0
+
+        # folder -> [(first ts, last ts, path)] in time order
+        self._index: Dict[str, List[Tuple[float, float, str]]] = {}
+        self._index_lock = threading.Lock()
+        for folder in ['raw'] + [f'tier_{tier}' for tier in self.tiers]:
+            os.makedirs(os.path.join(self.dir, folder), exist_ok=True)
+            self._index[folder] = self._scan(folder)
+
+    def _scan(self, folder: str) -> List[Tuple[float, float, str]]:
+        """Segments found in folder, in time order"""
+        segments = []
+        for path in glob.glob(os.path.join(self.dir, folder, '*.npz')):
+            try:
+                first, last = (float(ts) for ts in os.path.basename(path)[:-4].split('_'))
+            except ValueError:
+                continue
+            segments.append((first, last, path))
+        return sorted(segments)
+
+    def _code(self, table: Dict[str, int], value: Optional[str]) -> int:
+        if value is None:
+            return NO_JOB
+        return table.setdefault(str(value), len(table))
+
+    def append(self, status: Dict[str, Any], job: Optional[str] = None,
+               timestamp: Optional[float] = None):
+        """Add a status sample
+
+        Args:
+            status: Status dict from PrinterController.get_status
+            job: Square ID of the job being printed, if any
+            timestamp: Sample time (default: now)
+        """
+        with self._lock:
+            if self._count == self.buffer_size:
+                # Only reachable if a flush is already writing: overwrite the oldest sample
+                self._head = (self._head + 1) % self.buffer_size
+                self._count -= 1
+                self.dropped += 1
+            index = (self._head + self._count) % self.buffer_size
+            self._buffer[index] = (
+                timestamp if timestamp is not None else time.time(),
+                self._code(self._states, status.get('status')),
+                _to_float(status.get('bed_temp')),
+                _to_float(status.get('nozzle_temp')),
+                _to_float(status.get('progress')),
+                self._code(self._jobs, job)
+            )
+            self._count += 1
+            due = (self._count == self.buffer_size
+                   or time.time() - self._last_flush >= self.flush_interval)
+
+        if due:
+            self.flush()
+
+    def _snapshot(self) -> np.ndarray:
+        """Buffered samples in time order (caller holds the lock)"""
+        end = self._head + self._count
+        if end <= self.buffer_size:
+            return self._buffer[self._head:end].copy()
+        return np.concatenate((
+            self._buffer[self._head:],
+            self._buffer[:end - self.buffer_size]
+        ))
+
+    def flush(self):
+        """Write buffered samples to a raw segment and the downsampled tiers"""
+        with self._lock:
+            samples = self._snapshot()
+            states = self._table(self._states)
+            jobs = self._table(self._jobs)
+            self._head = 0
+            self._count = 0
+            self._states = {}
+            self._jobs = {}
+            self._last_flush = time.time()
+        if not len(samples):
+            return
+
+        first, last = float(samples['ts'][0]), float(samples['ts'][-1])
+        name = f"{first:.3f}_{last:.3f}.npz"
+        try:
+            self._write(os.path.join(self.dir, 'raw', name), states=states, jobs=jobs,
+                        **{field: samples[field] for field in SAMPLE_DTYPE.names})
+            self._add_segment('raw', first, last, name)
+            for tier in self.tiers:
+                self._write(os.path.join(self.dir, f'tier_{tier}', name),
+                            **downsample(samples, tier))
+                self._add_segment(f'tier_{tier}', first, last, name)
+        except OSError as e:
+            self.dropped += len(samples)
+            self.logger.error(f"Failed to flush {len(samples)} telemetry samples: {e}")
+        self._prune()
+
+    def _add_segment(self, folder: str, first: float, last: float, name: str):
+        path = os.path.join(self.dir, folder, name)
+        with self._index_lock:
+            segments = self._index[folder]
+            # Names carry rounded times; a rewritten segment keeps one entry
+            segments[:] = [segment for segment in segments if segment[2] != path]
+            segments.append((first, last, path))
+            segments.sort()
+
+    def _prune(self):
+        """Delete raw segments that ended before the retention window"""
+        if self.raw_retention is None:
+            return
+        cutoff = time.time() - self.raw_retention
+        with self._index_lock:
+            segments = self._index['raw']
+            expired = [segment for segment in segments if segment[1] < cutoff]
+            segments[:] = [segment for segment in segments if segment[1] >= cutoff]
+        for _, _, path in expired:
+            try:
+                os.remove(path)
+                self.pruned += 1
+            except OSError as e:
+                self.logger.error(f"Failed to delete telemetry segment {path}: {e}")
+
+    @staticmethod
+    def _table(codes: Dict[str, int]) -> np.ndarray:
+        names = sorted(codes, key=codes.get)
+        return np.array(names, dtype=str) if names else np.array([], dtype='U1')
+
+    @staticmethod
+    def _write(path: str, **columns):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, path)
+
+    def _segments(self, folder: str, start: float, end: float) -> Iterator[Any]:
+        """Open the segments in folder overlapping [start, end], in time order
+
+        Segments pruned while the query runs are skipped.
+        """
+        with self._index_lock:
+            paths = [path for first, last, path in self._index[folder]
+                     if last >= start and first <= end]
+        for path in paths:
+            try:
+                segment = np.load(path)
+            except FileNotFoundError:
+                continue
+            with segment:
+                yield segment
+
+    def query(self, start: float, end: float, tier: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Get samples in a time range
+
+        Args:
+            start: Range start (UNIX time)
+            end: Range end (UNIX time)
+            tier: Bucket width of a downsampling tier, or None for raw samples
+
+        Returns:
+            dict: Column name -> array. Raw results have ts, state (str),
+                bed_temp, nozzle_temp, progress and job (str); tier results
+                have ts, count and <field>_min/_max/_mean columns.
+        """
+        if tier is not None:
+            return self._query_tier(start, end, tier)
+
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in SAMPLE_DTYPE.names}
+        for segment in self._segments('raw', start, end):
+            mask = (segment['ts'] >= start) & (segment['ts'] <= end)
+            self._collect(columns, {name: segment[name][mask] for name in SAMPLE_DTYPE.names},
+                          segment['states'], segment['jobs'])
+
+        with self._lock:
+            pending = self._snapshot()
+            states = self._table(self._states)
+            jobs = self._table(self._jobs)
+        mask = (pending['ts'] >= start) & (pending['ts'] <= end)
+        self._collect(columns, {name: pending[name][mask] for name in SAMPLE_DTYPE.names},
+                      states, jobs)
+
+        return {
+            name: np.concatenate(parts) if parts else np.array([])
+            for name, parts in columns.items()
+        }
+
+    @staticmethod
+    def _collect(columns: Dict[str, List[np.ndarray]], part: Dict[str, np.ndarray],
+                 states: np.ndarray, jobs: np.ndarray):
+        """Append one segment's rows with codes decoded to strings"""
+        for field, names in (('state', states), ('job', jobs)):
+            codes = part[field]
+            lookup = np.append(names.astype(object), None)  # NO_JOB (-1) -> None
+            part[field] = lookup[codes]
+        for name in columns:
+            columns[name].append(part[name])
+
+    def _query_tier(self, start: float, end: float, tier: int) -> Dict[str, np.ndarray]:
+        if tier not in self.tiers:
+            raise ValueError(f"Unknown telemetry tier: {tier}")
+
+        parts = []
+        for segment in self._segments(f'tier_{tier}', start - tier, end):
+            mask = (segment['ts'] + tier > start) & (segment['ts'] <= end)
+            parts.append({name: segment[name][mask] for name in segment.files})
+
+        with self._lock:
+            pending = self._snapshot()
+        mask = (pending['ts'] >= start) & (pending['ts'] <= end)
+        if mask.any():
+            parts.append(downsample(pending[mask], tier))
+
+        return merge_buckets(parts)
+
+    def query_job(self, job: str) -> Dict[str, np.ndarray]:
+        """Get all raw samples recorded for a print job
+
+        Args:
+            job: Square ID of the job
+
+        Returns:
+            dict: Column name -> array, as returned by query
+        """
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in SAMPLE_DTYPE.names}
+        for segment in self._segments('raw', -np.inf, np.inf):
+            matches = np.flatnonzero(segment['jobs'] == job)
+            if not len(matches):
+                continue
+            mask = segment['job'] == matches[0]
+            self._collect(columns, {name: segment[name][mask] for name in SAMPLE_DTYPE.names},
+                          segment['states'], segment['jobs'])
+
+        with self._lock:
+            pending = self._snapshot()
+            code = self._jobs.get(job)
+            states = self._table(self._states)
+            jobs = self._table(self._jobs)
+        if code is not None:
+            mask = pending['job'] == code
+            self._collect(columns, {name: pending[name][mask] for name in SAMPLE_DTYPE.names},
+                          states, jobs)
+
+        return {
+            name: np.concatenate(parts) if parts else np.array([])
+            for name, parts in columns.items()
+        }
+
+
+def downsample(samples: np.ndarray, width: int) -> Dict[str, np.ndarray]:
+    """Reduce samples to min/max/mean per time bucket
+
+    Args:
+        samples: Structured array of SAMPLE_DTYPE in time order
+        width: Bucket width in seconds
+
+    Returns:
+        dict: ts (bucket start), count and <field>_min/_max/_mean columns
+    """
+    buckets = np.floor(samples['ts'] / width) * width
+    starts, first = np.unique(buckets, return_index=True)
+    counts = np.diff(np.append(first, len(samples)))
+    result = {'ts': starts, 'count': counts}
+    for field in VALUE_FIELDS:
+        values = samples[field].astype(np.float64)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        n = np.add.reduceat(valid.astype(np.int64), first)
+        total = np.add.reduceat(filled, first)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[f'{field}_mean'] = np.where(n > 0, total / n, np.nan)
+        result[f'{field}_min'] = np.minimum.reduceat(np.where(valid, values, np.inf), first)
+        result[f'{field}_max'] = np.maximum.reduceat(np.where(valid, values, -np.inf), first)
+        result[f'{field}_min'][n == 0] = np.nan
+        result[f'{field}_max'][n == 0] = np.nan
+        result[f'{field}_n'] = n
+    return result
+
+
+def merge_buckets(parts: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Combine downsampled parts, merging buckets split across segments"""
+    if not parts:
+        return {'ts': np.array([]), 'count': np.array([], dtype=np.int64)}
+
+    combined = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    starts, inverse = np.unique(combined['ts'], return_inverse=True)
+    result = {'ts': starts, 'count': np.bincount(inverse, combined['count'], len(starts)).astype(np.int64)}
+    for field in VALUE_FIELDS:
+        n = combined[f'{field}_n']
+        mean = np.nan_to_num(combined[f'{field}_mean'])
+        total_n = np.bincount(inverse, n, len(starts))
+        total = np.bincount(inverse, mean * n, len(starts))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[f'{field}_mean'] = np.where(total_n > 0, total / total_n, np.nan)
+        lows = np.full(len(starts), np.inf)
+        highs = np.full(len(starts), -np.inf)
+        np.fmin.at(lows, inverse, combined[f'{field}_min'])
+        np.fmax.at(highs, inverse, combined[f'{field}_max'])
+        lows[total_n == 0] = np.nan
+        highs[total_n == 0] = np.nan
+        result[f'{field}_min'] = lows
+        result[f'{field}_max'] = highs
+        result[f'{field}_n'] = total_n.astype(np.int64)
+    return result
@@ -0,0 +1,250 @@
+import struct
+import time
+import zlib
+import hashlib
+from io import BytesIO
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_COMPRESSION_LEVEL = 6
+GCODE_LOCATION = "Metadata/plate_1.gcode"
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\n'
+    ' <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\n'
+    ' <Default Extension="gcode" ContentType="text/x.gcode"/>\n'
+    '</Types>\n'
+).encode()
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_DATA_DESCRIPTOR = struct.Struct('<IIII')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+
+_FLAG_DATA_DESCRIPTOR = 0x08
+_CHUNK_SIZE = 64 * 1024
+
+
+class DeflateBlock:
+    """Raw DEFLATE data for a fixed piece of text, compressed once
+
+    The block ends on a byte boundary with an empty dictionary (full
+    flush), so it can be concatenated with independently compressed data.
+    """
+
+    def __init__(self, data: bytes, level: int = DEFAULT_COMPRESSION_LEVEL, final: bool = False):
+        """Compress data
+
+        Args:
+            data: Uncompressed bytes
+            level: zlib compression level
+            final: Terminate the DEFLATE stream after this block
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.compressed = compressor.compress(data) + compressor.flush(
+            zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH
+        )
+        self.data = data
+        self.size = len(data)
+        self.crc = zlib.crc32(data)
+        self.md5 = hashlib.md5(data)
+
+    def __getstate__(self):
+        # Hash objects cannot be pickled; the digest state is rebuilt on load
+        state = dict(self.__dict__)
+        del state['md5']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.md5 = hashlib.md5(self.data)
+
+
+class StreamingZipWriter:
+    """Minimal sequential zip writer
+
+    Entries are written front to back with data descriptors, so member
+    data can be streamed in without knowing its size or CRC up front and
+    pre-compressed DEFLATE blocks can be spliced in as-is.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        """Start a zip archive
+
+        Args:
+            fileobj: Writable binary file object
+        """
+        self.fileobj = fileobj
+        self.offset = 0
+        self.entries: List[Tuple[bytes, int, int, int, int, int]] = []
+        self._dostime, self._dosdate = self._dos_timestamp()
+
+    @staticmethod
+    def _dos_timestamp() -> Tuple[int, int]:
+        t = time.localtime()
+        dostime = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        dosdate = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+        return dostime, dosdate
+
+    def _write(self, data: bytes):
+        self.fileobj.write(data)
+        self.offset += len(data)
+
+    def write_entry(self, name: str, chunks: Iterable[bytes], deflated: bool,
+                    checksum: Callable[[], Tuple[int, int]]):
+        """Write one member from already encoded chunks
+
+        Args:
+            name: Member name inside the archive
+            chunks: Member data, raw DEFLATE if deflated else stored bytes
+            deflated: Whether chunks are raw DEFLATE data
+            checksum: Returns (uncompressed size, CRC-32) once chunks are consumed
+        """
+        encoded_name = name.encode()
+        method = 8 if deflated else 0
+        header_offset = self.offset
+        self._write(_LOCAL_HEADER.pack(
+            0x04034b50, 20, _FLAG_DATA_DESCRIPTOR, method,
+            self._dostime, self._dosdate, 0, 0, 0, len(encoded_name), 0
+        ))
+        self._write(encoded_name)
+
+        compressed_size = 0
+        for chunk in chunks:
+            self._write(chunk)
+            compressed_size += len(chunk)
+
+        size, crc = checksum()
+        self._write(_DATA_DESCRIPTOR.pack(0x08074b50, crc, compressed_size, size))
+        self.entries.append((encoded_name, method, crc, compressed_size, size, header_offset))
+
+    def write_bytes(self, name: str, data: bytes):
+        """Write a small member stored uncompressed
+
+        Args:
+            name: Member name inside the archive
+            data: Member content
+        """
+        crc = zlib.crc32(data)
+        self.write_entry(name, [data], False, lambda: (len(data), crc))
+
+    def close(self):
+        """Write the central directory"""
+        directory_offset = self.offset
+        for name, method, crc, compressed_size, size, header_offset in self.entries:
+            self._write(_CENTRAL_HEADER.pack(
+                0x02014b50, 20, 20, _FLAG_DATA_DESCRIPTOR, method,
+                self._dostime, self._dosdate, crc, compressed_size, size,
+                len(name), 0, 0, 0, 0, 0, header_offset
+            ))
+            self._write(name)
+        directory_size = self.offset - directory_offset
+        self._write(_END_RECORD.pack(
+            0x06054b50, 0, 0, len(self.entries), len(self.entries),
+            directory_size, directory_offset, 0
+        ))
+
+
+def _encode_chunks(chunks: Iterable[str]) -> Iterable[bytes]:
+    """Re-chunk text into encoded pieces of roughly _CHUNK_SIZE bytes"""
+    buffer: List[str] = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= _CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+class _DeflatedGCode:
+    """Raw DEFLATE stream of G-code chunks between optional invariant blocks
+
+    Iterating yields compressed bytes; size, CRC and MD5 of the uncompressed
+    G-code are complete once iteration finishes.
+    """
+
+    def __init__(self, chunks: Iterable[str], level: int,
+                 header: Optional[DeflateBlock], footer: Optional[DeflateBlock]):
+        self.chunks = chunks
+        self.level = level
+        self.header = header
+        self.footer = footer
+        self.crc = header.crc if header else 0
+        self.md5 = header.md5.copy() if header else hashlib.md5()
+        self.size = header.size if header else 0
+
+    def _update(self, data: bytes):
+        self.crc = zlib.crc32(data, self.crc)
+        self.md5.update(data)
+        self.size += len(data)
+
+    def __iter__(self) -> Iterator[bytes]:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        if self.header:
+            yield self.header.compressed
+        for data in _encode_chunks(self.chunks):
+            self._update(data)
+            yield compressor.compress(data)
+        if self.footer:
+            yield compressor.flush(zlib.Z_FULL_FLUSH)
+            self._update(self.footer.data)
+            yield self.footer.compressed
+        else:
+            yield compressor.flush(zlib.Z_FINISH)
+
+
+def write_3mf(fileobj: BinaryIO, gcode_chunks: Iterable[str],
+              gcode_location: str = GCODE_LOCATION,
+              level: int = DEFAULT_COMPRESSION_LEVEL,
+              header: Optional[DeflateBlock] = None,
+              footer: Optional[DeflateBlock] = None):
+    """Stream a 3MF package with G-code into fileobj
+
+    Only gcode_chunks are compressed here. When given, header and footer
+    are pre-compressed blocks placed before and after them; footer must
+    have been compressed with final=True.
+
+    Args:
+        fileobj: Writable binary file object
+        gcode_chunks: Variable G-code text, in order
+        gcode_location: Location of the G-code inside the package
+        level: zlib compression level for the variable part
+        header: Pre-compressed invariant G-code prefix
+        footer: Pre-compressed invariant G-code suffix
+    """
+    gcode = _DeflatedGCode(gcode_chunks, level, header, footer)
+
+    writer = StreamingZipWriter(fileobj)
+    writer.write_bytes('[Content_Types].xml', CONTENT_TYPES_XML)
+    writer.write_entry(gcode_location, gcode, True, lambda: (gcode.size, gcode.crc))
+    writer.write_bytes(gcode_location + '.md5', gcode.md5.hexdigest().upper().encode())
+    writer.close()
+
+
+def create_3mf_package(gcode_chunks: Iterable[str],
+                       gcode_location: str = GCODE_LOCATION,
+                       level: int = DEFAULT_COMPRESSION_LEVEL,
+                       header: Optional[DeflateBlock] = None,
+                       footer: Optional[DeflateBlock] = None) -> BytesIO:
+    """Create a 3MF package in memory
+
+    Args:
+        gcode_chunks: G-code text, as one string or an iterable of chunks
+        gcode_location: Location of the G-code inside the package
+        level: zlib compression level
+        header: Pre-compressed invariant G-code prefix
+        footer: Pre-compressed invariant G-code suffix
+
+    Returns:
+        io.BytesIO: 3MF package, positioned at the start
+    """
+    if isinstance(gcode_chunks, str):
+        gcode_chunks = [gcode_chunks]
+    buffer = BytesIO()
+    write_3mf(buffer, gcode_chunks, gcode_location, level, header, footer)
+    buffer.seek(0)
+    return buffer
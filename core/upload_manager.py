@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from typing import Dict, Any, BinaryIO, Callable, Optional
+
+
+class UploadManager:
+    """Upload packages to one printer at most once per content hash
+
+    A manifest of the files this system put on the printer (name, sha256,
+    size, last use) is kept in a JSON file. A package whose hash is
+    already on the printer is not uploaded again; its existing name is
+    returned. If the requested name is taken by different content the
+    package is uploaded under a hash-derived name instead. Least recently
+    used files are deleted from the printer to stay within max_bytes;
+    pinned files (prepared or printing) are never deleted. The manifest
+    is written when files are added or deleted; recency updates alone
+    only mark it dirty until then or until flush().
+    """
+
+    def __init__(self, manifest_path: str, max_bytes: int):
+        """Initialize upload manager
+
+        Args:
+            manifest_path: JSON manifest for this printer
+            max_bytes: Storage budget for uploaded packages on the printer
+        """
+        self.manifest_path = manifest_path
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.pinned = set()
+        self.stats = {'uploads': 0, 'skipped': 0, 'renamed': 0, 'deleted': 0, 'bytes_saved': 0}
+
+        # name -> {'hash', 'size', 'last_used'}, least recently used first
+        self._files: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._by_hash: Dict[str, str] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable upload manifest: {e}")
+            return
+        for name, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+            self._files[name] = entry
+            self._by_hash[entry['hash']] = name
+
+    def _save(self):
+        """Write the manifest (caller holds the lock)"""
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._files, f)
+            os.replace(tmp_path, self.manifest_path)
+            self._dirty = False
+        except OSError as e:
+            self.logger.error(f"Failed to save upload manifest: {e}")
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes of uploaded packages on the printer"""
+        return sum(entry['size'] for entry in self._files.values())
+
+    def upload(self, data: bytes, filename: str,
+               send: Callable[[BinaryIO, str], bool],
+               delete: Callable[[str], Any]) -> Optional[str]:
+        """Make a package available on the printer
+
+        Args:
+            data: Package content
+            filename: Preferred name on the printer
+            send: Uploads a file object under a name, returns success
+            delete: Deletes a file on the printer by name
+
+        Returns:
+            str: Name of the file on the printer, or None if the upload failed
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            name = self._by_hash.get(digest)
+            if name is not None:
+                self._touch(name)
+                self.stats['skipped'] += 1
+                self.stats['bytes_saved'] += len(data)
+                self.logger.info(f"Package already on printer as {name}, skipping upload")
+                return name
+
+            name = filename
+            if name in self._files or name in self.pinned:
+                root, ext = os.path.splitext(filename)
+                name = f"{digest[:16]}{ext}"
+                self.stats['renamed'] += 1
+            self._collect(len(data), delete)
+
+        # Upload outside the lock; it takes seconds
+        if not send(BytesIO(data), name):
+            return None
+
+        with self._lock:
+            old = self._files.pop(name, None)
+            if old is not None:
+                self._by_hash.pop(old['hash'], None)
+            self._files[name] = {'hash': digest, 'size': len(data), 'last_used': time.time()}
+            self._by_hash[digest] = name
+            self.stats['uploads'] += 1
+            self._save()
+        return name
+
+    def _touch(self, name: str):
+        """Mark a file as just used (caller holds the lock)"""
+        self._files[name]['last_used'] = time.time()
+        self._files.move_to_end(name)
+        self._dirty = True
+
+    def _collect(self, incoming: int, delete: Callable[[str], Any]):
+        """Delete least recently used files until incoming bytes fit (caller holds the lock)"""
+        total = self.total_bytes
+        for name in list(self._files):
+            if total + incoming <= self.max_bytes:
+                break
+            if name in self.pinned:
+                continue
+            try:
+                delete(name)
+            except Exception as e:
+                # Keep the entry; the file may still be on the printer
+                self.logger.error(f"Failed to delete {name} from printer: {e}")
+                continue
+            entry = self._files.pop(name)
+            self._by_hash.pop(entry['hash'], None)
+            total -= entry['size']
+            self.stats['deleted'] += 1
+            self._dirty = True
+            self.logger.info(f"Deleted {name} from printer to stay within storage budget")
+        if self._dirty:
+            self._save()
+
+    def forget(self, name: str):
+        """Drop a file from the manifest, e.g. when the printer no longer has it"""
+        with self._lock:
+            entry = self._files.pop(name, None)
+            if entry is not None:
+                self._by_hash.pop(entry['hash'], None)
+                self._save()
+
+    def flush(self):
+        """Write the manifest if it has unsaved changes"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def pin(self, name: str):
+        """Protect a file from garbage collection"""
+        with self._lock:
+            self.pinned.add(name)
+
+    def unpin(self, name: str):
+        """Allow a file to be garbage collected again"""
+        with self._lock:
+            self.pinned.discard(name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get upload counters and manifest size
+
+        Returns:
+            dict: uploads/skipped/renamed/deleted counts, bytes saved, files and bytes on printer
+        """
+        with self._lock:
+            return {**self.stats, 'files': len(self._files), 'bytes': self.total_bytes}
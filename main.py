@@ -1,9 +1,16 @@
 import os
+import sys
 import yaml
+import argparse
+import asyncio
 import logging.config
 import time
-from core.printer_controller import PrinterController
-from core.mqtt_handler import MQTTHandler
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+from core.startup import StartupTimer, load_cached
+
+# Components are imported where they are created, so that a fast start
+# can bring up MQTT while the printer client and database load
 
 def setup_logging():
     """Setup logging configuration"""
@@ -19,55 +26,284 @@ def setup_logging():
         config = yaml.safe_load(f)
         logging.config.dictConfig(config)
 
-def load_config():
-    """Load configuration from yaml file"""
+def _read_yaml(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+def load_config(cached=False):
+    """Load configuration from yaml file
+    
+    Args:
+        cached: Reuse the parsed configuration from the startup cache
+            while the file is unchanged
+    """
     config_path = os.path.join(
         os.path.dirname(__file__),
         'config/printer_config.yaml'
     )
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+    if cached:
+        return load_cached(config_path, _read_yaml)
+    return _read_yaml(config_path)
 
 class PrinterSystem:
     """Main printer system class"""
     
-    def __init__(self):
+    def __init__(self, fast_start=False):
+        """Set up logging, load configuration and initialize components
+        
+        Args:
+            fast_start: Load configuration and template from the startup
+                cache, create components on first use and connect the
+                printer and database in parallel; also enabled by
+                startup.fast_start in the configuration
+        """
+        self.startup = StartupTimer()
+        
         # Setup logging
-        setup_logging()
+        with self.startup.phase('logging'):
+            setup_logging()
         self.logger = logging.getLogger('printer')
         
         # Load configuration
-        self.config = load_config()
+        with self.startup.phase('config'):
+            self.config = load_config(cached=fast_start)
+        self.fast_start = fast_start or self.config.get('startup', {}).get('fast_start', False)
         self.logger.info("Configuration loaded successfully")
         
         # Initialize components
         self._init_components()
+        self.startup.mark('ready')
         
     def _init_components(self):
         """Initialize system components"""
+        self.fleet = None
+        self.job_queue = None
+        self.image_pipeline = None
+        self.metrics_server = None
+        if self.config.get('printers'):
+            self._init_fleet()
+            return
+            
         try:
             # Initialize printer controller
-            self.printer = PrinterController(self.config)
-            if not self.printer.connect():
+            with self.startup.phase('controller'):
+                from core.printer_controller import PrinterController
+                self.printer = PrinterController(self.config, lazy=self.fast_start)
+            
+            if self.fast_start:
+                # Printer, database and template load overlap with building the messaging components
+                with ThreadPoolExecutor(max_workers=3, thread_name_prefix='startup') as pool:
+                    connecting = pool.submit(self.startup.timed('printer', self.printer.connect))
+                    loading = [
+                        pool.submit(self.startup.timed('database', self.printer.open_database)),
+                        pool.submit(self.startup.timed('template', self.printer.load_template))
+                    ]
+                    self._init_messaging()
+                    connected = connecting.result()
+                    for future in loading:
+                        future.result()
+            else:
+                with self.startup.phase('printer'):
+                    connected = self.printer.connect()
+            if not connected:
+                self.printer.disconnect()
+                if self.fast_start:
+                    # Nothing was started yet; release the spool and queue database
+                    self.mqtt_handler.close()
+                    if self.job_queue:
+                        self.job_queue.stop()
                 raise Exception("Failed to connect to printer")
+            if not self.fast_start:
+                self._init_messaging()
+            # Commands are only taken once the printer is connected
+            self._start_messaging()
+            
+            # Both links share one supervisor for health metrics
+            from core.connection import ConnectionSupervisor
+            self.connections = ConnectionSupervisor()
+            self.connections.add(self.printer.link)
+            self.connections.add(self.mqtt_handler.link)
+            
+            # In push mode status follows the printer's own reports
+            self.status_publisher = None
+            status_config = self.config.get('status', {})
+            if status_config.get('mode', 'poll') == 'push':
+                from core.status_publisher import StatusPublisher
+                self.status_publisher = StatusPublisher(
+                    self.mqtt_handler.publish_status,
+                    min_interval=status_config.get('min_interval', 1.0),
+                    keyframe_interval=status_config.get('keyframe_interval', 60.0),
+                    deadband=status_config.get('deadband', 0.5)
+                )
+                self.printer.subscribe_reports(self.status_publisher.on_report)
+                self.status_publisher.start()
+            
+            # Finished squares are photographed and uploaded while the next one prints
+            imaging_config = self.config.get('imaging', {})
+            if imaging_config.get('enabled', False):
+                from core.imaging import ImagePipeline, create_object_store
+                self.image_pipeline = ImagePipeline(
+                    imaging_config,
+                    camera=lambda: self.printer.printer.get_camera_frame(),
+                    store=create_object_store(imaging_config),
+                    attach=self.printer.db_manager.attach_image,
+                    publish=self.mqtt_handler.publish_image
+                )
+                self.printer.subscribe_completions(self.image_pipeline.submit)
+            
+            self._init_metrics()
             
-            # Initialize MQTT handler
+        except Exception as e:
+            self.logger.error(f"Failed to initialize components: {e}")
+            raise
+            
+    def _init_messaging(self):
+        """Initialize telemetry, the MQTT handler and the job queue
+        
+        Nothing is started here; see _start_messaging.
+        """
+        from core.telemetry import TelemetryStore
+        from core.mqtt_handler import MQTTHandler
+        from core.campaign import CampaignPlanner
+        
+        with self.startup.phase('mqtt'):
+            # Initialize telemetry store
+            self.telemetry = TelemetryStore(self.config.get('telemetry', {}))
+            
+            # Initialize MQTT handler; campaigns use heating rates measured in telemetry
             self.mqtt_handler = MQTTHandler(self.config['mqtt'], self.printer)
+            self.mqtt_handler.campaign_planner = CampaignPlanner(
+                self.config.get('campaign', {}),
+                history=self.telemetry.query,
+                estimate=self._estimate_square
+            )
+            
+            # Commands go through a durable queue, off the MQTT network thread
+            queue_config = self.config.get('queue', {})
+            if queue_config.get('enabled', False):
+                from core.job_queue import JobQueue
+                # The next job waits until the printer has finished the last one
+                self.job_queue = JobQueue(
+                    queue_config,
+                    self.mqtt_handler.handle_command,
+                    self.mqtt_handler.publish_ack,
+                    ready=self.printer.ready_for_job
+                )
+                self.printer.subscribe_completions(lambda square_ids, status: self.job_queue.notify())
+            
+    def _start_messaging(self):
+        """Start the job queue workers and connect to the MQTT broker"""
+        if self.job_queue:
+            self.mqtt_handler.command_dispatcher = self.job_queue.submit
+            self.job_queue.start()
+        self.mqtt_handler.connect()
+            
+    def _init_fleet(self):
+        """Initialize one controller per configured printer"""
+        from core.fleet import FleetManager
+        from core.mqtt_handler import MQTTHandler
+        try:
+            # Commands are dispatched by the fleet, not a single printer
+            self.mqtt_handler = MQTTHandler(self.config['mqtt'], None)
+            self.fleet = FleetManager(
+                self.config, self.mqtt_handler.publish_status, ack=self.mqtt_handler.publish_ack
+            )
+            self.mqtt_handler.command_dispatcher = self.fleet.submit
+            
+            connected = self.fleet.connect()
+            if not connected:
+                raise Exception("Failed to connect to any printer")
+            self.logger.info(f"Connected to {connected} of {len(self.fleet.members)} printers")
+            
             self.mqtt_handler.connect()
+            self._init_metrics()
             
         except Exception as e:
-            self.logger.error(f"Failed to initialize components: {e}")
+            self.logger.error(f"Failed to initialize fleet: {e}")
             raise
             
+    def _estimate_square(self, params: Dict[str, Any]) -> float:
+        """Seconds to print one square once the printer is at its temperatures"""
+        start_temps = (params['bed_temp'], params['nozzle_temp'])
+        return self.printer.estimate_job([params], start_temps=start_temps)['time']
+            
+    def _init_metrics(self):
+        """Export component stats and serve them on the local metrics endpoint"""
+        metrics_config = self.config.get('metrics', {})
+        if not metrics_config.get('enabled', False):
+            return
+            
+        from core.metrics import REGISTRY, MetricsServer, stats_collector
+        from core.log_pipeline import find_async_handlers
+        REGISTRY.add_collector('startup', stats_collector('bambu_startup_seconds', self.startup.get_stats))
+        REGISTRY.add_collector('logging', stats_collector('bambu_logging', lambda: {
+            handler.writer.baseFilename: handler.get_stats() for handler in find_async_handlers()
+        }, label='file'))
+        REGISTRY.add_collector('outbox', stats_collector('bambu_mqtt_outbox', self.mqtt_handler.outbox.get_stats))
+        if self.fleet:
+            REGISTRY.add_collector('fleet', stats_collector('bambu_fleet', self.fleet.get_status, label='printer'))
+        else:
+            REGISTRY.add_collector('links', stats_collector('bambu_link', self.connections.get_metrics, label='link'))
+            REGISTRY.add_collector('snapshots', stats_collector(
+                'bambu_status_cache', self.printer.snapshots.get_stats
+            ))
+            REGISTRY.add_collector('db', stats_collector('bambu_db', lambda: {
+                'pending_writes': self.printer.db_manager.recorder.pending()
+            }))
+            if self.job_queue:
+                REGISTRY.add_collector('queue', stats_collector('bambu_job_queue', self.job_queue.get_stats))
+            if self.image_pipeline:
+                REGISTRY.add_collector('imaging', stats_collector('bambu_imaging', self.image_pipeline.get_stats))
+            if self.printer.uploads:
+                REGISTRY.add_collector('uploads', stats_collector('bambu_uploads', self.printer.uploads.get_stats))
+            if self.printer.package_cache:
+                REGISTRY.add_collector('package_cache', stats_collector(
+                    'bambu_package_cache', self.printer.package_cache.get_stats
+                ))
+                
+        try:
+            self.metrics_server = MetricsServer(metrics_config)
+            self.metrics_server.start()
+        except OSError as e:
+            # Metrics are optional; never keep the printer from running
+            self.logger.error(f"Failed to start metrics endpoint: {e}")
+            self.metrics_server = None
+            
     def run(self):
+        """Run the system with the configured runtime"""
+        if self.fleet:
+            self.run_fleet()
+        elif self.config.get('runtime', {}).get('mode', 'loop') == 'async':
+            from core.supervisor import AsyncSupervisor
+            asyncio.run(AsyncSupervisor(self, self.config.get('runtime', {})).run())
+        else:
+            self.run_loop()
+            
+    def run_fleet(self):
+        """Run fleet workers until interrupted"""
+        self.fleet.start()
+        self.logger.info("Fleet initialized, workers running")
+        
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.logger.info("Shutting down fleet...")
+            self.mqtt_handler.command_dispatcher = None
+            self.fleet.stop()
+            self.mqtt_handler.close()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            
+    def run_loop(self):
         """Main system loop"""
         self.logger.info("System initialized, entering main loop")
         
         while True:
             try:
-                # Check printer connection
+                # Check printer connection; reconnects only when the backoff allows
                 if not self.printer.check_connection():
-                    self.logger.error("Lost connection to printer")
+                    time.sleep(1)
                     continue
                 
                 # Check if backup needed
@@ -75,26 +311,124 @@ class PrinterSystem:
                     self.printer.db_manager.create_backup()
                     self.printer.db_manager.cleanup_old_backups()
                 
-                # Get printer status
-                status = self.printer.get_status()
-                
-                # Publish status
-                self.mqtt_handler.publish_status(status)
+                self.update_status()
                 
                 # Sleep for a bit
                 time.sleep(5)
                 
             except KeyboardInterrupt:
-                self.logger.info("Shutting down...")
+                self.shutdown()
                 break
                 
             except Exception as e:
                 self.logger.error(f"Error in main loop: {e}")
                 time.sleep(5)  # Wait before retrying
+                
+    def update_status(self):
+        """Sample printer status into telemetry and publish it"""
+        if self.status_publisher:
+            # Reports are published as they arrive; just sample them
+            status = self.status_publisher.snapshot()
+            self.telemetry.append(status, job=self.printer.current_position.get('id'))
+        else:
+            # Get printer status
+            status = self.printer.get_status()
+            
+            # Keep the sample for analysis, then publish it
+            self.telemetry.append(status, job=self.printer.current_position.get('id'))
+            self.mqtt_handler.publish_status(status)
+            
+        if 'first_status' not in self.startup.marks:
+            self.startup.mark('first_status')
+            self.logger.info(self.startup.summary())
+            
+    def shutdown(self):
+        """Stop components and persist pending data"""
+        self.logger.info("Shutting down...")
+        if self.job_queue:
+            self.mqtt_handler.command_dispatcher = None
+            self.job_queue.stop(timeout=30)
+        if self.status_publisher:
+            self.status_publisher.stop()
+        if self.image_pipeline:
+            self.image_pipeline.close()
+        self.telemetry.flush()
+        self.printer.db_manager.close()
+        if self.printer.uploads:
+            self.printer.uploads.flush()
+        self.printer.disconnect()
+        self.mqtt_handler.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+
+def warm_up_cache(args):
+    """Pre-build the 3MF packages of every configured grid for one parameter set
+    
+    Covers all plates of the grid, and in fleet mode the grid of every
+    printer, since a printer may override the grid's size or origin.
+    """
+    from core.gcode_generator import GCodeGenerator, DEFAULT_ORIGIN, DEFAULT_COMPRESSION_LEVEL
+    from core.package_cache import PackageCache, warm_up
+    from core.position_manager import PrintPositionManager
+
+    setup_logging()
+    logger = logging.getLogger('printer')
+    config = load_config()
+    package_config = config.get('package', {})
+    if not package_config.get('cache_dir'):
+        logger.error("Package cache is not configured (package.cache_dir)")
+        return 1
+
+    cache = PackageCache(
+        package_config['cache_dir'],
+        package_config.get('cache_max_bytes', 256 * 1024 * 1024)
+    )
+    params = {'nozzle_temp': args.nozzle_temp, 'bed_temp': args.bed_temp}
+    grids = [{**config['grid'], **printer.get('grid', {})} for printer in config.get('printers') or [{}]]
+
+    start = time.time()
+    built = 0
+    for grid in grids:
+        generator = GCodeGenerator(
+            origin=tuple(grid.get('start_pos', DEFAULT_ORIGIN)),
+            compression_level=package_config.get('compression_level', DEFAULT_COMPRESSION_LEVEL)
+        )
+        manager = PrintPositionManager(grid)
+        positions = [
+            position
+            for plate in range(manager.plates)
+            for position in manager.all_positions(plate)
+        ]
+        built += warm_up(generator, cache, positions, params, args.workers)
+    logger.info(
+        f"Warm-up built {built} packages in {time.time() - start:.1f}s, "
+        f"cache now {cache.get_stats()['bytes']} bytes"
+    )
+    return 0
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Bambu printer control system")
+    subparsers = parser.add_subparsers(dest='command')
+
+    warmup = subparsers.add_parser(
+        'warmup', help="pre-build print packages of every configured grid for a parameter set"
+    )
+    warmup.add_argument('--nozzle-temp', type=float, required=True)
+    warmup.add_argument('--bed-temp', type=float, required=True)
+    warmup.add_argument('--workers', type=int, default=None)
+
+    parser.add_argument('--fast-start', action='store_true',
+                        help="lazy components, cached config and template, parallel connect")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    if args.command == 'warmup':
+        sys.exit(warm_up_cache(args))
+
     try:
-        system = PrinterSystem()
+        system = PrinterSystem(fast_start=args.fast_start)
         system.run()
     except Exception as e:
         logging.error(f"Fatal error: {e}")
@@ -0,0 +1,55 @@
+import os
+import sys
+from functools import partial
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakePrinter  # noqa: E402
+from core.printer_controller import PrinterController  # noqa: E402
+
+PARAMS = {'nozzle_temp': 200, 'bed_temp': 60, 'print_speed': 100}
+
+
+@pytest.fixture
+def config(tmp_path):
+    """The shipped configuration with every file under tmp_path"""
+    with open(os.path.join(ROOT, 'config', 'printer_config.yaml')) as f:
+        config = yaml.safe_load(f)
+    config['database'] = {
+        **config['database'],
+        'path': str(tmp_path / 'print_history.db'),
+        'backup_dir': str(tmp_path / 'backups')
+    }
+    config['printer'] = {**config['printer'], 'connect_timeout': 0.5}
+    config['telemetry'] = {**config['telemetry'], 'dir': str(tmp_path / 'telemetry')}
+    config['queue'] = {**config['queue'], 'path': str(tmp_path / 'job_queue.db')}
+    config['upload'] = {}
+    config['package'] = {}
+    config['startup'] = {}
+    return config
+
+
+@pytest.fixture
+def make_controller(config):
+    """Build controllers on FakePrinters; their databases are closed afterwards"""
+    controllers = []
+
+    def make(connect=True, config_overrides=None, **printer_options):
+        printer_options.setdefault('latency', 0)
+        controller = PrinterController(
+            {**config, **(config_overrides or {})},
+            printer_factory=partial(FakePrinter, **printer_options)
+        )
+        controllers.append(controller)
+        if connect:
+            controller.connect()
+        return controller
+
+    yield make
+    for controller in controllers:
+        controller.disconnect()
+        controller.db_manager.close()
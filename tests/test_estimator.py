@@ -0,0 +1,29 @@
+import pytest
+
+from core.estimator import move_times, parse_gcode
+
+LIMITS = {'max_velocity': 500.0, 'default_accel': 10000.0, 'max_accel': 10000.0,
+          'square_corner_velocity': 5.0}
+
+
+def _time(gcode):
+    return move_times(parse_gcode(gcode), **LIMITS).sum()
+
+
+def test_single_move_is_a_trapezoid():
+    # 12.5 mm to reach 500 mm/s at each end, 75 mm cruising
+    assert _time('G1 X100 F30000') == pytest.approx(0.25)
+
+
+def test_short_collinear_moves_take_as_long_as_one_long_move():
+    segmented = '\n'.join(f'G1 X{0.1 * i:.1f} F30000' for i in range(1, 1001))
+
+    assert _time(segmented) == pytest.approx(_time('G1 X100 F30000'))
+
+
+def test_slowdown_before_a_reversal_spans_several_moves():
+    out = '\n'.join(f'G1 X{i} F30000' for i in range(1, 21))
+    back = '\n'.join(f'G1 X{20 - i} F30000' for i in range(1, 21))
+
+    # Each way is one 20 mm triangle: accelerate 10 mm, decelerate 10 mm
+    assert _time(out + '\n' + back) == pytest.approx(2 * 2 * (2 * 10 / 10000) ** 0.5)
@@ -0,0 +1,87 @@
+import time
+from functools import partial
+
+import pytest
+
+from benchmarks.fakes import FakePrinter
+from core.fleet import FleetManager
+from tests.conftest import PARAMS
+
+
+@pytest.fixture
+def fleet_config(config):
+    return {
+        **config,
+        'printers': [
+            {'name': name, 'ip': '', 'serial': serial, 'access_code': '', 'connect_timeout': 0.5}
+            for name, serial in (('a', 'FAKE1'), ('b', 'FAKE2'))
+        ],
+        'queue': {**config['queue'], 'poll_interval': 0.01},
+        'fleet': {'status_interval': 0.05}
+    }
+
+
+def _fleet(config, published=None):
+    return FleetManager(
+        config,
+        lambda status, serial: published.append(status) if published is not None else None,
+        printer_factory=partial(FakePrinter, latency=0, print_time=0.05)
+    )
+
+
+def _stop(fleet):
+    fleet.stop()
+    for member in fleet.members:
+        member.controller.disconnect()
+
+
+@pytest.fixture
+def make_fleet(fleet_config):
+    """Build fleets on FakePrinters; they are stopped afterwards"""
+    fleets = []
+
+    def make(published=None):
+        fleet = _fleet(fleet_config, published)
+        fleets.append(fleet)
+        return fleet
+
+    yield make
+    for fleet in fleets:
+        _stop(fleet)
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_queued_jobs_survive_a_restart(fleet_config, make_fleet):
+    fleet = _fleet(fleet_config)
+    assert fleet.connect() == 2
+    fleet.submit({'action': 'print', 'parameters': PARAMS})
+    assert sum(member.load for member in fleet.members) == 1
+    _stop(fleet)
+
+    restarted = make_fleet()
+    assert sum(member.load for member in restarted.members) == 1
+    restarted.connect()
+    restarted.start()
+    assert _wait_for(lambda: sum(member.completed for member in restarted.members) == 1)
+
+
+def test_campaign_is_spread_over_the_printers(make_fleet):
+    published = []
+    fleet = make_fleet(published)
+    fleet.connect()
+    parameter_sets = [{**PARAMS, 'bed_temp': bed} for bed in (60, 60, 70, 70)]
+
+    fleet.submit({'action': 'campaign', 'parameter_sets': parameter_sets})
+
+    assert published[0]['status'] == 'planned'
+    assert [member.load for member in fleet.members] == [2, 2]
+    fleet.start()
+    assert _wait_for(lambda: sum(member.completed for member in fleet.members) == 4)
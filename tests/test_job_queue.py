@@ -0,0 +1,40 @@
+import threading
+import time
+
+from core.job_queue import JobQueue, DONE, PENDING
+from tests.conftest import PARAMS
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_busy_printer_holds_back_only_print_jobs(tmp_path):
+    handled = []
+    printer_free = threading.Event()
+    queue = JobQueue(
+        {'path': str(tmp_path / 'queue.db'), 'workers': 2, 'poll_interval': 0.01},
+        handler=lambda payload: handled.append(payload['action']) or {'status': 'ok'},
+        ack=lambda message: None,
+        ready=printer_free.is_set
+    )
+    queue.start()
+    try:
+        _, print_id, _ = queue.enqueue({'action': 'print', 'parameters': PARAMS}, priority=1)
+        _, other_id, _ = queue.enqueue({'action': 'campaign', 'dry_run': True})
+
+        assert _wait_for(lambda: queue.get_job(other_id)['status'] == DONE)
+        assert queue.get_job(print_id)['status'] == PENDING
+
+        printer_free.set()
+        queue.notify()
+        assert _wait_for(lambda: queue.get_job(print_id)['status'] == DONE)
+        assert handled == ['campaign', 'print']
+        assert queue.get_stats()['done'] == 2
+    finally:
+        queue.stop(timeout=5)
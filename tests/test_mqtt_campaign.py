@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from benchmarks.fakes import FakeMQTTClient
+from core.mqtt_handler import MQTTHandler
+from tests.conftest import PARAMS
+
+PARAMETER_SETS = [{**PARAMS, 'bed_temp': 70}, PARAMS, {**PARAMS, 'nozzle_temp': 210}]
+
+
+@pytest.fixture
+def handler(config, tmp_path, make_controller):
+    handler = MQTTHandler(
+        {**config['mqtt'], 'spool_path': str(tmp_path / 'spool.jsonl')},
+        make_controller(print_time=0.05), client=FakeMQTTClient()
+    )
+    yield handler
+    handler.close()
+
+
+def _statuses(handler):
+    return [json.loads(payload)['status'] for topic, payload in handler.client.published
+            if '/status/' in topic]
+
+
+def test_campaign_squares_are_dispatched_in_plan_order(handler):
+    dispatched = []
+    handler.command_dispatcher = dispatched.append
+
+    response = handler.handle_command({
+        'action': 'campaign', 'parameter_sets': PARAMETER_SETS,
+        'correlation_id': 'c1', 'idempotency_key': 'k1'
+    })
+
+    assert response['status'] == 'queued'
+    assert [job['parameters'] for job in dispatched] == [PARAMETER_SETS[i] for i in response['order']]
+    assert all(job['action'] == 'print' for job in dispatched)
+    assert [job['correlation_id'] for job in dispatched] == ['c1:0', 'c1:1', 'c1:2']
+    assert [job['idempotency_key'] for job in dispatched] == ['k1:0', 'k1:1', 'k1:2']
+
+
+def test_campaign_without_dispatcher_runs_in_the_background(handler):
+    handler.connect()
+    handler.client.on_connect(handler.client, None, {}, 0)
+
+    response = handler.handle_command({'action': 'campaign', 'parameter_sets': PARAMETER_SETS})
+    assert response['status'] == 'started'
+
+    handler._campaign_thread.join(timeout=60)
+    assert not handler._campaign_thread.is_alive()
+    assert _statuses(handler)[-1] == 'completed'
@@ -0,0 +1,16 @@
+from core.gcode_generator import GCodeGenerator
+from core.package_cache import PackageCache, warm_up
+from core.position_manager import PrintPositionManager
+from tests.conftest import PARAMS
+
+
+def test_warm_up_builds_each_square_once_across_plates(tmp_path):
+    generator = GCodeGenerator()
+    cache = PackageCache(str(tmp_path / 'packages'), 64 * 1024 * 1024)
+    manager = PrintPositionManager({'size': [2, 2], 'plates': 2})
+    positions = [p for plate in range(manager.plates) for p in manager.all_positions(plate)]
+
+    assert warm_up(generator, cache, positions, PARAMS, workers=2) == 4
+    assert cache.get_stats()['entries'] == 4
+    assert all(generator.package_key(p, PARAMS) in cache for p in positions)
+    assert warm_up(generator, cache, positions, PARAMS, workers=2) == 0
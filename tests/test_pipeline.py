@@ -0,0 +1,44 @@
+import time
+
+from bambulabs_api import GcodeState
+
+from core.pipeline import PipelinedExecutor
+from tests.conftest import PARAMS
+
+FAST = {'poll_interval': 0.01, 'start_timeout': 5, 'square_timeout': 30, 'max_unavailable': 3}
+
+
+def test_prints_every_square_and_preheats_the_bed(make_controller):
+    controller = make_controller()
+    executor = PipelinedExecutor(controller, FAST)
+
+    result = executor.run([PARAMS, {**PARAMS, 'bed_temp': 70}])
+
+    assert len(result['printed']) == 2
+    assert result['failed'] == []
+    assert executor.stats['preheats'] == 1
+    assert controller.printer.bed._target == 70
+
+
+def test_gives_up_quickly_on_a_silent_printer(make_controller):
+    controller = make_controller()
+    controller.printer.silent = True
+    controller.report_timeout = 0
+
+    started = time.monotonic()
+    result = PipelinedExecutor(controller, FAST).run([PARAMS, PARAMS])
+
+    assert result['printed'] == []
+    assert result['failed'] == [0, 1]
+    assert time.monotonic() - started < FAST['square_timeout']
+
+
+def test_unknown_state_counts_as_unavailable(make_controller):
+    controller = make_controller()
+    controller.printer.get_state = lambda: GcodeState.UNKNOWN
+
+    started = time.monotonic()
+    result = PipelinedExecutor(controller, FAST).run([PARAMS])
+
+    assert result['failed'] == [0]
+    assert time.monotonic() - started < FAST['square_timeout']
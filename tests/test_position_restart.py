@@ -0,0 +1,22 @@
+from tests.conftest import PARAMS
+
+
+def test_restart_keeps_started_squares_and_frees_aborted_ones(make_controller):
+    controller = make_controller(print_time=60)
+    printed = controller.prepare_print(PARAMS)
+    assert controller.start_prepared(printed)
+
+    # A print that failed on the bed keeps its square
+    broken = controller.position_manager.get_next_position()
+    controller.db_manager.record_print_job(broken['id'], *broken['position'], PARAMS)
+    controller.db_manager.update_job_status(broken['id'], 'failed')
+
+    # The printer is busy, so this start is refused and the job aborted
+    aborted = controller.prepare_print(PARAMS)
+    assert not controller.start_prepared(aborted)
+    assert controller.db_manager.flush(timeout=10)
+
+    restarted = make_controller()
+    occupied = set(restarted.db_manager.get_occupied_squares())
+    assert occupied == {printed['position']['id'], broken['id']}
+    assert restarted.position_manager.get_next_position()['id'] == aborted['position']['id']
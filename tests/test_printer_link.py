@@ -0,0 +1,37 @@
+from core.connection import OPEN, HEALTHY
+
+
+def test_connect_fails_when_mqtt_never_connects(make_controller):
+    controller = make_controller(reachable=False)
+
+    assert not controller.connected
+    assert controller.printer is None
+    assert controller.link.state == OPEN
+
+
+def test_silent_printer_opens_the_breaker(make_controller):
+    controller = make_controller(silent=True, config_overrides={
+        'printer': {'ip': '', 'serial': 'FAKE', 'access_code': '',
+                    'connect_timeout': 0.5, 'report_timeout': 0}
+    })
+    assert controller.connected
+    assert controller.link.state == HEALTHY
+
+    for _ in range(controller.link.failure_threshold):
+        status = controller.get_status(max_age=0)
+        assert status['status'] == 'error'
+
+    assert controller.link.state == OPEN
+    assert not controller.check_connection()
+
+
+def test_reporting_printer_stays_healthy(make_controller):
+    controller = make_controller(config_overrides={
+        'printer': {'ip': '', 'serial': 'FAKE', 'access_code': '',
+                    'connect_timeout': 0.5, 'report_timeout': 0.5}
+    })
+
+    for _ in range(5):
+        assert controller.get_status(max_age=0)['status'] != 'error'
+    assert controller.link.state == HEALTHY
+    assert controller.check_connection()
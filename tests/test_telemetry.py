@@ -0,0 +1,36 @@
+import os
+import time
+
+from core.telemetry import TelemetryStore
+
+STATUS = {'status': 'RUNNING', 'bed_temp': 60.0, 'nozzle_temp': 200.0, 'progress': 10.0}
+
+
+def _files(store, folder):
+    return os.listdir(os.path.join(store.dir, folder))
+
+
+def test_flush_prunes_raw_segments_past_retention(tmp_path):
+    store = TelemetryStore({'dir': str(tmp_path), 'tiers': [60], 'raw_retention': 3600})
+    now = time.time()
+    store.append(STATUS, job='square_0_0', timestamp=now - 7200)
+    store.flush()
+    store.append(STATUS, job='square_0_1', timestamp=now)
+    store.flush()
+
+    assert len(_files(store, 'raw')) == 1
+    assert len(_files(store, 'tier_60')) == 2
+    assert store.pruned == 1
+    assert list(store.query(now - 10000, now + 1)['job']) == ['square_0_1']
+    assert store.query(now - 10000, now + 1, tier=60)['count'].sum() == 2
+
+
+def test_segments_written_earlier_are_found_after_a_restart(tmp_path):
+    config = {'dir': str(tmp_path), 'tiers': [60], 'raw_retention': None}
+    store = TelemetryStore(config)
+    now = time.time()
+    store.append(STATUS, job='square_0_0', timestamp=now - 7200)
+    store.flush()
+
+    reopened = TelemetryStore(config)
+    assert list(reopened.query_job('square_0_0')['state']) == ['RUNNING']
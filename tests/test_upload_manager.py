@@ -0,0 +1,80 @@
+import pytest
+
+from core.upload_manager import UploadManager
+
+
+class FakeStorage:
+    """Printer file storage recording sends and deletes"""
+
+    def __init__(self):
+        self.files = {}
+        self.sends = 0
+
+    def send(self, file, name):
+        self.sends += 1
+        self.files[name] = file.read()
+        return True
+
+    def delete(self, name):
+        del self.files[name]
+
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
+
+
+def _upload(manager, storage, data, name):
+    return manager.upload(data, name, storage.send, storage.delete)
+
+
+def test_same_content_is_uploaded_once(tmp_path, storage):
+    manager = UploadManager(str(tmp_path / 'manifest.json'), 1000)
+
+    assert _upload(manager, storage, b'a' * 100, 'one.3mf') == 'one.3mf'
+    assert _upload(manager, storage, b'a' * 100, 'two.3mf') == 'one.3mf'
+
+    assert storage.sends == 1
+    assert manager.get_stats()['skipped'] == 1
+
+
+def test_taken_name_gets_a_hash_name(tmp_path, storage):
+    manager = UploadManager(str(tmp_path / 'manifest.json'), 1000)
+    _upload(manager, storage, b'a' * 100, 'job.3mf')
+
+    name = _upload(manager, storage, b'b' * 100, 'job.3mf')
+
+    assert name != 'job.3mf' and name.endswith('.3mf')
+    assert storage.files['job.3mf'] == b'a' * 100
+
+
+def test_collection_skips_pinned_files(tmp_path, storage):
+    manager = UploadManager(str(tmp_path / 'manifest.json'), 250)
+    _upload(manager, storage, b'a' * 100, 'a.3mf')
+    _upload(manager, storage, b'b' * 100, 'b.3mf')
+    manager.pin('a.3mf')
+
+    _upload(manager, storage, b'c' * 100, 'c.3mf')
+
+    assert set(storage.files) == {'a.3mf', 'c.3mf'}
+    assert manager.get_stats()['bytes'] == 200
+
+    manager.unpin('a.3mf')
+    _upload(manager, storage, b'd' * 100, 'd.3mf')
+    assert set(storage.files) == {'c.3mf', 'd.3mf'}
+
+
+def test_manifest_survives_a_restart(tmp_path, storage):
+    path = str(tmp_path / 'manifest.json')
+    manager = UploadManager(path, 1000)
+    _upload(manager, storage, b'a' * 100, 'a.3mf')
+    _upload(manager, storage, b'b' * 100, 'b.3mf')
+    _upload(manager, storage, b'a' * 100, 'again.3mf')
+    manager.flush()
+
+    restarted = UploadManager(path, 250)
+    assert _upload(restarted, storage, b'b' * 100, 'b2.3mf') == 'b.3mf'
+    # b.3mf was used last, so a.3mf is the one collected
+    _upload(restarted, storage, b'c' * 100, 'c.3mf')
+    assert set(storage.files) == {'b.3mf', 'c.3mf'}
+    assert storage.sends == 3